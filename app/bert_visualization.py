@@ -1,125 +1,463 @@
-import torch
-from transformers import AutoTokenizer, AutoModel, AutoConfig
-import numpy as np
-from typing import Dict, List, Tuple
-import torch.nn.functional as F
-import logging
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-class BertVisualizer:
-    def __init__(self):
-        try:
-            self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-            logger.info(f"Usando dispositivo: {self.device}")
-            
-            self.model_name = "anferico/bert-for-patents"
-            
-            # Configurar el modelo para usar atención cruzada
-            config = AutoConfig.from_pretrained(
-                self.model_name,
-                output_attentions=True,
-                output_hidden_states=True,
-                attn_implementation="eager"
-            )
-            
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.model = AutoModel.from_pretrained(
-                self.model_name,
-                config=config
-            ).to(self.device)
-            
-            self.model.eval()
-            self.max_length = 512
-            
-        except Exception as e:
-            logger.error(f"Error inicializando BertVisualizer: {str(e)}")
-            raise
-
-    def get_cross_attention_scores(self, text1: str, text2: str) -> Dict:
-        try:
-            # Tokenizar ambos textos
-            tokens1 = self.tokenizer(
-                text1, 
-                return_tensors='pt', 
-                padding=True, 
-                truncation=True, 
-                max_length=self.max_length,
-                add_special_tokens=True
-            )
-            tokens2 = self.tokenizer(
-                text2, 
-                return_tensors='pt', 
-                padding=True, 
-                truncation=True, 
-                max_length=self.max_length,
-                add_special_tokens=True
-            )
-            
-            # Mover tensores a GPU si está disponible
-            tokens1 = {k: v.to(self.device) for k, v in tokens1.items()}
-            tokens2 = {k: v.to(self.device) for k, v in tokens2.items()}
-            
-            # Procesar ambos textos
-            with torch.no_grad():
-                outputs1 = self.model(**tokens1, output_attentions=True)
-                outputs2 = self.model(**tokens2, output_attentions=True)
-                
-                # Calcular atención cruzada usando la última capa de atención
-                hidden1 = outputs1.last_hidden_state
-                hidden2 = outputs2.last_hidden_state
-                
-                # Calcular scores de atención cruzada
-                cross_attention = torch.matmul(hidden1, hidden2.transpose(-2, -1))
-                cross_attention = F.softmax(cross_attention / np.sqrt(hidden1.size(-1)), dim=-1)
-                
-                # Promediar sobre los batch y head dimensions
-                cross_attention = cross_attention.mean(dim=0)  # Promedio sobre batch
-            
-            # Obtener tokens y preparar resultado
-            tokens1_text = self.tokenizer.convert_ids_to_tokens(tokens1['input_ids'][0])
-            tokens2_text = self.tokenizer.convert_ids_to_tokens(tokens2['input_ids'][0])
-            
-            # Filtrar tokens PAD
-            valid_indices1 = [i for i, t in enumerate(tokens1_text) if t != '[PAD]']
-            valid_indices2 = [i for i, t in enumerate(tokens2_text) if t != '[PAD]']
-            
-            # Crear matriz de atención cruzada
-            attention_matrix = cross_attention[valid_indices1][:, valid_indices2].cpu().numpy()
-            
-            return {
-                'text1_tokens': [tokens1_text[i] for i in valid_indices1],
-                'text2_tokens': [tokens2_text[i] for i in valid_indices2],
-                'cross_attention': attention_matrix.tolist(),
-                'is_special1': [tokens1_text[i] in ['[CLS]', '[SEP]'] for i in valid_indices1],
-                'is_special2': [tokens2_text[i] in ['[CLS]', '[SEP]'] for i in valid_indices2]
-            }
-            
-        except Exception as e:
-            logger.error(f"Error en get_cross_attention_scores: {str(e)}")
-            raise
-
-    def process_texts(self, main_text: str, cited_text: str) -> Dict:
-        try:
-            if not main_text or not cited_text:
-                raise ValueError("Textos vacíos o nulos")
-                
-            main_text = main_text.strip()
-            cited_text = cited_text.strip()
-            
-            logger.info(f"Procesando textos - Principal: {len(main_text)} caracteres, Citado: {len(cited_text)} caracteres")
-            
-            cross_attention_results = self.get_cross_attention_scores(main_text, cited_text)
-            
-            return {
-                'status': 'success',
-                'analysis': cross_attention_results
-            }
-            
-        except Exception as e:
-            logger.error(f"Error en process_texts: {str(e)}")
-            return {
-                'status': 'error',
-                'message': str(e)
+import torch
+import numpy as np
+from typing import Dict, List, Tuple
+import torch.nn.functional as F
+import base64
+import logging
+from .model_registry import get_shared_model, DEFAULT_MODEL_NAME
+from .embedding_cache import text_hash
+from .lru_cache import ByteBudgetLRU
+from .config import BERT_HIDDEN_CACHE_MB, BERT_WINDOW_OVERLAP, BERT_WINDOW_BATCH_SIZE, BERT_TILE_ROWS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 'hidden': afinidad entre last_hidden_state de ambos textos codificados por separado
+# 'raw': atención real por cabeza de una capa, con ambos textos codificados como par
+ATTENTION_MODES = ('hidden', 'raw')
+
+# 'compact': top-k por fila en binario base64; 'dense': matrices completas como listas
+PAYLOAD_FORMATS = ('compact', 'dense')
+PAYLOAD_ENCODINGS = ('uint8', 'float16')
+
+
+def merge_wordpieces(tokens: List[str], is_special: List[bool]) -> Tuple[List[str], List[bool], List[List[int]]]:
+    """Une las piezas WordPiece '##' con la palabra anterior.
+
+    Devuelve las palabras, si cada una es especial y los índices de tokens que la forman.
+    """
+    words, word_special, groups = [], [], []
+    for i, (token, special) in enumerate(zip(tokens, is_special)):
+        if token.startswith('##') and groups and not word_special[-1]:
+            words[-1] += token[2:]
+            groups[-1].append(i)
+        else:
+            words.append(token)
+            word_special.append(special)
+            groups.append([i])
+    return words, word_special, groups
+
+
+def aggregate_to_words(matrix: np.ndarray, groups1: List[List[int]], groups2: List[List[int]]) -> np.ndarray:
+    """Agrega atención token a token a nivel de palabra.
+
+    Se promedian las filas de cada palabra origen y se suman las columnas de cada
+    palabra destino, de modo que cada fila sigue siendo una distribución.
+    """
+    rows = np.stack([matrix[..., group, :].mean(axis=-2) for group in groups1], axis=-2)
+    return np.stack([rows[..., group].sum(axis=-1) for group in groups2], axis=-1)
+
+
+def top_k_rows(matrix: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Índices y valores de los top_k mayores de cada fila, en orden descendente."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    k = max(1, min(top_k, matrix.shape[-1]))
+
+    indices = np.argpartition(-matrix, k - 1, axis=-1)[..., :k]
+    values = np.take_along_axis(matrix, indices, axis=-1)
+    order = np.argsort(-values, axis=-1)
+    return np.take_along_axis(indices, order, axis=-1), np.take_along_axis(values, order, axis=-1)
+
+
+def encode_top_k(indices: np.ndarray, values: np.ndarray, shape: List[int], encoding: str = 'uint8') -> Dict:
+    """Codifica en base64 el resultado de ``top_k_rows``.
+
+    ``indices`` son uint16 little-endian; ``values`` son float16 o uint8 que se
+    recuperan como ``q * scale``. Ambos con forma ``shape[:-1] + [k]``.
+    """
+    if encoding not in PAYLOAD_ENCODINGS:
+        raise ValueError(f"Codificación desconocida: {encoding}. Opciones: {PAYLOAD_ENCODINGS}")
+    if shape[-1] > np.iinfo(np.uint16).max + 1:
+        raise ValueError(f"Demasiadas columnas para índices uint16: {shape[-1]}")
+
+    scale = 1.0
+    if encoding == 'uint8':
+        scale = float(values.max()) / 255 if values.size and values.max() > 0 else 1.0
+        values = np.round(values / scale).astype(np.uint8)
+    else:
+        values = values.astype('<f2')
+
+    return {
+        'shape': list(shape),
+        'top_k': indices.shape[-1],
+        'encoding': encoding,
+        'scale': scale,
+        'indices': base64.b64encode(indices.astype('<u2').tobytes()).decode('ascii'),
+        'values': base64.b64encode(values.tobytes()).decode('ascii')
+    }
+
+
+def pack_top_k(matrix: np.ndarray, top_k: int, encoding: str = 'uint8') -> Dict:
+    """Conserva los top_k valores de cada fila y los codifica en base64."""
+    indices, values = top_k_rows(matrix, top_k)
+    return encode_top_k(indices, values, np.shape(matrix), encoding)
+
+
+class BertVisualizer:
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME):
+        try:
+            # Reutilizar el tokenizer y los pesos ya cargados en el proceso
+            shared = get_shared_model(model_name)
+            self.device = shared.device
+            logger.info(f"Usando dispositivo: {self.device}")
+            
+            self.model_name = shared.model_name
+            self.tokenizer = shared.tokenizer
+            self.model = shared.model
+            self.tokenizer_lock = shared.tokenizer_lock
+            self.max_length = 512
+            
+            # Tokenización y last_hidden_state por hash de texto, con presupuesto en bytes
+            self.hidden_cache = ByteBudgetLRU(
+                max_bytes=BERT_HIDDEN_CACHE_MB * 1024 * 1024,
+                sizeof=lambda encoded: encoded['hidden'].element_size() * encoded['hidden'].nelement()
+            )
+
+            # Modo ventana: solapamiento entre ventanas, ventanas por pasada y filas por tesela
+            self.window_overlap = min(BERT_WINDOW_OVERLAP, self.max_length // 2)
+            self.window_batch_size = BERT_WINDOW_BATCH_SIZE
+            self.tile_rows = BERT_TILE_ROWS
+            
+        except Exception as e:
+            logger.error(f"Error inicializando BertVisualizer: {str(e)}")
+            raise
+
+    def encode_text(self, text: str) -> Dict:
+        """Tokeniza el texto y obtiene su last_hidden_state, usando la caché LRU si es posible."""
+        cache_key = (text_hash(text), self.max_length)
+        cached = self.hidden_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with self.tokenizer_lock:
+            tokens = self.tokenizer(
+                text, 
+                return_tensors='pt', 
+                padding=True, 
+                truncation=True, 
+                max_length=self.max_length,
+                add_special_tokens=True
+            )
+        
+        # Mover tensores a GPU si está disponible
+        tokens = {k: v.to(self.device) for k, v in tokens.items()}
+        
+        # Solo se usa last_hidden_state: sin atenciones ni estados intermedios,
+        # de modo que el modelo puede usar los kernels SDPA
+        with torch.no_grad():
+            outputs = self.model(**tokens, output_attentions=False, output_hidden_states=False)
+        
+        encoded = {
+            'tokens': self.tokenizer.convert_ids_to_tokens(tokens['input_ids'][0]),
+            'hidden': outputs.last_hidden_state
+        }
+        self.hidden_cache.put(cache_key, encoded)
+        return encoded
+
+    def encode_text_windowed(self, text: str) -> Dict:
+        """Codifica el texto completo en ventanas solapadas y une sus estados ocultos.
+
+        Cada token toma el estado de la ventana en la que tiene más contexto a
+        ambos lados: las ventanas se reparten el solapamiento por la mitad.
+        """
+        cache_key = (text_hash(text), self.max_length, 'windowed', self.window_overlap)
+        cached = self.hidden_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with self.tokenizer_lock:
+            ids = self.tokenizer(text, add_special_tokens=False, truncation=False, verbose=False)['input_ids']
+
+        window = self.max_length - 2
+        stride = window - self.window_overlap
+        starts = [0]
+        while starts[-1] + window < len(ids):
+            starts.append(starts[-1] + stride)
+
+        half_overlap = self.window_overlap // 2
+        owned = [
+            (0 if w == 0 else start + half_overlap,
+             len(ids) if w == len(starts) - 1 else starts[w + 1] + half_overlap)
+            for w, start in enumerate(starts)
+        ]
+
+        pieces = []
+        for batch_start in range(0, len(starts), self.window_batch_size):
+            batch = range(batch_start, min(batch_start + self.window_batch_size, len(starts)))
+            chunks = [
+                [self.tokenizer.cls_token_id] + ids[starts[w]:starts[w] + window] + [self.tokenizer.sep_token_id]
+                for w in batch
+            ]
+            seq_len = max(len(chunk) for chunk in chunks)
+            input_ids = torch.full((len(chunks), seq_len), self.tokenizer.pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(chunks), seq_len), dtype=torch.long)
+            for row, chunk in enumerate(chunks):
+                input_ids[row, :len(chunk)] = torch.tensor(chunk)
+                attention_mask[row, :len(chunk)] = 1
+
+            with torch.no_grad():
+                hidden = self.model(
+                    input_ids=input_ids.to(self.device),
+                    attention_mask=attention_mask.to(self.device),
+                    output_attentions=False,
+                    output_hidden_states=False
+                ).last_hidden_state
+
+            for row, w in enumerate(batch):
+                if w == 0:
+                    pieces.append(hidden[row, :1])
+                own_start, own_end = owned[w]
+                # +1 por el [CLS] de cada ventana
+                pieces.append(hidden[row, 1 + own_start - starts[w]:1 + own_end - starts[w]])
+                if w == len(starts) - 1:
+                    sep_position = 1 + len(ids) - starts[w]
+                    pieces.append(hidden[row, sep_position:sep_position + 1])
+
+        encoded = {
+            'tokens': [self.tokenizer.cls_token] + self.tokenizer.convert_ids_to_tokens(ids) + [self.tokenizer.sep_token],
+            'hidden': torch.cat(pieces).unsqueeze(0),
+            'windows': len(starts)
+        }
+        self.hidden_cache.put(cache_key, encoded)
+        return encoded
+
+    def iter_cross_attention_tiles(self, hidden1: torch.Tensor, hidden2: torch.Tensor, row_groups: List[List[int]]):
+        """Genera la atención cruzada por teselas de filas completas.
+
+        Las teselas agrupan filas contiguas sin partir un grupo (p. ej. una palabra),
+        así que la memoria queda acotada a ``tile_rows`` x columnas por paso.
+        """
+        tile = []
+        for group in row_groups:
+            tile.append(group)
+            if sum(len(g) for g in tile) >= self.tile_rows or group is row_groups[-1]:
+                first_row, last_row = tile[0][0], tile[-1][-1] + 1
+                with torch.no_grad():
+                    scores = torch.matmul(hidden1[first_row:last_row], hidden2.transpose(-2, -1))
+                    probs = F.softmax(scores / np.sqrt(hidden1.size(-1)), dim=-1)
+                yield tile, probs.cpu().numpy()
+                tile = []
+
+    def get_windowed_cross_attention(self, text1: str, text2: str, top_k: int = 32,
+                                     word_level: bool = False, encoding: str = 'uint8') -> Dict:
+        """Atención cruzada sobre los textos completos, en formato compacto.
+
+        Cada tesela se reduce a su top-k antes de calcular la siguiente, de modo
+        que nunca se materializa la matriz completa.
+        """
+        try:
+            encoded1 = self.encode_text_windowed(text1)
+            encoded2 = self.encode_text_windowed(text2)
+            special_tokens = (self.tokenizer.cls_token, self.tokenizer.sep_token)
+            tokens1, tokens2 = encoded1['tokens'], encoded2['tokens']
+            is_special1 = [t in special_tokens for t in tokens1]
+            is_special2 = [t in special_tokens for t in tokens2]
+
+            if word_level:
+                tokens1, is_special1, groups1 = merge_wordpieces(tokens1, is_special1)
+                tokens2, is_special2, groups2 = merge_wordpieces(tokens2, is_special2)
+            else:
+                groups1 = [[i] for i in range(len(tokens1))]
+                groups2 = [[i] for i in range(len(tokens2))]
+            column_starts = [group[0] for group in groups2]
+
+            indices_parts, values_parts = [], []
+            for tile, probs in self.iter_cross_attention_tiles(encoded1['hidden'][0], encoded2['hidden'][0], groups1):
+                if word_level:
+                    first_row = tile[0][0]
+                    probs = np.add.reduceat(probs, column_starts, axis=1)
+                    probs = np.add.reduceat(probs, [group[0] - first_row for group in tile], axis=0)
+                    probs /= np.array([len(group) for group in tile], dtype=probs.dtype)[:, None]
+                indices, values = top_k_rows(probs, top_k)
+                indices_parts.append(indices)
+                values_parts.append(values)
+
+            return {
+                'text1_tokens': tokens1,
+                'text2_tokens': tokens2,
+                'is_special1': is_special1,
+                'is_special2': is_special2,
+                'format': 'compact',
+                'word_level': word_level,
+                'windows': [encoded1['windows'], encoded2['windows']],
+                'cross_attention': encode_top_k(
+                    np.concatenate(indices_parts), np.concatenate(values_parts),
+                    [len(tokens1), len(tokens2)], encoding
+                )
+            }
+
+        except Exception as e:
+            logger.error(f"Error en get_windowed_cross_attention: {str(e)}")
+            raise
+
+    def cache_stats(self) -> Dict:
+        return self.hidden_cache.stats()
+
+    def get_cross_attention_scores(self, text1: str, text2: str) -> Dict:
+        try:
+            # Tokenizar y procesar ambos textos (el texto principal suele venir de la caché)
+            encoded1 = self.encode_text(text1)
+            encoded2 = self.encode_text(text2)
+            
+            with torch.no_grad():
+                # Calcular atención cruzada usando la última capa de atención
+                hidden1 = encoded1['hidden']
+                hidden2 = encoded2['hidden']
+                
+                # Calcular scores de atención cruzada
+                cross_attention = torch.matmul(hidden1, hidden2.transpose(-2, -1))
+                cross_attention = F.softmax(cross_attention / np.sqrt(hidden1.size(-1)), dim=-1)
+                
+                # Promediar sobre los batch y head dimensions
+                cross_attention = cross_attention.mean(dim=0)  # Promedio sobre batch
+            
+            # Obtener tokens y preparar resultado
+            tokens1_text = encoded1['tokens']
+            tokens2_text = encoded2['tokens']
+            
+            # Filtrar tokens PAD
+            valid_indices1 = [i for i, t in enumerate(tokens1_text) if t != '[PAD]']
+            valid_indices2 = [i for i, t in enumerate(tokens2_text) if t != '[PAD]']
+            
+            # Crear matriz de atención cruzada
+            attention_matrix = cross_attention[valid_indices1][:, valid_indices2].cpu().numpy()
+            
+            return {
+                'text1_tokens': [tokens1_text[i] for i in valid_indices1],
+                'text2_tokens': [tokens2_text[i] for i in valid_indices2],
+                'cross_attention': attention_matrix,
+                'is_special1': [tokens1_text[i] in ['[CLS]', '[SEP]'] for i in valid_indices1],
+                'is_special2': [tokens2_text[i] in ['[CLS]', '[SEP]'] for i in valid_indices2]
+            }
+            
+        except Exception as e:
+            logger.error(f"Error en get_cross_attention_scores: {str(e)}")
+            raise
+
+    def get_raw_attention_scores(self, text1: str, text2: str, layer: int = -1) -> Dict:
+        """Atención por cabeza de los tokens de text1 hacia los de text2 en una capa.
+
+        Los textos se codifican juntos como par de secuencias. Solo se piden los
+        estados ocultos y las probabilidades se recalculan para la capa indicada a
+        partir de sus proyecciones query/key, sin materializar las atenciones de
+        todas las capas ni forzar la implementación eager.
+        """
+        try:
+            n_layers = len(self.model.encoder.layer)
+            if not -n_layers <= layer < n_layers:
+                raise ValueError(f"Capa fuera de rango: {layer} (el modelo tiene {n_layers})")
+            layer = layer % n_layers
+
+            with self.tokenizer_lock:
+                tokens = self.tokenizer(
+                    text1,
+                    text2,
+                    return_tensors='pt',
+                    truncation='longest_first',
+                    max_length=self.max_length,
+                    add_special_tokens=True
+                )
+            tokens = {k: v.to(self.device) for k, v in tokens.items()}
+
+            with torch.no_grad():
+                outputs = self.model(**tokens, output_attentions=False, output_hidden_states=True)
+
+                # hidden_states[layer] es la entrada de la capa; una sola secuencia sin relleno
+                hidden = outputs.hidden_states[layer]
+                self_attention = self.model.encoder.layer[layer].attention.self
+                head_shape = (*hidden.shape[:-1], -1, self_attention.attention_head_size)
+                query = self_attention.query(hidden).view(head_shape).transpose(1, 2)
+                key = self_attention.key(hidden).view(head_shape).transpose(1, 2)
+                head_attention = F.softmax(
+                    torch.matmul(query, key.transpose(-2, -1)) * self_attention.scaling, dim=-1
+                )[0]
+
+            token_types = tokens['token_type_ids'][0].tolist()
+            all_tokens = self.tokenizer.convert_ids_to_tokens(tokens['input_ids'][0])
+            indices1 = [i for i, t in enumerate(token_types) if t == 0]
+            indices2 = [i for i, t in enumerate(token_types) if t == 1]
+
+            # Bloque text1 -> text2; las filas no suman 1 porque también se atiende a text1
+            head_attention = head_attention[:, indices1][:, :, indices2].cpu().numpy()
+
+            return {
+                'text1_tokens': [all_tokens[i] for i in indices1],
+                'text2_tokens': [all_tokens[i] for i in indices2],
+                'cross_attention': head_attention.mean(axis=0),
+                'head_attention': head_attention,
+                'layer': layer,
+                'is_special1': [all_tokens[i] in ['[CLS]', '[SEP]'] for i in indices1],
+                'is_special2': [all_tokens[i] in ['[CLS]', '[SEP]'] for i in indices2]
+            }
+
+        except Exception as e:
+            logger.error(f"Error en get_raw_attention_scores: {str(e)}")
+            raise
+
+    def format_payload(self, analysis: Dict, payload_format: str = 'compact', top_k: int = 32,
+                       word_level: bool = False, encoding: str = 'uint8') -> Dict:
+        """Prepara las matrices de atención para la respuesta JSON."""
+        if payload_format not in PAYLOAD_FORMATS:
+            raise ValueError(f"Formato desconocido: {payload_format}. Opciones: {PAYLOAD_FORMATS}")
+
+        matrices = {key: analysis[key] for key in ('cross_attention', 'head_attention') if key in analysis}
+        result = {key: value for key, value in analysis.items() if key not in matrices}
+
+        if word_level:
+            words1, special1, groups1 = merge_wordpieces(analysis['text1_tokens'], analysis['is_special1'])
+            words2, special2, groups2 = merge_wordpieces(analysis['text2_tokens'], analysis['is_special2'])
+            result.update({
+                'text1_tokens': words1, 'text2_tokens': words2,
+                'is_special1': special1, 'is_special2': special2
+            })
+            matrices = {key: aggregate_to_words(value, groups1, groups2) for key, value in matrices.items()}
+
+        result['format'] = payload_format
+        result['word_level'] = word_level
+        for key, value in matrices.items():
+            result[key] = value.tolist() if payload_format == 'dense' else pack_top_k(value, top_k, encoding)
+        return result
+
+    def process_texts(self, main_text: str, cited_text: str,
+                      attention_mode: str = 'hidden', layer: int = -1,
+                      payload_format: str = 'compact', top_k: int = 32,
+                      word_level: bool = False, encoding: str = 'uint8',
+                      windowed: bool = False) -> Dict:
+        try:
+            if not main_text or not cited_text:
+                raise ValueError("Textos vacíos o nulos")
+            if attention_mode not in ATTENTION_MODES:
+                raise ValueError(f"Modo de atención desconocido: {attention_mode}. Opciones: {ATTENTION_MODES}")
+                
+            main_text = main_text.strip()
+            cited_text = cited_text.strip()
+            
+            logger.info(f"Procesando textos - Principal: {len(main_text)} caracteres, Citado: {len(cited_text)} caracteres")
+            
+            if windowed:
+                # Textos completos por ventanas: solo afinidad de estados ocultos en formato compacto
+                if attention_mode != 'hidden' or payload_format != 'compact':
+                    raise ValueError("El modo ventana solo admite attention_mode='hidden' y formato compacto")
+                return {
+                    'status': 'success',
+                    'analysis': self.get_windowed_cross_attention(main_text, cited_text, top_k, word_level, encoding)
+                }
+
+            if attention_mode == 'raw':
+                cross_attention_results = self.get_raw_attention_scores(main_text, cited_text, layer)
+            else:
+                cross_attention_results = self.get_cross_attention_scores(main_text, cited_text)
+            
+            return {
+                'status': 'success',
+                'analysis': self.format_payload(
+                    cross_attention_results, payload_format, top_k, word_level, encoding
+                )
+            }
+            
+        except Exception as e:
+            logger.error(f"Error en process_texts: {str(e)}")
+            return {
+                'status': 'error',
+                'message': str(e)
             }
\ No newline at end of file
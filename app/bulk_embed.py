@@ -0,0 +1,290 @@
+"""Precalienta la caché de embeddings con un directorio de archivos de patentes.
+
+Lee archivos con el formato de data/EP*.json / dataentry*.json (o JSONL con un
+objeto de ese formato por línea), elimina los textos repetidos entre archivos,
+los embebe con EmbeddingsGenerator en lotes grandes y escribe los vectores en
+el almacén de embeddings compartido. Los archivos se leen a medida que se
+envían tramos a los procesos, con a lo sumo dos tramos en vuelo por proceso.
+
+El almacén hace de checkpoint: los textos que ya tienen embedding se omiten,
+así que una ejecución interrumpida se retoma volviendo a lanzar el mismo comando.
+El archivo de checkpoint acumula el progreso y el rendimiento entre ejecuciones.
+
+La carga reserva el almacén en exclusivo: no se ejecuta con el servidor activo
+(con --wait espera a que se detenga).
+
+Uso (desde la raíz del repositorio):
+    python -m app.bulk_embed data/ [--workers 2] [--chunk-size 256] [--wait]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .config import INFERENCE_BACKEND
+from .embedding_cache import get_embedding_cache
+from .embedding_store import DEFAULT_STORE_DIR, StoreBusy
+from .embeddings import EmbeddingsGenerator
+from .inference_backends import INFERENCE_BACKENDS
+from .model_registry import DEFAULT_MODEL_NAME
+from .patent_files import DEFAULT_PATTERNS, find_patent_files, iter_documents, iter_patent_bundles
+from .prior_art_index import get_prior_art_index
+
+# Junto al almacén y no en data/, donde lo recogería el patrón *.json
+DEFAULT_CHECKPOINT = str(Path(DEFAULT_STORE_DIR) / "bulk_embed_checkpoint.json")
+
+
+def iter_pending_chunks(files: List[Path], cache, model_name: str, backend: str, chunk_size: int,
+                        stats: Dict) -> Iterator[Tuple[List[str], List[str]]]:
+    """Recorre los archivos y devuelve tramos (claves, textos) de textos aún sin embedding.
+
+    En memoria solo quedan las claves ya vistas y el tramo en curso. Los ids de
+    patente se registran en el índice de antecedentes al terminar cada archivo,
+    también los de textos que ya estaban en el almacén.
+    """
+    index = get_prior_art_index()
+    seen = set()
+    keys, texts = [], []
+    for path in files:
+        doc_ids = {}
+        try:
+            for patent_data in iter_patent_bundles(path):
+                for doc_id, text in iter_documents(patent_data):
+                    if not isinstance(text, str) or not text.strip():
+                        continue
+                    stats['documents_read'] += 1
+                    key = EmbeddingsGenerator.make_cache_key(model_name, text, backend)
+                    doc_ids.setdefault(key, doc_id)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    stats['unique_texts'] += 1
+                    if key in cache:
+                        stats['cached'] += 1
+                        continue
+                    keys.append(key)
+                    texts.append(text)
+                    if len(keys) >= chunk_size:
+                        yield keys, texts
+                        keys, texts = [], []
+        except (OSError, ValueError) as e:
+            print(f"No se pudo leer {path}: {str(e)}")
+        index.register_documents(doc_ids)
+    if keys:
+        yield keys, texts
+
+
+def load_checkpoint(path: Path) -> Dict:
+    if path.exists():
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {'documents': 0, 'tokens': 0, 'seconds': 0.0, 'failed': 0, 'runs': 0}
+
+
+def save_checkpoint(path: Path, checkpoint: Dict) -> None:
+    # Escritura atómica: un corte a mitad nunca deja el checkpoint a medias
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# Estado de cada proceso de trabajo: el modelo se carga una vez por proceso
+_worker_generator: Optional[EmbeddingsGenerator] = None
+
+
+def init_worker(model_name: str, backend: str, batch_size: int, max_batch_tokens: int, torch_threads: int) -> None:
+    global _worker_generator
+    import torch
+
+    if torch_threads > 0:
+        torch.set_num_threads(torch_threads)
+    # Sin caché: el proceso principal es el único que escribe en el almacén
+    _worker_generator = EmbeddingsGenerator(
+        model_name=model_name,
+        use_cache=False,
+        batching="bucketed",
+        batch_size=batch_size,
+        max_batch_tokens=max_batch_tokens,
+        backend=backend
+    )
+
+
+def encode_chunk(keys: List[str], texts: List[str]) -> Tuple[List[str], Optional[np.ndarray], int, int]:
+    """Embebe un tramo de textos; devuelve (claves, matriz, tokens, textos fallidos)."""
+    generator = _worker_generator
+    tokens_before = generator.tokens_encoded
+    try:
+        embeddings = generator.encode_texts(texts)
+        encoded_keys = keys
+    except Exception as e:
+        # Un texto sin segmentos o que rompe el tokenizer no debe hacer perder el resto del tramo
+        print(f"Tramo con errores ({str(e)}), se reintenta texto a texto")
+        encoded_keys, embeddings = [], []
+        for key, text in zip(keys, texts):
+            try:
+                embeddings.extend(generator.encode_texts([text]))
+                encoded_keys.append(key)
+            except Exception as e:
+                print(f"Texto omitido ({key[:12]}): {str(e)}")
+
+    matrix = np.asarray(embeddings, dtype=np.float32) if embeddings else None
+    return encoded_keys, matrix, generator.tokens_encoded - tokens_before, len(keys) - len(encoded_keys)
+
+
+def run(args) -> Dict:
+    cache = get_embedding_cache()
+    # El servidor también escribe en el almacén y en las etiquetas del índice de antecedentes
+    try:
+        cache.store.claim(exclusive=True, wait=args.wait)
+    except StoreBusy as e:
+        raise SystemExit(f"{str(e)}. Detenga el servidor o use --wait.")
+
+    files = find_patent_files(args.input_dir, args.patterns, exclude=[args.checkpoint])
+    print(f"Archivos: {len(files)}")
+
+    checkpoint_path = Path(args.checkpoint)
+    checkpoint = load_checkpoint(checkpoint_path)
+    checkpoint['runs'] += 1
+    base = {key: checkpoint[key] for key in ('documents', 'tokens', 'failed', 'seconds')}
+    run_stats = {'documents': 0, 'tokens': 0, 'failed': 0}
+    read_stats = {'documents_read': 0, 'unique_texts': 0, 'cached': 0}
+    chunks = iter_pending_chunks(files, cache, args.model, args.backend, args.chunk_size, read_stats)
+    aborted = False
+    started = time.perf_counter()
+
+    def save():
+        checkpoint.update({key: base[key] + run_stats[key] for key in run_stats})
+        checkpoint['seconds'] = base['seconds'] + time.perf_counter() - started
+        checkpoint['store_size'] = len(cache.store)
+        save_checkpoint(checkpoint_path, checkpoint)
+
+    def commit(keys, matrix, n_tokens, n_failed):
+        # Primero el almacén y luego el checkpoint: si se corta aquí, el tramo no se repite
+        if matrix is not None:
+            cache.put_many(dict(zip(keys, matrix)))
+        run_stats['documents'] += len(keys)
+        run_stats['tokens'] += n_tokens
+        run_stats['failed'] += n_failed
+        save()
+        elapsed = time.perf_counter() - started
+        print(f"  {run_stats['documents']} textos  "
+              f"{run_stats['documents'] / elapsed:8.1f} docs/s  {run_stats['tokens'] / elapsed:10.1f} tokens/s")
+
+    def fail(n_texts, error):
+        print(f"Tramo fallido ({n_texts} textos): {str(error)}")
+        commit([], None, 0, n_texts)
+
+    worker_args = (args.model, args.backend, args.batch_size, args.max_batch_tokens, args.torch_threads)
+    try:
+        if args.workers <= 1:
+            init_worker(*worker_args)
+            for chunk_keys, chunk_texts in chunks:
+                try:
+                    result = encode_chunk(chunk_keys, chunk_texts)
+                except Exception as e:
+                    fail(len(chunk_keys), e)
+                    continue
+                commit(*result)
+        else:
+            # "spawn" para que cada proceso inicialice torch desde cero
+            with ProcessPoolExecutor(
+                max_workers=args.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=worker_args
+            ) as pool:
+                # Tramos en vuelo acotados: la lectura de archivos avanza al ritmo de la inferencia
+                in_flight = {}
+
+                def collect(done):
+                    for future in done:
+                        n_texts = in_flight.pop(future)
+                        try:
+                            result = future.result()
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as e:
+                            fail(n_texts, e)
+                            continue
+                        commit(*result)
+
+                try:
+                    for chunk_keys, chunk_texts in chunks:
+                        if len(in_flight) >= 2 * args.workers:
+                            collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+                        in_flight[pool.submit(encode_chunk, chunk_keys, chunk_texts)] = len(chunk_keys)
+                    while in_flight:
+                        collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+                except BrokenProcessPool as e:
+                    # Un proceso murió (p. ej. sin memoria): los tramos en vuelo se pierden,
+                    # lo ya escrito queda en el almacén y la ejecución se retoma relanzando el comando
+                    aborted = True
+                    run_stats['failed'] += sum(in_flight.values())
+                    print(f"El pool de procesos terminó de forma inesperada: {str(e)}")
+    finally:
+        save()
+
+    elapsed = time.perf_counter() - started
+    report = {
+        'files': len(files),
+        'documents_read': read_stats['documents_read'],
+        'unique_texts': read_stats['unique_texts'],
+        'already_cached': read_stats['cached'],
+        'embedded': run_stats['documents'],
+        'failed': run_stats['failed'],
+        'aborted': aborted,
+        'tokens': run_stats['tokens'],
+        'seconds': elapsed,
+        'docs_per_second': run_stats['documents'] / elapsed if elapsed > 0 else 0.0,
+        'tokens_per_second': run_stats['tokens'] / elapsed if elapsed > 0 else 0.0,
+        'store_size': len(cache.store)
+    }
+    print(f"Documentos: {report['documents_read']}, textos únicos: {report['unique_texts']}, "
+          f"ya en caché: {report['already_cached']}")
+    print(f"Embebidos {report['embedded']} textos ({report['failed']} fallidos) en {elapsed:.1f} s: "
+          f"{report['docs_per_second']:.1f} docs/s, {report['tokens_per_second']:.1f} tokens/s")
+    print(f"Acumulado: {checkpoint['documents']} textos, {checkpoint['tokens']} tokens en "
+          f"{checkpoint['seconds']:.1f} s ({checkpoint['runs']} ejecuciones)")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input_dir')
+    parser.add_argument('--pattern', dest='patterns', action='append',
+                        help="Patrón glob dentro del directorio (repetible; por defecto *.json y *.jsonl)")
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME)
+    parser.add_argument('--backend', default=INFERENCE_BACKEND, choices=INFERENCE_BACKENDS)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Procesos de inferencia; 1 ejecuta en el proceso actual")
+    parser.add_argument('--chunk-size', type=int, default=256, help="Textos por tramo enviado a un proceso")
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--max-batch-tokens', type=int, default=16384)
+    parser.add_argument('--torch-threads', type=int, default=0,
+                        help="Hilos de torch por proceso (0: por defecto de torch)")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT)
+    parser.add_argument('--wait', action='store_true',
+                        help="Esperar a que el servidor libere el almacén en lugar de terminar")
+    parser.add_argument('--report', help="Ruta donde guardar el informe de rendimiento en JSON")
+    args = parser.parse_args()
+    args.patterns = args.patterns or list(DEFAULT_PATTERNS)
+
+    report = run(args)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    if report['aborted']:
+        raise SystemExit("Carga interrumpida: vuelva a lanzar el comando para retomarla.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+# Planificador de inferencia (micro-batching de /generate_embeddings)
+INFERENCE_MAX_BATCH_TEXTS = _env_int("INFERENCE_MAX_BATCH_TEXTS", 128)
+INFERENCE_MAX_BATCH_TOKENS = _env_int("INFERENCE_MAX_BATCH_TOKENS", 65536)
+INFERENCE_MAX_WAIT_MS = _env_float("INFERENCE_MAX_WAIT_MS", 15.0)
+INFERENCE_MAX_QUEUE_DEPTH = _env_int("INFERENCE_MAX_QUEUE_DEPTH", 256)
+
+# Ejecutores para sacar el trabajo de CPU del bucle de eventos
+THREAD_POOL_WORKERS = _env_int("THREAD_POOL_WORKERS", 2)
+THREAD_POOL_MAX_PENDING = _env_int("THREAD_POOL_MAX_PENDING", 16)
+PROCESS_POOL_WORKERS = _env_int("PROCESS_POOL_WORKERS", 2)
+PROCESS_POOL_MAX_PENDING = _env_int("PROCESS_POOL_MAX_PENDING", 32)
+
+# Proyección 3D de los embeddings ("fitted", "pca" o "tsne")
+PROJECTION_METHOD = os.environ.get("PROJECTION_METHOD", "fitted")
+PROJECTION_BASIS_PATH = os.environ.get("PROJECTION_BASIS_PATH", "data/projection/pca_basis.npz")
+PROJECTION_MIN_FIT_SAMPLES = _env_int("PROJECTION_MIN_FIT_SAMPLES", 16)
+PROJECTION_MAX_FIT_SAMPLES = _env_int("PROJECTION_MAX_FIT_SAMPLES", 20000)
+
+# Índice de antecedentes (vecinos más cercanos sobre el almacén de embeddings)
+PRIOR_ART_INDEX_DIR = os.environ.get("PRIOR_ART_INDEX_DIR", "data/prior_art_index")
+PRIOR_ART_IVF_MIN_SIZE = _env_int("PRIOR_ART_IVF_MIN_SIZE", 20000)
+PRIOR_ART_N_PROBE = _env_int("PRIOR_ART_N_PROBE", 8)
+
+# Caché de tokenización y last_hidden_state del visualizador BERT
+BERT_HIDDEN_CACHE_MB = _env_int("BERT_HIDDEN_CACHE_MB", 256)
+
+# Modo ventana del visualizador BERT para textos de más de 512 tokens
+BERT_WINDOW_OVERLAP = _env_int("BERT_WINDOW_OVERLAP", 128)
+BERT_WINDOW_BATCH_SIZE = _env_int("BERT_WINDOW_BATCH_SIZE", 8)
+BERT_TILE_ROWS = _env_int("BERT_TILE_ROWS", 256)
+
+# Documentos citados por lote en /generate_embeddings/stream
+EMBEDDINGS_STREAM_CHUNK_TEXTS = _env_int("EMBEDDINGS_STREAM_CHUNK_TEXTS", 4)
+
+# Backend de inferencia de EmbeddingsGenerator ("torch", "int8" u "onnx"). "int8" mantiene
+# su copia cuantizada además del modelo fp32 compartido (~+1/3 de la memoria del modelo)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", "data/onnx")
+ONNX_INTRA_OP_THREADS = _env_int("ONNX_INTRA_OP_THREADS", 0)
+
+# Carga del modelo en segundo plano al arrancar (0 la deja para la primera solicitud)
+WARMUP_ON_STARTUP = _env_int("WARMUP_ON_STARTUP", 1)
+
+# Base de datos SQLite: conexiones persistentes por hilo, en modo WAL
+DATABASE_PATH = os.environ.get("DATABASE_PATH", "data/database.db")
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 4)
+DB_BUSY_TIMEOUT_MS = _env_int("DB_BUSY_TIMEOUT_MS", 5000)
+DB_CACHE_SIZE_KB = _env_int("DB_CACHE_SIZE_KB", 8192)
+DB_MMAP_SIZE_MB = _env_int("DB_MMAP_SIZE_MB", 64)
+
+# Modelo TF-IDF del corpus para /api/visualization/semantic (hashing + IDF ajustada con
+# python -m app.tfidf_model; el servidor solo lo lee). Si no existe, el servidor lo
+# ajusta una vez sobre TFIDF_CORPUS_DIR al primer uso
+TFIDF_MODEL_PATH = os.environ.get("TFIDF_MODEL_PATH", "data/tfidf/tfidf_model.npz")
+TFIDF_CORPUS_DIR = os.environ.get("TFIDF_CORPUS_DIR", "data")
+TFIDF_N_FEATURES = _env_int("TFIDF_N_FEATURES", 2**20)
+TFIDF_CACHE_MB = _env_int("TFIDF_CACHE_MB", 64)
+
+# Caché de figuras Plotly serializadas de /api/visualization/{cosine,euclidean}
+PLOT_CACHE_MB = _env_int("PLOT_CACHE_MB", 64)
+
+# Horas que se conservan los resultados guardados (result_id); los antiguos se borran al
+# arrancar y al guardar resultados nuevos, como mucho una vez cada intervalo
+ANALYSIS_RESULTS_RETENTION_HOURS = _env_float("ANALYSIS_RESULTS_RETENTION_HOURS", 24.0)
+ANALYSIS_RESULTS_PRUNE_INTERVAL_S = _env_float("ANALYSIS_RESULTS_PRUNE_INTERVAL_S", 600.0)
\ No newline at end of file
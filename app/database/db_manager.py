@@ -1,122 +1,292 @@
-# app/database/db_manager.py
-import sqlite3
-from sqlite3 import Error
-from datetime import datetime
-from pathlib import Path
-
-class DatabaseManager:
-    def __init__(self, db_path="data/database.db"):
-        self.db_path = db_path
-        self.init_db()
-
-    def create_connection(self):
-        """Crear y retornar una conexión a la base de datos."""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            return conn
-        except Error as e:
-            print(f"Error al conectar a la base de datos: {e}")
-            return None
-
-    def init_db(self):
-        """Inicializar la base de datos y crear las tablas necesarias."""
-        conn = self.create_connection()
-        if conn is not None:
-            try:
-                c = conn.cursor()
-                # Crear tabla de usuarios
-                c.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT NOT NULL UNIQUE,
-                        password TEXT NOT NULL,
-                        full_name TEXT NOT NULL,
-                        login_attempts INTEGER DEFAULT 0,
-                        last_attempt TIMESTAMP
-                    )
-                ''')
-                
-                # Insertar usuario inicial
-                c.execute('''
-                    INSERT OR IGNORE INTO users (username, password, full_name)
-                    VALUES (?, ?, ?)
-                ''', ('uspatent', 'uspatent', 'usuario generico'))
-                
-                conn.commit()
-            except Error as e:
-                print(f"Error al inicializar la base de datos: {e}")
-            finally:
-                conn.close()
-
-    def check_login_attempts(self, username: str) -> tuple:
-        """Verificar intentos de login para un usuario."""
-        conn = self.create_connection()
-        if conn is not None:
-            try:
-                c = conn.cursor()
-                c.execute('''
-                    SELECT login_attempts, last_attempt
-                    FROM users
-                    WHERE username = ?
-                ''', (username,))
-                return c.fetchone()
-            finally:
-                conn.close()
-        return None
-
-    def reset_login_attempts(self, username: str):
-        """Resetear contador de intentos de login."""
-        conn = self.create_connection()
-        if conn is not None:
-            try:
-                c = conn.cursor()
-                c.execute('''
-                    UPDATE users
-                    SET login_attempts = 0
-                    WHERE username = ?
-                ''', (username,))
-                conn.commit()
-            finally:
-                conn.close()
-
-    def verify_credentials(self, username: str, password: str) -> tuple:
-        """Verificar credenciales de usuario."""
-        conn = self.create_connection()
-        if conn is not None:
-            try:
-                c = conn.cursor()
-                c.execute('''
-                    SELECT *
-                    FROM users
-                    WHERE username = ? AND password = ?
-                ''', (username, password))
-                return c.fetchone()
-            finally:
-                conn.close()
-        return None
-
-    def increment_login_attempts(self, username: str) -> int:
-        """Incrementar contador de intentos fallidos y retornar número actual."""
-        conn = self.create_connection()
-        if conn is not None:
-            try:
-                c = conn.cursor()
-                c.execute('''
-                    UPDATE users
-                    SET login_attempts = login_attempts + 1,
-                        last_attempt = datetime('now')
-                    WHERE username = ?
-                ''', (username,))
-                
-                c.execute('''
-                    SELECT login_attempts
-                    FROM users
-                    WHERE username = ?
-                ''', (username,))
-                
-                attempts = c.fetchone()
-                conn.commit()
-                return attempts[0] if attempts else 0
-            finally:
-                conn.close()
-        return 0
\ No newline at end of file
+# app/database/db_manager.py
+import asyncio
+import json
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from sqlite3 import Error
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from ..config import (
+    DATABASE_PATH, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE_MB,
+    ANALYSIS_RESULTS_RETENTION_HOURS, ANALYSIS_RESULTS_PRUNE_INTERVAL_S,
+)
+
+logger = logging.getLogger(__name__)
+
+# Las sentencias se definen una sola vez: sqlite3 guarda las sentencias
+# preparadas en una caché por conexión indexada por el texto SQL, así que
+# reutilizar la misma cadena evita volver a compilarlas en cada llamada.
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL,
+        full_name TEXT NOT NULL,
+        login_attempts INTEGER DEFAULT 0,
+        last_attempt TIMESTAMP
+    );
+
+    -- id aleatorio (no secuencial): conocerlo es lo que da acceso al resultado
+    CREATE TABLE IF NOT EXISTS analysis_results (
+        id TEXT PRIMARY KEY,
+        session_id TEXT,
+        kind TEXT NOT NULL,
+        main_patent_id TEXT,
+        payload TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT (datetime('now'))
+    );
+    CREATE INDEX IF NOT EXISTS idx_analysis_results_session ON analysis_results (session_id, kind);
+    CREATE INDEX IF NOT EXISTS idx_analysis_results_created ON analysis_results (created_at);
+'''
+
+# Versiones anteriores usaban ids enteros consecutivos. Los resultados son
+# temporales, así que la tabla antigua se descarta en lugar de migrarla.
+ANALYSIS_RESULTS_COLUMNS = '''
+    PRAGMA table_info(analysis_results)
+'''
+DROP_INTEGER_ID_ANALYSIS_RESULTS = '''
+    DROP TABLE analysis_results
+'''
+
+INSERT_DEFAULT_USER = '''
+    INSERT OR IGNORE INTO users (username, password, full_name)
+    VALUES (?, ?, ?)
+'''
+SELECT_LOGIN_ATTEMPTS = '''
+    SELECT login_attempts, last_attempt
+    FROM users
+    WHERE username = ?
+'''
+RESET_LOGIN_ATTEMPTS = '''
+    UPDATE users
+    SET login_attempts = 0
+    WHERE username = ?
+'''
+SELECT_CREDENTIALS = '''
+    SELECT *
+    FROM users
+    WHERE username = ? AND password = ?
+'''
+INCREMENT_LOGIN_ATTEMPTS = '''
+    UPDATE users
+    SET login_attempts = login_attempts + 1,
+        last_attempt = datetime('now')
+    WHERE username = ?
+'''
+SELECT_ATTEMPT_COUNT = '''
+    SELECT login_attempts
+    FROM users
+    WHERE username = ?
+'''
+INSERT_ANALYSIS_RESULT = '''
+    INSERT INTO analysis_results (id, session_id, kind, main_patent_id, payload)
+    VALUES (?, ?, ?, ?, ?)
+'''
+SELECT_ANALYSIS_RESULT = '''
+    SELECT id, session_id, kind, main_patent_id, payload, created_at
+    FROM analysis_results
+    WHERE id = ?
+'''
+DELETE_OLD_ANALYSIS_RESULTS = '''
+    DELETE FROM analysis_results
+    WHERE created_at < datetime('now', ?)
+'''
+
+
+class DatabaseManager:
+    """Acceso a SQLite con una conexión persistente por hilo.
+
+    sqlite3 no permite compartir una conexión entre hilos sin bloquearla, así
+    que cada hilo abre la suya la primera vez que la necesita y la reutiliza
+    después. La base de datos está en modo WAL: las lecturas de login no se
+    bloquean con las escrituras. Los métodos ``*_async`` ejecutan las
+    consultas en un pool de hilos propio para no bloquear el bucle de eventos.
+    """
+
+    def __init__(self, db_path=DATABASE_PATH, pool_size: int = DB_POOL_SIZE,
+                 results_retention_hours: float = ANALYSIS_RESULTS_RETENTION_HOURS,
+                 results_prune_interval_s: float = ANALYSIS_RESULTS_PRUNE_INTERVAL_S):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.results_retention_hours = results_retention_hours
+        self.results_prune_interval_s = results_prune_interval_s
+        self._last_results_prune = time.monotonic()
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.init_db()
+
+    def create_connection(self):
+        """Crear y retornar una conexión a la base de datos con los pragmas de rendimiento."""
+        try:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                check_same_thread=False,
+                cached_statements=128
+            )
+            conn.execute("PRAGMA journal_mode = WAL")
+            # NORMAL es seguro en WAL: una caída solo puede perder la última transacción
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}")
+            conn.execute(f"PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}")
+            conn.execute(f"PRAGMA mmap_size = {int(DB_MMAP_SIZE_MB) * 2**20}")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            return conn
+        except Error as e:
+            logger.error(f"Error al conectar a la base de datos: {e}")
+            return None
+
+    def connection(self):
+        """Conexión persistente del hilo actual, creada la primera vez."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.create_connection()
+            if conn is not None:
+                self._local.conn = conn
+                with self._connections_lock:
+                    self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Cerrar todas las conexiones abiertas y el pool de hilos."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="db")
+        return self._executor
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Ejecutar un método de acceso a datos en el pool de hilos de la base de datos.
+
+        El pool tiene ``pool_size`` hilos, cada uno con su conexión persistente.
+        """
+        # Import perezoso: executors no debe ser requisito para usar el gestor desde scripts
+        from ..executors import stage_executors
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(self._get_executor(), partial(fn, *args, **kwargs))
+        except Exception:
+            stage_executors.record("database", time.perf_counter() - started, failed=True)
+            raise
+        stage_executors.record("database", time.perf_counter() - started)
+        return result
+
+    def init_db(self):
+        """Inicializar la base de datos y crear las tablas necesarias."""
+        conn = self.connection()
+        if conn is not None:
+            try:
+                with conn:
+                    # Filas de table_info: (cid, name, type, notnull, dflt_value, pk)
+                    column_types = {row[1]: row[2] for row in conn.execute(ANALYSIS_RESULTS_COLUMNS)}
+                    if column_types.get('id', '').upper() == 'INTEGER':
+                        conn.execute(DROP_INTEGER_ID_ANALYSIS_RESULTS)
+                    conn.executescript(SCHEMA)
+                    # Insertar usuario inicial
+                    conn.execute(INSERT_DEFAULT_USER, ('uspatent', 'uspatent', 'usuario generico'))
+            except Error as e:
+                logger.error(f"Error al inicializar la base de datos: {e}")
+
+    def check_login_attempts(self, username: str) -> tuple:
+        """Verificar intentos de login para un usuario."""
+        conn = self.connection()
+        if conn is not None:
+            return conn.execute(SELECT_LOGIN_ATTEMPTS, (username,)).fetchone()
+        return None
+
+    def reset_login_attempts(self, username: str):
+        """Resetear contador de intentos de login."""
+        conn = self.connection()
+        if conn is not None:
+            with conn:
+                conn.execute(RESET_LOGIN_ATTEMPTS, (username,))
+
+    def verify_credentials(self, username: str, password: str) -> tuple:
+        """Verificar credenciales de usuario."""
+        conn = self.connection()
+        if conn is not None:
+            return conn.execute(SELECT_CREDENTIALS, (username, password)).fetchone()
+        return None
+
+    def increment_login_attempts(self, username: str) -> int:
+        """Incrementar contador de intentos fallidos y retornar número actual."""
+        conn = self.connection()
+        if conn is not None:
+            # UPDATE ... RETURNING exige SQLite 3.35; la lectura va en la misma transacción
+            with conn:
+                conn.execute(INCREMENT_LOGIN_ATTEMPTS, (username,))
+                attempts = conn.execute(SELECT_ATTEMPT_COUNT, (username,)).fetchone()
+            return attempts[0] if attempts else 0
+        return 0
+
+    async def verify_credentials_async(self, username: str, password: str) -> tuple:
+        return await self.run(self.verify_credentials, username, password)
+
+    def save_analysis_result(self, kind: str, payload: Dict, session_id: Optional[str] = None,
+                             main_patent_id: Optional[str] = None) -> Optional[str]:
+        """Guardar un resultado de análisis serializado en JSON y retornar su id aleatorio.
+
+        De paso borra los resultados vencidos, como mucho una vez cada
+        ``results_prune_interval_s`` segundos.
+        """
+        conn = self.connection()
+        if conn is not None:
+            result_id = secrets.token_urlsafe(16)
+            with conn:
+                conn.execute(
+                    INSERT_ANALYSIS_RESULT, (result_id, session_id, kind, main_patent_id, json.dumps(payload))
+                )
+            if time.monotonic() - self._last_results_prune >= self.results_prune_interval_s:
+                self._last_results_prune = time.monotonic()
+                self.delete_analysis_results_older_than(self.results_retention_hours)
+            return result_id
+        return None
+
+    def get_analysis_result(self, result_id: str) -> Optional[Dict]:
+        """Recuperar un resultado de análisis por id."""
+        conn = self.connection()
+        if conn is not None:
+            row = conn.execute(SELECT_ANALYSIS_RESULT, (result_id,)).fetchone()
+            if row is not None:
+                return {
+                    'id': row[0],
+                    'session_id': row[1],
+                    'kind': row[2],
+                    'main_patent_id': row[3],
+                    'payload': json.loads(row[4]),
+                    'created_at': row[5],
+                }
+        return None
+
+    def delete_analysis_results_older_than(self, hours: float) -> int:
+        """Eliminar resultados de análisis antiguos y retornar cuántos se borraron."""
+        conn = self.connection()
+        if conn is not None:
+            with conn:
+                cursor = conn.execute(DELETE_OLD_ANALYSIS_RESULTS, (f'-{float(hours)} hours',))
+            return cursor.rowcount
+        return 0
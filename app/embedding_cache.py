@@ -0,0 +1,63 @@
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from .embedding_store import EmbeddingStore, DEFAULT_STORE_DIR
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza espacios para que el mismo documento produzca la misma clave."""
+    return ' '.join(text.split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Caché persistente de embeddings por documento, compartida entre sesiones.
+
+    La clave depende solo del modelo, de la configuración de inferencia y del
+    texto normalizado, de modo que un documento citado se codifica una única
+    vez sin importar la sesión ni el resto del lote en que aparezca. Los
+    vectores viven en un ``EmbeddingStore`` binario mapeado en memoria.
+    """
+
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR, dtype: str = 'float32'):
+        self.store = EmbeddingStore(store_dir, dtype=dtype)
+
+    @staticmethod
+    def make_key(model_name: str, max_length: int, pooling: str, text: str) -> str:
+        content = f"{model_name}|{max_length}|{pooling}|{text_hash(text)}"
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.store
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        return self.store.get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        return self.store.get_many(keys)
+
+    def put(self, key: str, vector) -> None:
+        self.store.put(key, vector)
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        self.store.put_many(items)
+
+
+_shared_cache: Optional[EmbeddingCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Devuelve la caché de embeddings compartida por todo el proceso."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = EmbeddingCache()
+    return _shared_cache
@@ -0,0 +1,247 @@
+import json
+import os
+import threading
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = "data/embedding_store"
+
+SUPPORTED_DTYPES = ('float32', 'float16')
+
+
+class StoreBusy(RuntimeError):
+    """Otro proceso tiene reservado el almacén de forma incompatible."""
+
+
+class EmbeddingStore:
+    """Almacén binario de embeddings respaldado por una matriz contigua.
+
+    Los vectores se guardan uno tras otro en ``vectors.bin`` y un índice
+    ``index.jsonl`` de solo anexado asocia cada id con su fila. La lectura
+    se hace con ``np.memmap``, por lo que cada vector es una vista sin copia
+    y anexar nuevos vectores nunca reescribe los existentes.
+
+    Varios procesos pueden anexar al mismo almacén: cada escritura toma un
+    ``flock`` exclusivo sobre ``store.lock`` e incorpora antes las filas que
+    hayan anexado los demás, de modo que la fila de cada clave es siempre su
+    posición real en ``vectors.bin``.
+
+    Además, cada proceso que escribe reserva el almacén con ``claim``: el
+    servidor en modo compartido y la carga masiva en exclusivo, de modo que
+    la carga masiva no corre mientras el servidor está activo (ni al revés).
+    """
+
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR, dtype: str = 'float32'):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.store_dir / "vectors.bin"
+        self.index_path = self.store_dir / "index.jsonl"
+        self.meta_path = self.store_dir / "meta.json"
+        self.lock_path = self.store_dir / "store.lock"
+        self.owner_lock_path = self.store_dir / "owner.lock"
+        self._owner_file = None
+
+        self._lock = threading.Lock()
+        self._index: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._index_offset = 0
+        self._matrix: Optional[np.memmap] = None
+
+        self._load_meta(dtype)
+        with self._lock, self._file_lock():
+            self._sync()
+
+    @contextmanager
+    def _file_lock(self):
+        """Bloqueo exclusivo entre procesos mientras se lee o se anexa al almacén."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def claim(self, exclusive: bool = False, wait: bool = False) -> None:
+        """Reserva el almacén para este proceso hasta ``release`` o hasta que termine.
+
+        Con ``wait=False`` lanza ``StoreBusy`` si otro proceso lo tiene reservado.
+        """
+        if fcntl is None or self._owner_file is not None:
+            return
+        f = open(self.owner_lock_path, 'a')
+        operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        try:
+            fcntl.flock(f.fileno(), operation if wait else operation | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            mode = "exclusivo" if exclusive else "compartido"
+            raise StoreBusy(f"El almacén {self.store_dir} está reservado por otro proceso (modo {mode} no disponible)")
+        self._owner_file = f
+        # Lo escrito antes de obtener la reserva también cuenta
+        with self._lock, self._file_lock():
+            self._sync()
+
+    def release(self) -> None:
+        if self._owner_file is not None:
+            fcntl.flock(self._owner_file.fileno(), fcntl.LOCK_UN)
+            self._owner_file.close()
+            self._owner_file = None
+
+    def _load_meta(self, dtype: str):
+        if self.meta_path.exists():
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            self.dtype = np.dtype(meta['dtype'])
+            self.dim = meta.get('dim')
+        else:
+            if dtype not in SUPPORTED_DTYPES:
+                raise ValueError(f"dtype no soportado: {dtype}. Opciones: {SUPPORTED_DTYPES}")
+            self.dtype = np.dtype(dtype)
+            self.dim = None
+
+    def _save_meta(self):
+        with open(self.meta_path, 'w') as f:
+            json.dump({'dtype': self.dtype.name, 'dim': self.dim}, f)
+
+    def _sync(self):
+        """Incorpora las filas que otros procesos anexaron; requiere ``_file_lock``."""
+        if self.dim is None and self.meta_path.exists():
+            self._load_meta(self.dtype.name)
+        if self.dim is None:
+            return
+
+        # Solo se consideran filas completamente escritas en el archivo de vectores
+        row_bytes = self.dim * self.dtype.itemsize
+        available_rows = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+
+        if self.index_path.exists():
+            with open(self.index_path, 'r+b') as f:
+                f.seek(self._index_offset)
+                for raw in f:
+                    if not raw.endswith(b'\n'):
+                        # Línea a medias de una caída: se descarta para no pegarle la siguiente
+                        f.truncate(self._index_offset)
+                        break
+                    self._index_offset += len(raw)
+                    line = raw.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"Línea de índice corrupta ignorada en {self.index_path}")
+                        continue
+                    if entry['row'] != len(self._ids) or entry['row'] >= available_rows:
+                        continue
+                    self._index[entry['id']] = entry['row']
+                    self._ids.append(entry['id'])
+
+        # Descartar filas escritas sin entrada de índice (p. ej. tras una caída).
+        # Con el bloqueo tomado ningún otro proceso está a mitad de una escritura.
+        if self.vectors_path.exists() and self.vectors_path.stat().st_size != len(self._ids) * row_bytes:
+            with open(self.vectors_path, 'r+b') as f:
+                f.truncate(len(self._ids) * row_bytes)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def ids(self) -> List[str]:
+        return list(self._ids)
+
+    def id_at(self, row: int) -> str:
+        return self._ids[row]
+
+    def matrix(self) -> np.ndarray:
+        """Vista de solo lectura sobre todas las filas almacenadas."""
+        with self._lock:
+            n_rows = len(self._ids)
+            if n_rows == 0:
+                return np.empty((0, self.dim or 0), dtype=self.dtype)
+            if self._matrix is None or self._matrix.shape[0] < n_rows:
+                self._matrix = np.memmap(
+                    self.vectors_path, dtype=self.dtype, mode='r', shape=(n_rows, self.dim)
+                )
+            return self._matrix[:n_rows]
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self._index.get(key)
+        if row is None:
+            return None
+        return self.matrix()[row]
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        matrix = None
+        found = {}
+        for key in keys:
+            row = self._index.get(key)
+            if row is None:
+                continue
+            if matrix is None:
+                matrix = self.matrix()
+            found[key] = matrix[row]
+        return found
+
+    def rows(self, keys: Iterable[str]) -> List[int]:
+        return [self._index[key] for key in keys]
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        """Anexa los vectores nuevos al final del archivo sin reescribir los existentes."""
+        if not items:
+            return
+
+        with self._lock, self._file_lock():
+            # Otro proceso pudo anexar filas desde la última escritura de este
+            self._sync()
+            new_items = [(key, vector) for key, vector in items.items() if key not in self._index]
+            if not new_items:
+                return
+
+            block = np.stack([np.asarray(vector, dtype=self.dtype).ravel() for _, vector in new_items])
+            if self.dim is None:
+                self.dim = block.shape[1]
+                self._save_meta()
+            elif block.shape[1] != self.dim:
+                raise ValueError(f"Dimensión {block.shape[1]} distinta a la del almacén ({self.dim})")
+
+            # La primera fila nueva es el final real del archivo, no el de la lista en memoria
+            row_bytes = self.dim * self.dtype.itemsize
+            first_row = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+            if first_row != len(self._ids):
+                raise RuntimeError(f"Almacén inconsistente: {first_row} filas en disco, {len(self._ids)} indexadas")
+
+            # Primero los vectores y luego el índice: una fila sin índice se ignora al abrir
+            with open(self.vectors_path, 'ab') as f:
+                f.write(block.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            lines = ''.join(
+                json.dumps({'id': key, 'row': first_row + offset}) + '\n' for offset, (key, _) in enumerate(new_items)
+            ).encode('utf-8')
+            with open(self.index_path, 'ab') as f:
+                f.write(lines)
+            self._index_offset += len(lines)
+
+            for offset, (key, _) in enumerate(new_items):
+                self._index[key] = first_row + offset
+                self._ids.append(key)
+
+    def put(self, key: str, vector) -> None:
+        self.put_many({key: vector})
@@ -1,376 +1,555 @@
-import torch
-import numpy as np
-import nltk
-import json
-import hashlib
-from pathlib import Path
-from sklearn.manifold import TSNE
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModel
-import traceback
-from datetime import datetime
-import time
-import os
-import shutil
-
-
-class EmbeddingsGenerator:
-    def __init__(self):
-        try:
-            self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-            print(f"Usando dispositivo: {self.device}")
-            self.model_name = "anferico/bert-for-patents"
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.model = AutoModel.from_pretrained(self.model_name).to(self.device)
-            self.max_length = 500
-        except Exception as e:
-            print(f"Error inicializando EmbeddingsGenerator: {str(e)}")
-            raise
-
-    def split_text_by_sentences(self, text):
-        try:
-            if not isinstance(text, str):
-                raise ValueError(f"El texto debe ser una cadena, no {type(text)}")
-            
-            sentences = nltk.sent_tokenize(text)
-            chunks = []
-            current_chunk = ''
-            
-            for sentence in sentences:
-                if len(self.tokenizer.encode(current_chunk + ' ' + sentence, add_special_tokens=False)) <= self.max_length:
-                    current_chunk += ' ' + sentence
-                else:
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = sentence
-                    
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-                
-            return chunks
-        except Exception as e:
-            print(f"Error en split_text_by_sentences: {str(e)}")
-            raise
-
-    def get_embeddings_bfp(self, texts):
-        try:
-            if not texts:
-                raise ValueError("La lista de textos está vacía")
-
-            all_embeddings = []
-            all_segments = []
-            segments_per_text = []
-            
-            # Dividir textos en segmentos
-            for text in texts:
-                segments = self.split_text_by_sentences(text)
-                if not segments:
-                    raise ValueError(f"No se pudieron extraer segmentos del texto: {text[:100]}...")
-                all_segments.extend(segments)
-                segments_per_text.append(len(segments))
-            
-            # Generar embeddings
-            segment_embeddings = []
-            batch_size = 256
-            
-            for i in range(0, len(all_segments), batch_size):
-                batch = all_segments[i:i + batch_size]
-                inputs = self.tokenizer(batch, return_tensors="pt", padding=True, truncation=True, max_length=self.max_length)
-                inputs = {key: value.to(self.device) for key, value in inputs.items()}
-                
-                with torch.no_grad():
-                    outputs = self.model(**inputs)
-                embeddings = outputs.last_hidden_state[:, 0, :].cpu().numpy()
-                segment_embeddings.extend(embeddings)
-            
-            # Combinar embeddings
-            idx = 0
-            for num_segments in segments_per_text:
-                text_embeddings = segment_embeddings[idx:idx + num_segments]
-                text_embedding = np.mean(text_embeddings, axis=0)
-                all_embeddings.append(text_embedding.tolist())
-                idx += num_segments
-                
-            return all_embeddings
-        except Exception as e:
-            print(f"Error en get_embeddings_bfp: {str(e)}")
-            print(traceback.format_exc())
-            raise
-
-class EmbeddingsProcessor:
-    def __init__(self, cache_dir="data/embeddings_cache"):
-        try:
-            # Crear un directorio de caché específico para la sesión
-            self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.cache_dir = Path(cache_dir) / self.session_id
-            self.cache_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Limpiar cachés antiguos
-            self.clean_old_cache_dirs(Path(cache_dir))
-            
-            self.embeddings_generator = EmbeddingsGenerator()
-            # Descargar recursos de NLTK
-            nltk.download('punkt', quiet=True)
-            nltk.download('punkt_tab', quiet=True)
-            print(f"Nueva sesión iniciada: {self.session_id}")
-        except Exception as e:
-            print(f"Error inicializando EmbeddingsProcessor: {str(e)}")
-            raise
-
-    def clean_old_cache_dirs(self, base_cache_dir, max_dirs=5):
-        """Limpia directorios de caché antiguos, manteniendo solo los más recientes."""
-        try:
-            if not base_cache_dir.exists():
-                return
-                
-            # Listar todos los directorios de sesión
-            session_dirs = [d for d in base_cache_dir.iterdir() if d.is_dir()]
-            
-            # Ordenar por fecha de modificación (más antiguo primero)
-            session_dirs.sort(key=lambda x: x.stat().st_mtime)
-            
-            # Eliminar directorios antiguos si hay más que el máximo permitido
-            while len(session_dirs) >= max_dirs:
-                oldest_dir = session_dirs.pop(0)
-                try:
-                    shutil.rmtree(oldest_dir)
-                    print(f"Caché antiguo eliminado: {oldest_dir}")
-                except Exception as e:
-                    print(f"Error al eliminar directorio antiguo {oldest_dir}: {e}")
-
-        except Exception as e:
-            print(f"Error limpiando cachés antiguos: {e}")
-
-    def generate_cache_key(self, patent_data):
-        try:
-            main_key = next(key for key in patent_data.keys() if key != 'cited_document_id')
-            content = str(patent_data[main_key])
-            for _, text in sorted(patent_data['cited_document_id'].items()):
-                content += str(text)
-            
-            # Incluir el ID de sesión en la clave del caché
-            session_content = f"{self.session_id}_{content}"
-            return hashlib.sha256(session_content.encode()).hexdigest()
-        except Exception as e:
-            print(f"Error generando cache key: {str(e)}")
-            raise
-
-    def reduce_dimensionality(self, embeddings_list):
-        try:
-            if not embeddings_list:
-                raise ValueError("Lista de embeddings vacía")
-            
-            all_embeddings = np.array(embeddings_list)
-            n_samples = len(all_embeddings)
-            
-            if n_samples <= 2:
-                print("Muy pocas muestras para t-SNE, retornando coordenadas aleatorias")
-                return np.random.rand(n_samples, 3).tolist()
-            else:
-                perplexity = min(max(n_samples // 3, 2), 30)
-                perplexity = min(perplexity, n_samples - 1)
-                
-                print(f"Usando perplejidad de {perplexity} para {n_samples} muestras")
-                tsne = TSNE(n_components=3, random_state=42, perplexity=perplexity)
-                reduced_embeddings = tsne.fit_transform(all_embeddings)
-                return reduced_embeddings.tolist()
-                
-        except Exception as e:
-            print(f"Error en reduce_dimensionality: {str(e)}")
-            raise
-
-    def process_embeddings(self, embeddings_data):
-        """Procesa los embeddings para incluir la reducción de dimensionalidad."""
-        try:
-            all_embeddings = [embeddings_data['main_patent']['embedding']]
-            for patent in embeddings_data['cited_patents']:
-                all_embeddings.append(patent['embedding'])
-            
-            reduced_embeddings = self.reduce_dimensionality(all_embeddings)
-            
-            embeddings_data['main_patent']['reduced_embedding'] = reduced_embeddings[0]
-            for i, patent in enumerate(embeddings_data['cited_patents']):
-                patent['reduced_embedding'] = reduced_embeddings[i + 1]
-            
-            return embeddings_data
-        except Exception as e:
-            print(f"Error en process_embeddings: {str(e)}")
-            raise
-
-    def process_patent_data(self, patent_data):
-        """Procesa los datos de la patente, incluyendo embeddings y reducción."""
-        try:
-            if not isinstance(patent_data, dict):
-                raise ValueError(f"patent_data debe ser un diccionario, no {type(patent_data)}")
-            if 'cited_document_id' not in patent_data:
-                raise ValueError("patent_data debe contener la clave 'cited_document_id'")
-            
-            cache_key = self.generate_cache_key(patent_data)
-            cache_file = self.cache_dir / f"{cache_key}.json"
-            
-            if cache_file.exists():
-                with open(cache_file, 'r') as f:
-                    cached_data = json.load(f)
-                    print(f"Datos recuperados de caché de sesión: {self.session_id}")
-                    return {"embeddings": cached_data, "from_cache": True}
-
-            print(f"Generando nuevos embeddings para sesión: {self.session_id}")
-            
-            main_patent_id = next(key for key in patent_data.keys() if key != 'cited_document_id')
-            main_text = patent_data[main_patent_id]
-            cited_texts = list(patent_data['cited_document_id'].values())
-            
-            main_embedding = self.embeddings_generator.get_embeddings_bfp([main_text])[0]
-            cited_embeddings = self.embeddings_generator.get_embeddings_bfp(cited_texts)
-            
-            result = {
-                'main_patent': {
-                    'id': main_patent_id,
-                    'embedding': main_embedding
-                },
-                'cited_patents': [
-                    {
-                        'id': patent_id,
-                        'embedding': embedding
-                    }
-                    for patent_id, embedding in zip(patent_data['cited_document_id'].keys(), cited_embeddings)
-                ]
-            }
-            
-            result_with_reduction = self.process_embeddings(result)
-            
-            with open(cache_file, 'w') as f:
-                json.dump(result_with_reduction, f)
-            
-            print(f"Nuevos embeddings generados y guardados en caché de sesión: {self.session_id}")
-            return {"embeddings": result_with_reduction, "from_cache": False}
-        
-        except Exception as e:
-            print(f"Error en process_patent_data: {str(e)}")
-            print(traceback.format_exc())
-            raise
-
-'''
-class EmbeddingsProcessor:
-    def __init__(self, cache_dir="data/embeddings_cache"):
-        try:
-            self.cache_dir = Path(cache_dir)
-            self.cache_dir.mkdir(parents=True, exist_ok=True)
-            # No inicializamos TSNE aquí, lo haremos dinámicamente
-            self.embeddings_generator = EmbeddingsGenerator()
-            # Descargar recursos de NLTK
-            nltk.download('punkt', quiet=True)
-        except Exception as e:
-            print(f"Error inicializando EmbeddingsProcessor: {str(e)}")
-            raise
-
-    def generate_cache_key(self, patent_data):
-        try:
-            main_key = next(key for key in patent_data.keys() if key != 'cited_document_id')
-            content = str(patent_data[main_key])
-            for _, text in sorted(patent_data['cited_document_id'].items()):
-                content += str(text)
-            return hashlib.sha256(content.encode()).hexdigest()
-        except Exception as e:
-            print(f"Error generando cache key: {str(e)}")
-            raise
-
-    def reduce_dimensionality(self, embeddings_list):
-        try:
-            if not embeddings_list:
-                raise ValueError("Lista de embeddings vacía")
-            
-            all_embeddings = np.array(embeddings_list)
-            n_samples = len(all_embeddings)
-            
-            # Ajustar la perplejidad basada en el número de muestras
-            if n_samples <= 2:
-                # Para 1 o 2 muestras, no podemos usar t-SNE
-                print("Muy pocas muestras para t-SNE, retornando coordenadas aleatorias")
-                return np.random.rand(n_samples, 3).tolist()
-            else:
-                # Usar una perplejidad que sea aproximadamente 1/3 del número de muestras
-                # pero no mayor a 30 y no menor a 2
-                perplexity = min(max(n_samples // 3, 2), 30)
-                perplexity = min(perplexity, n_samples - 1)  # Asegurar que sea menor que n_samples
-                
-                print(f"Usando perplejidad de {perplexity} para {n_samples} muestras")
-                tsne = TSNE(n_components=3, random_state=42, perplexity=perplexity)
-                reduced_embeddings = tsne.fit_transform(all_embeddings)
-                return reduced_embeddings.tolist()
-                
-        except Exception as e:
-            print(f"Error en reduce_dimensionality: {str(e)}")
-            raise
-
-    def process_embeddings(self, embeddings_data):
-        """Procesa los embeddings para incluir la reducción de dimensionalidad."""
-        try:
-            all_embeddings = [embeddings_data['main_patent']['embedding']]
-            for patent in embeddings_data['cited_patents']:
-                all_embeddings.append(patent['embedding'])
-            
-            reduced_embeddings = self.reduce_dimensionality(all_embeddings)
-            
-            embeddings_data['main_patent']['reduced_embedding'] = reduced_embeddings[0]
-            for i, patent in enumerate(embeddings_data['cited_patents']):
-                patent['reduced_embedding'] = reduced_embeddings[i + 1]
-            
-            return embeddings_data
-        except Exception as e:
-            print(f"Error en process_embeddings: {str(e)}")
-            raise
-
-    def process_patent_data(self, patent_data):
-        """Procesa los datos de la patente, incluyendo embeddings y reducción."""
-        try:
-            if not isinstance(patent_data, dict):
-                raise ValueError(f"patent_data debe ser un diccionario, no {type(patent_data)}")
-            if 'cited_document_id' not in patent_data:
-                raise ValueError("patent_data debe contener la clave 'cited_document_id'")
-            
-            cache_key = self.generate_cache_key(patent_data)
-            cache_file = self.cache_dir / f"{cache_key}.json"
-            
-            if cache_file.exists():
-                with open(cache_file, 'r') as f:
-                    cached_data = json.load(f)
-                    print("Datos recuperados de caché")
-                    return {"embeddings": cached_data, "from_cache": True}
-
-            print("Generando nuevos embeddings...")
-            
-            main_patent_id = next(key for key in patent_data.keys() if key != 'cited_document_id')
-            main_text = patent_data[main_patent_id]
-            cited_texts = list(patent_data['cited_document_id'].values())
-            
-            main_embedding = self.embeddings_generator.get_embeddings_bfp([main_text])[0]
-            cited_embeddings = self.embeddings_generator.get_embeddings_bfp(cited_texts)
-            
-            result = {
-                'main_patent': {
-                    'id': main_patent_id,
-                    'embedding': main_embedding
-                },
-                'cited_patents': [
-                    {
-                        'id': patent_id,
-                        'embedding': embedding
-                    }
-                    for patent_id, embedding in zip(patent_data['cited_document_id'].keys(), cited_embeddings)
-                ]
-            }
-            
-            result_with_reduction = self.process_embeddings(result)
-            
-            with open(cache_file, 'w') as f:
-                json.dump(result_with_reduction, f)
-            
-            print("Nuevos embeddings generados y guardados en caché")
-            return {"embeddings": result_with_reduction, "from_cache": False}
-        
-        except Exception as e:
-            print(f"Error en process_patent_data: {str(e)}")
-            print(traceback.format_exc())
-            raise
+import threading
+import numpy as np
+import traceback
+from datetime import datetime
+from .model_registry import get_shared_model, DEFAULT_MODEL_NAME
+from .embedding_cache import EmbeddingCache, get_embedding_cache
+from .projection import get_projection_engine
+from .config import PROJECTION_METHOD, INFERENCE_BACKEND
+from .similarity import cosine_similarities, cosine_angles, euclidean_distances
+
+# Campos de la respuesta de /generate_embeddings:
+# "summary": coordenadas 3D y similitud, ángulo y distancia de cada citado (sin vectores)
+# "reduced": solo las coordenadas 3D
+# "full": además los vectores completos
+RESPONSE_FIELDS = ("summary", "reduced", "full")
+
+
+# Los recursos de NLTK se descargan una sola vez por proceso
+_nltk_ready = False
+_nltk_lock = threading.Lock()
+
+
+def ensure_nltk_data():
+    global _nltk_ready
+    if _nltk_ready:
+        return
+    with _nltk_lock:
+        if not _nltk_ready:
+            import nltk
+            nltk.download('punkt', quiet=True)
+            nltk.download('punkt_tab', quiet=True)
+            _nltk_ready = True
+
+
+class EmbeddingsGenerator:
+    # CLS de cada segmento, promediado entre los segmentos del texto
+    pooling = "cls-mean"
+    # Tokens por segmento, incluidos [CLS] y [SEP]
+    max_length = 500
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, cache=None, use_cache=True,
+                 batching="bucketed", batch_size=256, max_batch_tokens=16384, backend=INFERENCE_BACKEND):
+        try:
+            # torch y transformers se importan aquí, al crear el primer generador
+            from .inference_backends import get_inference_backend
+
+            ensure_nltk_data()
+            # El tokenizer y los pesos se comparten entre todas las sesiones
+            shared = get_shared_model(model_name)
+            self.device = shared.device
+            self.model_name = shared.model_name
+            self.tokenizer = shared.tokenizer
+            self.model = shared.model
+            self.tokenizer_lock = shared.tokenizer_lock
+            # Ejecución del modelo: fp32 en PyTorch, int8 dinámico u ONNX Runtime
+            self.backend = get_inference_backend(backend, model_name)
+            self.backend_name = backend
+            self.cache = cache if cache is not None else get_embedding_cache()
+            self.use_cache = use_cache
+            # "bucketed": lotes por longitud y presupuesto de tokens; "fixed": lotes de batch_size
+            if batching not in ("bucketed", "fixed"):
+                raise ValueError(f"Modo de batching no soportado: {batching}")
+            self.batching = batching
+            self.batch_size = batch_size
+            self.max_batch_tokens = max_batch_tokens
+            # Tokens reales (sin relleno) enviados al modelo, para medir el rendimiento
+            self.tokens_encoded = 0
+        except Exception as e:
+            print(f"Error inicializando EmbeddingsGenerator: {str(e)}")
+            raise
+
+    def split_text_by_sentences(self, text):
+        """Divide el texto en fragmentos de oraciones y devuelve los ids de tokens de cada uno.
+
+        Cada oración se tokeniza una sola vez; los fragmentos se arman sumando
+        los conteos de tokens, sin volver a tokenizar el fragmento acumulado.
+        """
+        try:
+            if not isinstance(text, str):
+                raise ValueError(f"El texto debe ser una cadena, no {type(text)}")
+            
+            import nltk
+            sentences = nltk.sent_tokenize(text)
+            if not sentences:
+                return []
+            
+            with self.tokenizer_lock:
+                sentence_ids = self.tokenizer(sentences, add_special_tokens=False)['input_ids']
+            chunks = []
+            current_chunk = []
+            
+            for ids in sentence_ids:
+                if len(current_chunk) + len(ids) <= self.max_length:
+                    current_chunk.extend(ids)
+                else:
+                    if current_chunk:
+                        chunks.append(current_chunk)
+                    current_chunk = list(ids)
+                    
+            if current_chunk:
+                chunks.append(current_chunk)
+                
+            return chunks
+        except Exception as e:
+            print(f"Error en split_text_by_sentences: {str(e)}")
+            raise
+
+    def build_features(self, segments):
+        """Añade [CLS]/[SEP] a cada fragmento y lo recorta a max_length, como hacía el tokenizer."""
+        cls_id = self.tokenizer.cls_token_id
+        sep_id = self.tokenizer.sep_token_id
+        content_length = self.max_length - 2
+        return [{'input_ids': [cls_id] + ids[:content_length] + [sep_id]} for ids in segments]
+
+    @classmethod
+    def make_cache_key(cls, model_name, text, backend="torch"):
+        """Clave de caché sin necesidad de cargar el modelo.
+
+        Los vectores de int8/onnx difieren levemente de los fp32, así que no comparten entradas.
+        """
+        pooling = cls.pooling if backend == "torch" else f"{cls.pooling}|{backend}"
+        return EmbeddingCache.make_key(model_name, cls.max_length, pooling, text)
+
+    def cache_key(self, text):
+        return self.make_cache_key(self.model_name, text, self.backend_name)
+
+    def is_cached(self, text):
+        return self.use_cache and self.cache_key(text) in self.cache
+
+    def get_embeddings_bfp(self, texts, transient=()):
+        """Devuelve un embedding por texto, ejecutando el modelo solo para los textos no vistos.
+
+        Los textos de ``transient`` se embeben pero no se guardan en el almacén.
+        """
+        try:
+            if not texts:
+                raise ValueError("La lista de textos está vacía")
+
+            if not self.use_cache:
+                return self.encode_texts(texts)
+
+            keys = [self.cache_key(text) for text in texts]
+            cached = self.cache.get_many(set(keys))
+
+            # Textos pendientes, sin duplicados, en orden de aparición
+            pending = {}
+            for key, text in zip(keys, texts):
+                if key not in cached and key not in pending:
+                    pending[key] = text
+
+            if pending:
+                print(f"Embeddings en caché: {len(texts) - len(pending)}/{len(texts)}, generando {len(pending)}")
+                new_embeddings = self.encode_texts(list(pending.values()))
+                computed = dict(zip(pending.keys(), new_embeddings))
+                transient_keys = {self.cache_key(text) for text in transient}
+                self.cache.put_many({key: value for key, value in computed.items() if key not in transient_keys})
+                cached.update(computed)
+
+            return [np.asarray(cached[key], dtype=np.float32).tolist() for key in keys]
+        except Exception as e:
+            print(f"Error en get_embeddings_bfp: {str(e)}")
+            print(traceback.format_exc())
+            raise
+
+    def embed_bundles(self, bundles, transient=()):
+        """Embebe varios lotes (texto principal, [textos citados]) en una sola llamada.
+
+        Todos los textos se envían juntos al modelo y el resultado se separa
+        de nuevo como [(embedding principal, [embeddings citados]), ...].
+        Los textos de ``transient`` no se guardan en el almacén.
+        """
+        all_texts = []
+        for main_text, cited_texts in bundles:
+            all_texts.append(main_text)
+            all_texts.extend(cited_texts)
+        
+        return self.split_bundles(bundles, self.get_embeddings_bfp(all_texts, transient))
+
+    @classmethod
+    def bundles_from_cache(cls, bundles, model_name=DEFAULT_MODEL_NAME, backend=INFERENCE_BACKEND):
+        """Resultado de embed_bundles leído del almacén, sin cargar el modelo.
+
+        Devuelve None si algún texto aún no tiene embedding.
+        """
+        keys = [
+            cls.make_cache_key(model_name, text, backend)
+            for main_text, cited_texts in bundles for text in [main_text, *cited_texts]
+        ]
+        cached = get_embedding_cache().get_many(set(keys))
+        if len(cached) < len(set(keys)):
+            return None
+        return cls.split_bundles(bundles, [np.asarray(cached[key], dtype=np.float32).tolist() for key in keys])
+
+    @staticmethod
+    def split_bundles(bundles, all_embeddings):
+        """Separa los embeddings en el orden de los lotes: [(principal, [citados]), ...]."""
+        results = []
+        idx = 0
+        for _, cited_texts in bundles:
+            main_embedding = all_embeddings[idx]
+            cited_embeddings = all_embeddings[idx + 1:idx + 1 + len(cited_texts)]
+            results.append((main_embedding, cited_embeddings))
+            idx += 1 + len(cited_texts)
+        
+        return results
+
+    def encode_texts(self, texts):
+        """Ejecuta el modelo sobre los textos: CLS por segmento y media por texto."""
+        try:
+            all_embeddings = []
+            all_segments = []
+            segments_per_text = []
+            
+            # Dividir textos en segmentos
+            for text in texts:
+                segments = self.split_text_by_sentences(text)
+                if not segments:
+                    raise ValueError(f"No se pudieron extraer segmentos del texto: {text[:100]}...")
+                all_segments.extend(segments)
+                segments_per_text.append(len(segments))
+            self.tokens_encoded += sum(min(len(segment), self.max_length - 2) + 2 for segment in all_segments)
+            
+            # Generar embeddings
+            if self.batching == "fixed":
+                segment_embeddings = self.encode_segments_fixed(all_segments)
+            else:
+                segment_embeddings = self.encode_segments_bucketed(all_segments)
+            
+            # Combinar embeddings
+            idx = 0
+            for num_segments in segments_per_text:
+                text_embeddings = segment_embeddings[idx:idx + num_segments]
+                text_embedding = np.mean(text_embeddings, axis=0)
+                all_embeddings.append(text_embedding.tolist())
+                idx += num_segments
+                
+            return all_embeddings
+        except Exception as e:
+            print(f"Error en encode_texts: {str(e)}")
+            raise
+
+    def encode_segments_fixed(self, segments):
+        """Lotes de tamaño fijo en el orden original (cada lote se rellena al segmento más largo)."""
+        features = self.build_features(segments)
+        segment_embeddings = []
+        
+        for i in range(0, len(features), self.batch_size):
+            inputs = self.tokenizer.pad(features[i:i + self.batch_size], return_tensors="pt")
+            segment_embeddings.extend(self.run_model(inputs))
+        
+        return segment_embeddings
+
+    def encode_segments_bucketed(self, segments):
+        """Ordena los segmentos por longitud y arma lotes por presupuesto de tokens."""
+        features = self.build_features(segments)
+        lengths = [len(feature['input_ids']) for feature in features]
+        
+        segment_embeddings = [None] * len(segments)
+        for batch_indices in self.build_token_budget_batches(lengths):
+            inputs = self.tokenizer.pad([features[i] for i in batch_indices], return_tensors="pt")
+            # Restaurar el orden original de los segmentos
+            for i, embedding in zip(batch_indices, self.run_model(inputs)):
+                segment_embeddings[i] = embedding
+        
+        return segment_embeddings
+
+    def build_token_budget_batches(self, lengths):
+        """Agrupa índices ordenados por longitud sin superar max_batch_tokens (con relleno)."""
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+        batches = []
+        current = []
+        
+        for i in order:
+            # Al ir en orden creciente, el segmento actual fija la longitud del lote
+            padded_tokens = lengths[i] * (len(current) + 1)
+            if current and (padded_tokens > self.max_batch_tokens or len(current) >= self.batch_size):
+                batches.append(current)
+                current = []
+            current.append(i)
+        
+        if current:
+            batches.append(current)
+        return batches
+
+    def run_model(self, inputs):
+        """Devuelve el embedding CLS de cada fila del lote."""
+        return self.backend.run(inputs)
+
+class EmbeddingsProcessor:
+    def __init__(self):
+        try:
+            # Las sesiones solo guardan estado ligero: los embeddings viven en el almacén compartido
+            self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # El generador (y con él el modelo) se crea en el primer uso, no al iniciar sesión
+            self._embeddings_generator = None
+            print(f"Nueva sesión iniciada: {self.session_id}")
+        except Exception as e:
+            print(f"Error inicializando EmbeddingsProcessor: {str(e)}")
+            raise
+
+    @property
+    def embeddings_generator(self):
+        if self._embeddings_generator is None:
+            self._embeddings_generator = EmbeddingsGenerator()
+        return self._embeddings_generator
+
+    def reduce_dimensionality(self, embeddings_list, method=None):
+        """Proyecta los embeddings a 3D con el método indicado (ver app.projection)."""
+        try:
+            return get_projection_engine().project(embeddings_list, method)
+        except Exception as e:
+            print(f"Error en reduce_dimensionality: {str(e)}")
+            raise
+
+    def process_embeddings(self, embeddings_data, reduced_embeddings=None, projection=None):
+        """Procesa los embeddings para incluir la reducción de dimensionalidad."""
+        try:
+            if reduced_embeddings is None:
+                all_embeddings = [embeddings_data['main_patent']['embedding']]
+                for patent in embeddings_data['cited_patents']:
+                    all_embeddings.append(patent['embedding'])
+                
+                reduced_embeddings = self.reduce_dimensionality(all_embeddings, projection)
+            
+            embeddings_data['main_patent']['reduced_embedding'] = reduced_embeddings[0]
+            for i, patent in enumerate(embeddings_data['cited_patents']):
+                patent['reduced_embedding'] = reduced_embeddings[i + 1]
+            
+            return embeddings_data
+        except Exception as e:
+            print(f"Error en process_embeddings: {str(e)}")
+            raise
+
+    def split_patent_data(self, patent_data):
+        """Valida el JSON de entrada y devuelve (id principal, texto principal, {id citado: texto})."""
+        if not isinstance(patent_data, dict):
+            raise ValueError(f"patent_data debe ser un diccionario, no {type(patent_data)}")
+        if 'cited_document_id' not in patent_data:
+            raise ValueError("patent_data debe contener la clave 'cited_document_id'")
+        
+        main_patent_id = next(key for key in patent_data.keys() if key != 'cited_document_id')
+        return main_patent_id, patent_data[main_patent_id], patent_data['cited_document_id']
+
+    @staticmethod
+    def cache_key(text):
+        """Clave del texto en el almacén de embeddings, sin crear el generador ni cargar el modelo."""
+        return EmbeddingsGenerator.make_cache_key(DEFAULT_MODEL_NAME, text, INFERENCE_BACKEND)
+
+    def bundle_from_cache(self, main_text, cited_texts):
+        """Indica si todos los textos del lote ya tienen embedding en la caché."""
+        cache = get_embedding_cache()
+        return all(self.cache_key(text) in cache for text in [main_text] + list(cited_texts))
+
+    def build_result(self, main_patent_id, main_embedding, cited_ids, cited_embeddings, from_cache,
+                     reduced_embeddings=None, projection=None, fields="full"):
+        """Arma la respuesta de un lote de patentes e incluye la reducción de dimensionalidad.
+
+        Si ya se calculó la reducción (p. ej. en el pool de procesos) se pasa en reduced_embeddings.
+        ``fields`` (ver RESPONSE_FIELDS) decide si la respuesta lleva los vectores completos.
+        """
+        if fields not in RESPONSE_FIELDS:
+            raise ValueError(f"fields no soportado: {fields}. Opciones: {RESPONSE_FIELDS}")
+
+        result = {
+            'main_patent': {
+                'id': main_patent_id,
+                'embedding': main_embedding
+            },
+            'cited_patents': [
+                {
+                    'id': patent_id,
+                    'embedding': embedding
+                }
+                for patent_id, embedding in zip(cited_ids, cited_embeddings)
+            ]
+        }
+        
+        projection = projection or PROJECTION_METHOD
+        if reduced_embeddings is None:
+            # El método usado puede diferir del pedido (p. ej. "pca_local" sin base global)
+            reduced_embeddings, projection = get_projection_engine().project_with_method(
+                [main_embedding] + list(cited_embeddings), projection
+            )
+        result_with_reduction = self.process_embeddings(result, reduced_embeddings, projection)
+        
+        if fields != "reduced" and len(cited_embeddings) > 0:
+            similarities = cosine_similarities(main_embedding, cited_embeddings)
+            distances = euclidean_distances(
+                result_with_reduction['main_patent']['reduced_embedding'],
+                [patent['reduced_embedding'] for patent in result_with_reduction['cited_patents']]
+            )
+            for patent, similarity, angle, distance in zip(
+                result_with_reduction['cited_patents'], similarities, cosine_angles(similarities), distances
+            ):
+                patent.update(similarity=float(similarity), angle=float(angle), distance=float(distance))
+        if fields != "full":
+            # Los vectores se piden aparte, en binario, por id de resultado
+            result_with_reduction['dim'] = len(main_embedding)
+            for patent in [result_with_reduction['main_patent']] + result_with_reduction['cited_patents']:
+                del patent['embedding']
+        
+        return {
+            "embeddings": result_with_reduction, "from_cache": from_cache, "projection": projection, "fields": fields
+        }
+
+    def process_patent_batch(self, patent_data_list, projection=None):
+        """Procesa varios lotes de patentes con una sola pasada del modelo."""
+        try:
+            parsed = [self.split_patent_data(patent_data) for patent_data in patent_data_list]
+            bundles = [(main_text, list(cited.values())) for _, main_text, cited in parsed]
+            
+            cached_flags = [self.bundle_from_cache(main_text, cited_texts) for main_text, cited_texts in bundles]
+            print(f"Procesando {len(bundles)} lote(s) de embeddings para sesión: {self.session_id}")
+            
+            embedded = self.embeddings_generator.embed_bundles(bundles)
+            
+            return [
+                self.build_result(main_patent_id, main_embedding, list(cited.keys()), cited_embeddings, from_cache,
+                                  projection=projection)
+                for (main_patent_id, _, cited), (main_embedding, cited_embeddings), from_cache
+                in zip(parsed, embedded, cached_flags)
+            ]
+        except Exception as e:
+            print(f"Error en process_patent_batch: {str(e)}")
+            print(traceback.format_exc())
+            raise
+
+    def process_patent_data(self, patent_data, projection=None):
+        """Procesa los datos de la patente, incluyendo embeddings y reducción."""
+        return self.process_patent_batch([patent_data], projection)[0]
+
+'''
+class EmbeddingsProcessor:
+    def __init__(self, cache_dir="data/embeddings_cache"):
+        try:
+            self.cache_dir = Path(cache_dir)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # No inicializamos TSNE aquí, lo haremos dinámicamente
+            self.embeddings_generator = EmbeddingsGenerator()
+            # Descargar recursos de NLTK
+            nltk.download('punkt', quiet=True)
+        except Exception as e:
+            print(f"Error inicializando EmbeddingsProcessor: {str(e)}")
+            raise
+
+    def generate_cache_key(self, patent_data):
+        try:
+            main_key = next(key for key in patent_data.keys() if key != 'cited_document_id')
+            content = str(patent_data[main_key])
+            for _, text in sorted(patent_data['cited_document_id'].items()):
+                content += str(text)
+            return hashlib.sha256(content.encode()).hexdigest()
+        except Exception as e:
+            print(f"Error generando cache key: {str(e)}")
+            raise
+
+    def reduce_dimensionality(self, embeddings_list):
+        try:
+            if not embeddings_list:
+                raise ValueError("Lista de embeddings vacía")
+            
+            all_embeddings = np.array(embeddings_list)
+            n_samples = len(all_embeddings)
+            
+            # Ajustar la perplejidad basada en el número de muestras
+            if n_samples <= 2:
+                # Para 1 o 2 muestras, no podemos usar t-SNE
+                print("Muy pocas muestras para t-SNE, retornando coordenadas aleatorias")
+                return np.random.rand(n_samples, 3).tolist()
+            else:
+                # Usar una perplejidad que sea aproximadamente 1/3 del número de muestras
+                # pero no mayor a 30 y no menor a 2
+                perplexity = min(max(n_samples // 3, 2), 30)
+                perplexity = min(perplexity, n_samples - 1)  # Asegurar que sea menor que n_samples
+                
+                print(f"Usando perplejidad de {perplexity} para {n_samples} muestras")
+                tsne = TSNE(n_components=3, random_state=42, perplexity=perplexity)
+                reduced_embeddings = tsne.fit_transform(all_embeddings)
+                return reduced_embeddings.tolist()
+                
+        except Exception as e:
+            print(f"Error en reduce_dimensionality: {str(e)}")
+            raise
+
+    def process_embeddings(self, embeddings_data):
+        """Procesa los embeddings para incluir la reducción de dimensionalidad."""
+        try:
+            all_embeddings = [embeddings_data['main_patent']['embedding']]
+            for patent in embeddings_data['cited_patents']:
+                all_embeddings.append(patent['embedding'])
+            
+            reduced_embeddings = self.reduce_dimensionality(all_embeddings)
+            
+            embeddings_data['main_patent']['reduced_embedding'] = reduced_embeddings[0]
+            for i, patent in enumerate(embeddings_data['cited_patents']):
+                patent['reduced_embedding'] = reduced_embeddings[i + 1]
+            
+            return embeddings_data
+        except Exception as e:
+            print(f"Error en process_embeddings: {str(e)}")
+            raise
+
+    def process_patent_data(self, patent_data):
+        """Procesa los datos de la patente, incluyendo embeddings y reducción."""
+        try:
+            if not isinstance(patent_data, dict):
+                raise ValueError(f"patent_data debe ser un diccionario, no {type(patent_data)}")
+            if 'cited_document_id' not in patent_data:
+                raise ValueError("patent_data debe contener la clave 'cited_document_id'")
+            
+            cache_key = self.generate_cache_key(patent_data)
+            cache_file = self.cache_dir / f"{cache_key}.json"
+            
+            if cache_file.exists():
+                with open(cache_file, 'r') as f:
+                    cached_data = json.load(f)
+                    print("Datos recuperados de caché")
+                    return {"embeddings": cached_data, "from_cache": True}
+
+            print("Generando nuevos embeddings...")
+            
+            main_patent_id = next(key for key in patent_data.keys() if key != 'cited_document_id')
+            main_text = patent_data[main_patent_id]
+            cited_texts = list(patent_data['cited_document_id'].values())
+            
+            main_embedding = self.embeddings_generator.get_embeddings_bfp([main_text])[0]
+            cited_embeddings = self.embeddings_generator.get_embeddings_bfp(cited_texts)
+            
+            result = {
+                'main_patent': {
+                    'id': main_patent_id,
+                    'embedding': main_embedding
+                },
+                'cited_patents': [
+                    {
+                        'id': patent_id,
+                        'embedding': embedding
+                    }
+                    for patent_id, embedding in zip(patent_data['cited_document_id'].keys(), cited_embeddings)
+                ]
+            }
+            
+            result_with_reduction = self.process_embeddings(result)
+            
+            with open(cache_file, 'w') as f:
+                json.dump(result_with_reduction, f)
+            
+            print("Nuevos embeddings generados y guardados en caché")
+            return {"embeddings": result_with_reduction, "from_cache": False}
+        
+        except Exception as e:
+            print(f"Error en process_patent_data: {str(e)}")
+            print(traceback.format_exc())
+            raise
 '''            
\ No newline at end of file
@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor
+from typing import Callable, Dict
+
+from .config import (
+    THREAD_POOL_WORKERS,
+    THREAD_POOL_MAX_PENDING,
+    PROCESS_POOL_WORKERS,
+    PROCESS_POOL_MAX_PENDING,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorBusy(Exception):
+    """El ejecutor ya tiene el máximo de trabajos pendientes."""
+
+
+class StageStats:
+    """Tiempos acumulados por etapa (conteo, total, máximo y último)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def record(self, stage: str, seconds: float, failed: bool = False):
+        with self._lock:
+            stats = self._stages.setdefault(
+                stage, {'count': 0, 'failed': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0}
+            )
+            ms = seconds * 1000.0
+            stats['count'] += 1
+            stats['failed'] += int(failed)
+            stats['total_ms'] += ms
+            stats['max_ms'] = max(stats['max_ms'], ms)
+            stats['last_ms'] = ms
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {**stats, 'avg_ms': stats['total_ms'] / stats['count'] if stats['count'] else 0.0}
+                for stage, stats in self._stages.items()
+            }
+
+
+class _BoundedPool:
+    """Envuelve un executor limitando los trabajos en vuelo (en ejecución + en cola)."""
+
+    def __init__(self, name: str, factory: Callable, max_pending: int):
+        self.name = name
+        self.max_pending = max_pending
+        self._factory = factory
+        self._executor = None
+        self._pending = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = self._factory()
+        return self._executor
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise ExecutorBusy(f"Pool '{self.name}' saturado ({self.max_pending} trabajos pendientes)")
+            self._pending += 1
+            executor = self._get_executor()
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+        except BrokenExecutor:
+            # Un proceso murió: se descarta el pool para recrearlo en la próxima solicitud
+            logger.error(f"Pool '{self.name}' roto, se recreará")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {'pending': self._pending, 'max_pending': self.max_pending, 'rejected': self._rejected}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class StageExecutors:
+    """Pools para ejecutar las etapas pesadas fuera del bucle de eventos.
+
+    - Hilos para la inferencia con torch (libera el GIL durante el cómputo) y
+      para el TF-IDF del corpus, que comparte modelo y caché entre solicitudes.
+    - Procesos para sklearn (t-SNE) y la serialización de Plotly.
+    """
+
+    def __init__(
+        self,
+        thread_workers: int = THREAD_POOL_WORKERS,
+        thread_max_pending: int = THREAD_POOL_MAX_PENDING,
+        process_workers: int = PROCESS_POOL_WORKERS,
+        process_max_pending: int = PROCESS_POOL_MAX_PENDING,
+    ):
+        self.threads = _BoundedPool(
+            "threads",
+            lambda: ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="stage"),
+            thread_max_pending,
+        )
+        # "spawn" evita heredar hilos y el estado de torch del proceso del servidor
+        self.processes = _BoundedPool(
+            "processes",
+            lambda: ProcessPoolExecutor(
+                max_workers=process_workers, mp_context=multiprocessing.get_context("spawn")
+            ),
+            process_max_pending,
+        )
+        self.stats = StageStats()
+
+    async def _timed(self, stage: str, pool: _BoundedPool, fn: Callable, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = await pool.run(fn, *args, **kwargs)
+        except ExecutorBusy:
+            raise
+        except Exception:
+            self.stats.record(stage, time.perf_counter() - started, failed=True)
+            raise
+        self.stats.record(stage, time.perf_counter() - started)
+        return result
+
+    async def run_in_thread(self, stage: str, fn: Callable, *args, **kwargs):
+        return await self._timed(stage, self.threads, fn, *args, **kwargs)
+
+    async def run_in_process(self, stage: str, fn: Callable, *args, **kwargs):
+        return await self._timed(stage, self.processes, fn, *args, **kwargs)
+
+    def record(self, stage: str, seconds: float, failed: bool = False):
+        """Registra el tiempo de una etapa que no pasa por los pools (p. ej. el planificador)."""
+        self.stats.record(stage, seconds, failed=failed)
+
+    def metrics(self) -> dict:
+        return {
+            'pools': {'threads': self.threads.metrics(), 'processes': self.processes.metrics()},
+            'stages': self.stats.snapshot(),
+        }
+
+    def shutdown(self):
+        self.threads.shutdown()
+        self.processes.shutdown()
+
+
+stage_executors = StageExecutors()
@@ -0,0 +1,158 @@
+import gc
+import os
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+import torch
+
+from .model_registry import get_shared_model, SharedModel, DEFAULT_MODEL_NAME
+from .config import ONNX_MODEL_DIR, ONNX_INTRA_OP_THREADS
+
+logger = logging.getLogger(__name__)
+
+# "torch": fp32 en PyTorch; "int8": cuantización dinámica de las capas lineales;
+# "onnx": grafo exportado ejecutado con onnxruntime (dependencia opcional)
+INFERENCE_BACKENDS = ("torch", "int8", "onnx")
+
+
+class TorchBackend:
+    """BERT en PyTorch con los pesos fp32 compartidos por el proceso."""
+    name = "torch"
+
+    def __init__(self, shared: SharedModel):
+        self.model = shared.model
+        self.device = shared.device
+
+    def run(self, inputs) -> np.ndarray:
+        """Devuelve el embedding CLS de cada fila del lote."""
+        inputs = {key: value.to(self.device) for key, value in inputs.items()}
+
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+        return outputs.last_hidden_state[:, 0, :].cpu().numpy()
+
+
+class Int8Backend(TorchBackend):
+    """Cuantización dinámica int8 de las capas lineales, para CPU.
+
+    Convive con el modelo fp32 compartido, que el registro carga igualmente para
+    el tokenizer y el visualizador BERT: la copia cuantizada suma en memoria
+    cerca de un tercio de ese modelo (capas lineales en int8, embeddings en fp32).
+    """
+    name = "int8"
+
+    def __init__(self, shared: SharedModel):
+        from transformers import AutoModel
+
+        # Copia propia leída de disco (no un deepcopy del modelo compartido) y cuantizada
+        # en el sitio: los pesos fp32 de las capas lineales se liberan al reemplazarlas
+        model = AutoModel.from_pretrained(shared.model_name, low_cpu_mem_usage=True)
+        model.eval()
+        model.requires_grad_(False)
+        self.model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+        del model
+        gc.collect()
+        self.device = torch.device('cpu')
+
+
+class _LastHiddenState(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+
+def export_onnx(shared: SharedModel, path: Path) -> None:
+    """Exporta el modelo a ONNX con lote y longitud de secuencia dinámicos."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Exportando {shared.model_name} a ONNX en {path}")
+
+    # El lote de ejemplo lleva relleno para que la máscara de atención quede en el grafo
+    input_ids = torch.full((2, 16), shared.tokenizer.cls_token_id, dtype=torch.long, device=shared.device)
+    attention_mask = torch.ones((2, 16), dtype=torch.long, device=shared.device)
+    attention_mask[1, 8:] = 0
+
+    tmp_path = path.with_suffix('.tmp')
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(shared.model),
+            (input_ids, attention_mask),
+            str(tmp_path),
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['last_hidden_state'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'last_hidden_state': {0: 'batch', 1: 'sequence'},
+            },
+            opset_version=17,
+            dynamo=False
+        )
+    os.replace(tmp_path, path)
+
+
+class OnnxBackend:
+    """Grafo ONNX ejecutado con onnxruntime en CPU, exportado la primera vez que se usa."""
+    name = "onnx"
+
+    def __init__(self, shared: SharedModel, model_dir: str = ONNX_MODEL_DIR,
+                 intra_op_threads: int = ONNX_INTRA_OP_THREADS):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("El backend 'onnx' requiere onnxruntime (pip install onnxruntime onnx)")
+
+        self.path = Path(model_dir) / shared.model_name.replace('/', '--') / "model.onnx"
+        if not self.path.exists():
+            export_onnx(shared, self.path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(str(self.path), options, providers=['CPUExecutionProvider'])
+
+    def run(self, inputs) -> np.ndarray:
+        feeds = {
+            'input_ids': inputs['input_ids'].cpu().numpy().astype(np.int64),
+            'attention_mask': inputs['attention_mask'].cpu().numpy().astype(np.int64),
+        }
+        last_hidden_state = self.session.run(['last_hidden_state'], feeds)[0]
+        return last_hidden_state[:, 0, :]
+
+
+_BACKEND_CLASSES = {
+    "torch": TorchBackend,
+    "int8": Int8Backend,
+    "onnx": OnnxBackend,
+}
+
+_backends: Dict[Tuple[str, str], object] = {}
+_backends_lock = threading.Lock()
+
+
+def get_inference_backend(backend: str = "torch", model_name: str = DEFAULT_MODEL_NAME):
+    """Devuelve el backend de inferencia del proceso, creándolo una sola vez por modelo."""
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Backend de inferencia no soportado: {backend}. Opciones: {INFERENCE_BACKENDS}")
+
+    shared = get_shared_model(model_name)
+    key = (shared.model_name, backend)
+    instance = _backends.get(key)
+    if instance is not None:
+        return instance
+
+    with _backends_lock:
+        instance = _backends.get(key)
+        if instance is None:
+            logger.info(f"Preparando backend de inferencia '{backend}' para {shared.model_name}")
+            instance = _BACKEND_CLASSES[backend](shared)
+            _backends[key] = instance
+        return instance
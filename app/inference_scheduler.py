@@ -0,0 +1,261 @@
+import asyncio
+import queue
+import threading
+import time
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from .config import (
+    INFERENCE_MAX_BATCH_TEXTS,
+    INFERENCE_MAX_BATCH_TOKENS,
+    INFERENCE_MAX_WAIT_MS,
+    INFERENCE_MAX_QUEUE_DEPTH,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerQueueFull(Exception):
+    """La cola del planificador alcanzó su profundidad máxima."""
+
+
+class _Job:
+    __slots__ = ('bundles', 'persist', 'n_texts', 'n_tokens', 'future', 'loop', 'enqueued_at')
+
+    def __init__(self, bundles, future, loop, persist=True):
+        self.bundles = bundles
+        self.persist = persist
+        self.n_texts = sum(1 + len(cited_texts) for _, cited_texts in bundles)
+        # Estimación barata de tokens para no tokenizar dos veces
+        self.n_tokens = sum(
+            len(text.split()) for main_text, cited_texts in bundles for text in [main_text, *cited_texts]
+        )
+        self.future = future
+        self.loop = loop
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceScheduler:
+    """Agrupa las solicitudes de embeddings concurrentes en lotes compartidos.
+
+    Un hilo de fondo es el único dueño del modelo: toma el primer trabajo de
+    la cola, espera como máximo ``max_wait_ms`` a que lleguen más (o hasta
+    llenar el presupuesto de textos/tokens), ejecuta todo en una sola llamada
+    a ``embed_bundles`` y resuelve el futuro de cada solicitud.
+
+    Mientras el modelo no está cargado, un lote cuyos textos ya están todos
+    en caché se resuelve con ``cache_lookup`` sin cargarlo.
+    """
+
+    def __init__(
+        self,
+        generator_factory: Callable,
+        cache_lookup: Optional[Callable] = None,
+        max_batch_texts: int = INFERENCE_MAX_BATCH_TEXTS,
+        max_batch_tokens: int = INFERENCE_MAX_BATCH_TOKENS,
+        max_wait_ms: float = INFERENCE_MAX_WAIT_MS,
+        max_queue_depth: int = INFERENCE_MAX_QUEUE_DEPTH,
+    ):
+        self.generator_factory = generator_factory
+        self.cache_lookup = cache_lookup
+        self.max_batch_texts = max_batch_texts
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_depth = max_queue_depth
+
+        self._queue: "queue.Queue[_Job]" = queue.Queue(maxsize=max_queue_depth)
+        self._generator = None
+        self._generator_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._metrics_lock = threading.Lock()
+        self._reset_metrics()
+
+    def _reset_metrics(self):
+        self._batches = 0
+        self._jobs = 0
+        self._texts = 0
+        self._rejected = 0
+        self._failed_batches = 0
+        self._total_wait = 0.0
+        self._total_inference = 0.0
+        self._max_observed_depth = 0
+        self._last_batch_jobs = 0
+        self._last_batch_texts = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._thread.start()
+        logger.info("Planificador de inferencia iniciado")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def generator(self):
+        return self._generator
+
+    def _ensure_generator(self):
+        # El precalentamiento puede crear el generador desde otro hilo
+        if self._generator is None:
+            with self._generator_lock:
+                if self._generator is None:
+                    self._generator = self.generator_factory()
+        return self._generator
+
+    def warm_up(self):
+        """Carga el modelo y ejecuta una pasada corta para que la primera solicitud no espere."""
+        generator = self._ensure_generator()
+        generator.encode_texts(["Warm up."])
+
+    async def embed_bundles(self, bundles: List[Tuple[str, List[str]]], persist: bool = True):
+        """Encola los lotes y espera sus embeddings: [(principal, [citados]), ...].
+
+        Con ``persist=False`` los textos nuevos se embeben sin guardarse en el
+        almacén (p. ej. las consultas de búsqueda, que no son parte del corpus).
+        """
+        if self._thread is None:
+            self.start()
+
+        loop = asyncio.get_running_loop()
+        job = _Job(bundles, loop.create_future(), loop, persist=persist)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._metrics_lock:
+                self._rejected += 1
+            raise SchedulerQueueFull(f"Cola de inferencia llena ({self.max_queue_depth} trabajos)")
+
+        with self._metrics_lock:
+            self._max_observed_depth = max(self._max_observed_depth, self._queue.qsize())
+        return await job.future
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            batches = self._batches or 1
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'max_observed_queue_depth': self._max_observed_depth,
+                'max_batch_texts': self.max_batch_texts,
+                'max_batch_tokens': self.max_batch_tokens,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batches': self._batches,
+                'failed_batches': self._failed_batches,
+                'jobs': self._jobs,
+                'texts': self._texts,
+                'rejected': self._rejected,
+                'avg_jobs_per_batch': self._jobs / batches,
+                'avg_texts_per_batch': self._texts / batches,
+                'avg_queue_wait_ms': 1000.0 * self._total_wait / (self._jobs or 1),
+                'avg_batch_inference_ms': 1000.0 * self._total_inference / batches,
+                'last_batch_jobs': self._last_batch_jobs,
+                'last_batch_texts': self._last_batch_texts,
+                'model_loaded': self._generator is not None,
+                'backend': self._generator.backend_name if self._generator is not None else None,
+            }
+
+    def _collect_batch(self) -> List[_Job]:
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        n_texts = first.n_texts
+        n_tokens = first.n_tokens
+        deadline = first.enqueued_at + self.max_wait
+
+        while n_texts < self.max_batch_texts and n_tokens < self.max_batch_tokens:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(job)
+            n_texts += job.n_texts
+            n_tokens += job.n_tokens
+
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._process_batch(batch)
+
+        # Rechazar lo que haya quedado en cola al detenerse
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._resolve(job, exception=RuntimeError("Planificador de inferencia detenido"))
+
+    def _process_batch(self, batch: List[_Job]):
+        started = time.perf_counter()
+        bundles = [bundle for job in batch for bundle in job.bundles]
+
+        try:
+            results = None
+            if self._generator is None and self.cache_lookup is not None:
+                results = self.cache_lookup(bundles)
+            if results is None:
+                results = self._ensure_generator().embed_bundles(bundles, transient=self._transient_texts(batch))
+        except Exception as e:
+            logger.error(f"Error en lote de inferencia: {str(e)}")
+            with self._metrics_lock:
+                self._failed_batches += 1
+            for job in batch:
+                self._resolve(job, exception=e)
+            return
+
+        elapsed = time.perf_counter() - started
+        with self._metrics_lock:
+            self._batches += 1
+            self._jobs += len(batch)
+            self._texts += sum(job.n_texts for job in batch)
+            self._total_inference += elapsed
+            self._total_wait += sum(started - job.enqueued_at for job in batch)
+            self._last_batch_jobs = len(batch)
+            self._last_batch_texts = sum(job.n_texts for job in batch)
+
+        idx = 0
+        for job in batch:
+            self._resolve(job, result=results[idx:idx + len(job.bundles)])
+            idx += len(job.bundles)
+
+    @staticmethod
+    def _transient_texts(batch: List[_Job]) -> set:
+        """Textos que solo piden trabajos sin persistencia; si otro trabajo los pide, se guardan."""
+        def texts(jobs):
+            return {
+                text for job in jobs
+                for main_text, cited_texts in job.bundles for text in [main_text, *cited_texts]
+            }
+
+        return texts(job for job in batch if not job.persist) - texts(job for job in batch if job.persist)
+
+    @staticmethod
+    def _resolve(job: _Job, result=None, exception=None):
+        def _set():
+            if job.future.done():
+                return
+            if exception is not None:
+                job.future.set_exception(exception)
+            else:
+                job.future.set_result(result)
+
+        try:
+            job.loop.call_soon_threadsafe(_set)
+        except RuntimeError:
+            # El bucle de eventos de la solicitud ya se cerró
+            pass
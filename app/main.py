@@ -1,158 +1,591 @@
-from fastapi import FastAPI, Request, Form, HTTPException, status, UploadFile, File, status
-from fastapi.responses import HTMLResponse, JSONResponse, Response
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from pathlib import Path
-from .database.db_manager import DatabaseManager
-from .embeddings import EmbeddingsProcessor
-import json
-
-app = FastAPI()
-
-# Montar archivos estáticos
-app.mount("/static", StaticFiles(directory="static"), name="static")
-#app.mount("/static", StaticFiles(directory=Path(__file__).parent / "static"), name="static")
-
-
-# Configurar templates
-templates = Jinja2Templates(directory="app/templates")
-
-# Inicializar gestor de base de datos
-db_manager = DatabaseManager()
-
-# Diccionario para mantener las instancias de EmbeddingsProcessor por sesión
-embeddings_processors = {}
-
-@app.get("/", response_class=HTMLResponse)
-async def root(request: Request):
-    return templates.TemplateResponse(
-        "login.html",
-        {"request": request}
-    )
-
-@app.post("/login", response_class=HTMLResponse)
-async def login(request: Request, username: str = Form(...), password: str = Form(...)):
-    user = db_manager.verify_credentials(username, password)
-    
-    if user:
-        # Crear una nueva instancia de EmbeddingsProcessor para esta sesión
-        session_id = str(id(request))
-        embeddings_processors[session_id] = EmbeddingsProcessor()
-        
-        return templates.TemplateResponse(
-            "index.html",
-            {"request": request, "session_id": session_id}
-        )
-    else:
-        return templates.TemplateResponse(
-            "login.html",
-            {
-                "request": request,
-                "error": "Credenciales inválidas"
-            }
-        )
-
-@app.post("/generate_embeddings")
-async def generate_embeddings(request: Request):
-    try:
-        # Obtener el ID de sesión
-        session_id = str(id(request))
-        
-        # Obtener o crear el procesador de embeddings para esta sesión
-        if session_id not in embeddings_processors:
-            embeddings_processors[session_id] = EmbeddingsProcessor()
-        
-        # Recibir los datos JSON del cuerpo de la solicitud
-        data = await request.json()
-        print(f"Datos recibidos para sesión {session_id}:", data)
-        
-        if not isinstance(data, dict):
-            raise ValueError(f"Se esperaba un diccionario, se recibió {type(data)}")
-        
-        if 'cited_document_id' not in data:
-            raise ValueError("El JSON debe contener la clave 'cited_document_id'")
-        
-        # Procesar los embeddings usando el procesador de esta sesión
-        result = embeddings_processors[session_id].process_patent_data(data)
-        print(f"Procesamiento exitoso para sesión {session_id}")
-        
-        return JSONResponse(content=result)
-    except json.JSONDecodeError as e:
-        print(f"Error decodificando JSON: {str(e)}")
-        return JSONResponse(
-            status_code=400,
-            content={"error": "JSON inválido", "details": str(e)}
-        )
-    except Exception as e:
-        print(f"Error procesando embeddings: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return JSONResponse(
-            status_code=500,
-            content={"error": "Error procesando embeddings", "details": str(e)}
-        )
-
-# Opcional: Limpiar procesadores antiguos periódicamente
-@app.on_event("startup")
-async def startup_event():
-    # Crear el directorio base de caché si no existe
-    Path("data/embeddings_cache").mkdir(parents=True, exist_ok=True)
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    # Limpiar los procesadores al cerrar la aplicación
-    embeddings_processors.clear()
-
-@app.post("/clear_session")
-async def clear_session(request: Request):
-    try:
-        session_id = str(id(request))
-        if session_id in embeddings_processors:
-            del embeddings_processors[session_id]
-        return JSONResponse(content={"status": "success"})
-    except Exception as e:
-        return JSONResponse(
-            status_code=500,
-            content={"error": str(e)}
-        )
-
-@app.get("/reset_view", response_class=HTMLResponse)
-async def reset_view(request: Request):
-    return templates.TemplateResponse(
-        "index.html",
-        {"request": request, "reset": True}
-    )    
-
-# También nos aseguramos de que los archivos JSX estén siendo servidos con el tipo MIME correcto.
-@app.get("/static/js/{file_name}")
-async def serve_js(file_name: str):
-    file_path = Path("static/js") / file_name
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
-        
-    with open(file_path, "r", encoding='utf-8') as f:
-        content = f.read()
-        
-    return Response(
-        content=content,
-        media_type="application/javascript",
-        headers={
-            "Cache-Control": "no-cache",
-            "Access-Control-Allow-Origin": "*"
-        }
-    )
-
-
-from .visualization import router as visualization_router
-from .visualization import generate_cosine_plot, generate_euclidean_plot
-app.include_router(visualization_router, prefix="/api/visualization")
-
-@app.post("/api/visualization/{plot_type}")
-async def get_visualization(plot_type: str, embeddings_data: dict):
-    if plot_type == "cosine":
-        return generate_cosine_plot(embeddings_data)
-    elif plot_type == "euclidean":
-        return generate_euclidean_plot(embeddings_data)
-    else:
-        raise HTTPException(status_code=400, detail="Tipo de gráfico no soportado")
-    
\ No newline at end of file
+from fastapi import FastAPI, Request, Form, HTTPException, status, UploadFile, File, status
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from pathlib import Path
+from .database.db_manager import DatabaseManager
+from .embeddings import EmbeddingsProcessor, EmbeddingsGenerator, RESPONSE_FIELDS
+from .projection import get_projection_engine, project_with_tsne, PROJECTION_METHODS
+from .config import (
+    PROJECTION_METHOD, EMBEDDINGS_STREAM_CHUNK_TEXTS, WARMUP_ON_STARTUP, ANALYSIS_RESULTS_RETENTION_HOURS
+)
+from .embedding_cache import get_embedding_cache
+from .inference_scheduler import InferenceScheduler, SchedulerQueueFull
+from .executors import stage_executors, ExecutorBusy
+from .prior_art_index import get_prior_art_index
+from .similarity import cosine_similarities, cosine_angles, euclidean_distances, novelty_score
+import json
+import threading
+import time
+import numpy as np
+
+app = FastAPI()
+
+# Montar archivos estáticos
+app.mount("/static", StaticFiles(directory="static"), name="static")
+#app.mount("/static", StaticFiles(directory=Path(__file__).parent / "static"), name="static")
+
+
+# Configurar templates
+templates = Jinja2Templates(directory="app/templates")
+
+# Inicializar gestor de base de datos
+db_manager = DatabaseManager()
+
+# Diccionario para mantener las instancias de EmbeddingsProcessor por sesión
+embeddings_processors = {}
+
+# Planificador que agrupa la inferencia de todas las solicitudes concurrentes
+inference_scheduler = InferenceScheduler(EmbeddingsGenerator, cache_lookup=EmbeddingsGenerator.bundles_from_cache)
+
+# Estado del precalentamiento en segundo plano, consultado por /health/ready
+started_at = time.time()
+warmup_state = {"status": "disabled" if not WARMUP_ON_STARTUP else "pending", "error": None, "seconds": None}
+
+def warm_up():
+    """Carga el modelo fuera del arranque: el servidor atiende mientras tanto."""
+    warmup_state["status"] = "running"
+    started = time.perf_counter()
+    try:
+        inference_scheduler.warm_up()
+        warmup_state.update(status="done", seconds=time.perf_counter() - started)
+        print(f"Modelo precargado en {warmup_state['seconds']:.1f} s")
+    except Exception as e:
+        warmup_state.update(status="failed", error=str(e))
+        print(f"Error en el precalentamiento del modelo: {str(e)}")
+
+@app.get("/", response_class=HTMLResponse)
+async def root(request: Request):
+    return templates.TemplateResponse(
+        "login.html",
+        {"request": request}
+    )
+
+@app.post("/login", response_class=HTMLResponse)
+async def login(request: Request, username: str = Form(...), password: str = Form(...)):
+    # La consulta se ejecuta en el pool de la base de datos, fuera del bucle de eventos
+    user = await db_manager.verify_credentials_async(username, password)
+    
+    if user:
+        # Crear una nueva instancia de EmbeddingsProcessor para esta sesión
+        session_id = str(id(request))
+        embeddings_processors[session_id] = EmbeddingsProcessor()
+        
+        return templates.TemplateResponse(
+            "index.html",
+            {"request": request, "session_id": session_id}
+        )
+    else:
+        return templates.TemplateResponse(
+            "login.html",
+            {
+                "request": request,
+                "error": "Credenciales inválidas"
+            }
+        )
+
+async def project_embeddings(all_embeddings, projection):
+    """Proyección 3D: t-SNE en el pool de procesos, PCA (ms) en el de hilos.
+
+    Devuelve (coordenadas, método usado): "fitted" se informa como "pca_local"
+    mientras no hay base global.
+    """
+    if projection == "tsne" and len(all_embeddings) > 2:
+        reduced = await stage_executors.run_in_process(
+            "projection_tsne", project_with_tsne, all_embeddings
+        )
+        return reduced, "tsne"
+    return await stage_executors.run_in_thread(
+        f"projection_{projection}", get_projection_engine().project_with_method, all_embeddings, projection
+    )
+
+def document_keys(main_patent_id, main_text, cited):
+    """Clave del almacén de embeddings de cada patente del lote: {id: clave}.
+
+    Las claves salen del texto, sin cargar el modelo: se puede llamar mientras se precalienta.
+    """
+    keys = {patent_id: EmbeddingsProcessor.cache_key(text) for patent_id, text in cited.items()}
+    keys[main_patent_id] = EmbeddingsProcessor.cache_key(main_text)
+    return keys
+
+def register_prior_art(main_patent_id, main_text, cited):
+    """Registra los ids de las patentes para el índice de antecedentes."""
+    keys = document_keys(main_patent_id, main_text, cited)
+    get_prior_art_index().register_documents({key: patent_id for patent_id, key in keys.items()})
+
+def store_plot_data(session_id, main_patent_id, main_text, cited, main_embedding, cited_embeddings,
+                    reduced_embeddings, projection):
+    """Guarda las columnas de los gráficos del resultado y devuelve su result_id."""
+    plot_data = build_plot_data(
+        main_patent_id, main_embedding, list(cited.keys()), cited_embeddings, reduced_embeddings, projection
+    )
+    # Para servir los vectores completos desde el almacén por id de patente
+    plot_data['vector_keys'] = document_keys(main_patent_id, main_text, cited)
+    return db_manager.save_analysis_result("plot_data", plot_data, session_id, main_patent_id)
+
+async def save_result(session_id, main_patent_id, main_text, cited, main_embedding,
+                      cited_embeddings, reduced_embeddings, projection):
+    """Guarda el resultado en el pool de la base de datos y devuelve su result_id.
+
+    Sin result_id el cliente no puede pedir los gráficos ni los vectores (la
+    respuesta resumida no los incluye), así que un fallo aquí es un error.
+    """
+    try:
+        return await db_manager.run(
+            store_plot_data, session_id, main_patent_id, main_text, cited, main_embedding, cited_embeddings,
+            reduced_embeddings, projection
+        )
+    except Exception as e:
+        print(f"No se pudo guardar el resultado: {str(e)}")
+        raise RuntimeError(f"No se pudo guardar el resultado: {str(e)}") from e
+
+@app.post("/generate_embeddings")
+async def generate_embeddings(request: Request):
+    try:
+        # Obtener el ID de sesión
+        session_id = str(id(request))
+        
+        # Obtener o crear el procesador de embeddings para esta sesión
+        if session_id not in embeddings_processors:
+            embeddings_processors[session_id] = EmbeddingsProcessor()
+        
+        # Recibir los datos JSON del cuerpo de la solicitud
+        data = await request.json()
+        print(f"Datos recibidos para sesión {session_id}:", data)
+        
+        if not isinstance(data, dict):
+            raise ValueError(f"Se esperaba un diccionario, se recibió {type(data)}")
+        
+        if 'cited_document_id' not in data:
+            raise ValueError("El JSON debe contener la clave 'cited_document_id'")
+        
+        projection = request.query_params.get('projection', PROJECTION_METHOD)
+        if projection not in PROJECTION_METHODS:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "Método de proyección no soportado", "details": f"Opciones: {PROJECTION_METHODS}"}
+            )
+        # Por defecto sin vectores completos: se piden aparte en /api/results/{result_id}/vectors
+        fields = request.query_params.get('fields', 'summary')
+        if fields not in RESPONSE_FIELDS:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "fields no soportado", "details": f"Opciones: {RESPONSE_FIELDS}"}
+            )
+        
+        processor = embeddings_processors[session_id]
+        main_patent_id, main_text, cited = processor.split_patent_data(data)
+        cited_texts = list(cited.values())
+        # Consulta del almacén fuera del bucle de eventos
+        from_cache = await stage_executors.run_in_thread(
+            "cache_lookup", processor.bundle_from_cache, main_text, cited_texts
+        )
+        
+        # La inferencia se agrupa con las demás solicitudes en curso
+        started = time.perf_counter()
+        [(main_embedding, cited_embeddings)] = await inference_scheduler.embed_bundles([(main_text, cited_texts)])
+        stage_executors.record("inference", time.perf_counter() - started)
+        
+        reduced_embeddings, projection = await project_embeddings([main_embedding] + cited_embeddings, projection)
+        
+        result = processor.build_result(
+            main_patent_id, main_embedding, list(cited.keys()), cited_embeddings, from_cache,
+            reduced_embeddings=reduced_embeddings, projection=projection, fields=fields
+        )
+        
+        await stage_executors.run_in_thread(
+            "prior_art_labels", register_prior_art, main_patent_id, main_text, cited
+        )
+        # Los gráficos piden sus datos por result_id en lugar de reenviar los vectores
+        result["result_id"] = await save_result(
+            session_id, main_patent_id, main_text, cited, main_embedding, cited_embeddings,
+            reduced_embeddings, projection
+        )
+        print(f"Procesamiento exitoso para sesión {session_id}")
+        
+        return JSONResponse(content=result)
+    except (SchedulerQueueFull, ExecutorBusy) as e:
+        print(f"Solicitud rechazada: {str(e)}")
+        return JSONResponse(
+            status_code=429,
+            content={"error": "Servidor ocupado, intente nuevamente", "details": str(e)}
+        )
+    except json.JSONDecodeError as e:
+        print(f"Error decodificando JSON: {str(e)}")
+        return JSONResponse(
+            status_code=400,
+            content={"error": "JSON inválido", "details": str(e)}
+        )
+    except Exception as e:
+        print(f"Error procesando embeddings: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Error procesando embeddings", "details": str(e)}
+        )
+
+@app.post("/generate_embeddings/stream")
+async def generate_embeddings_stream(request: Request):
+    """Variante de /generate_embeddings que envía los resultados como NDJSON a medida que salen.
+
+    Eventos, uno por línea: "start", "main", un "cited" por documento citado (con su
+    similitud coseno con la principal) y un "done" final con la proyección 3D y el resumen.
+    Los errores posteriores al inicio del flujo llegan como un evento "error".
+    Cada evento lleva los mismos campos que /generate_embeddings para el mismo ``fields``:
+    sin similitud, ángulo ni distancias con fields=reduced y con los vectores solo con fields=full.
+    """
+    try:
+        session_id = str(id(request))
+        if session_id not in embeddings_processors:
+            embeddings_processors[session_id] = EmbeddingsProcessor()
+        
+        data = await request.json()
+        projection = request.query_params.get('projection', PROJECTION_METHOD)
+        if projection not in PROJECTION_METHODS:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "Método de proyección no soportado", "details": f"Opciones: {PROJECTION_METHODS}"}
+            )
+        # Por defecto sin vectores completos: se piden aparte en /api/results/{result_id}/vectors
+        fields = request.query_params.get('fields', 'summary')
+        if fields not in RESPONSE_FIELDS:
+            return JSONResponse(
+                status_code=400,
+                content={"error": "fields no soportado", "details": f"Opciones: {RESPONSE_FIELDS}"}
+            )
+        
+        processor = embeddings_processors[session_id]
+        main_patent_id, main_text, cited = processor.split_patent_data(data)
+        cited_ids = list(cited.keys())
+        cited_texts = list(cited.values())
+        # Consulta del almacén fuera del bucle de eventos
+        from_cache = await stage_executors.run_in_thread(
+            "cache_lookup", processor.bundle_from_cache, main_text, cited_texts
+        )
+    except json.JSONDecodeError as e:
+        return JSONResponse(status_code=400, content={"error": "JSON inválido", "details": str(e)})
+    except (ValueError, StopIteration) as e:
+        return JSONResponse(status_code=400, content={"error": "Datos de patente inválidos", "details": str(e)})
+    except ExecutorBusy as e:
+        return JSONResponse(status_code=429, content={"error": "Servidor ocupado, intente nuevamente", "details": str(e)})
+    
+    def event(payload):
+        return json.dumps(payload) + "\n"
+    
+    async def events():
+        started = time.perf_counter()
+        yield event({
+            "event": "start", "main_patent_id": main_patent_id, "total": len(cited_ids),
+            "from_cache": from_cache, "projection": projection, "fields": fields
+        })
+        try:
+            # Un trabajo por tramo, en secuencia: si se encolaran todos juntos el
+            # planificador los fusionaría en un único lote y nada saldría antes del final
+            chunk = EMBEDDINGS_STREAM_CHUNK_TEXTS
+            [(main_embedding, first_embeddings)] = await inference_scheduler.embed_bundles(
+                [(main_text, cited_texts[:chunk])]
+            )
+            main_event = {"event": "main", "id": main_patent_id, "dim": len(main_embedding)}
+            if fields == "full":
+                main_event["embedding"] = main_embedding
+            yield event(main_event)
+            
+            cited_embeddings = []
+            for start in range(0, len(cited_texts), chunk):
+                if start == 0:
+                    embeddings = first_embeddings
+                else:
+                    results = await inference_scheduler.embed_bundles(
+                        [(text, []) for text in cited_texts[start:start + chunk]]
+                    )
+                    embeddings = [embedding for embedding, _ in results]
+                
+                similarities = cosine_similarities(main_embedding, embeddings)
+                for offset, (embedding, similarity, angle) in enumerate(
+                    zip(embeddings, similarities, cosine_angles(similarities))
+                ):
+                    cited_event = {"event": "cited", "index": start + offset, "id": cited_ids[start + offset]}
+                    # Mismos campos por citado que /generate_embeddings
+                    if fields != "reduced":
+                        cited_event.update(similarity=float(similarity), angle=float(angle))
+                    if fields == "full":
+                        cited_event["embedding"] = embedding
+                    yield event(cited_event)
+                cited_embeddings.extend(embeddings)
+            stage_executors.record("inference", time.perf_counter() - started)
+            
+            # El método usado puede diferir del pedido ("pca_local" sin base global)
+            reduced_embeddings, used_projection = await project_embeddings(
+                [main_embedding] + cited_embeddings, projection
+            )
+            await stage_executors.run_in_thread(
+                "prior_art_labels", register_prior_art, main_patent_id, main_text, cited
+            )
+            
+            similarities = cosine_similarities(main_embedding, cited_embeddings) if cited_embeddings else []
+            result_id = await save_result(
+                session_id, main_patent_id, main_text, cited, main_embedding, cited_embeddings,
+                reduced_embeddings, used_projection
+            )
+            done_event = {
+                "event": "done",
+                "result_id": result_id,
+                "projection": used_projection,
+                "reduced_embeddings": {
+                    "main_patent": reduced_embeddings[0],
+                    "cited_patents": reduced_embeddings[1:]
+                },
+                "novelty_score": novelty_score(similarities),
+                "from_cache": from_cache,
+                "elapsed_ms": (time.perf_counter() - started) * 1000.0
+            }
+            if fields != "reduced" and cited_embeddings:
+                # Distancia en el espacio 3D de la proyección, como en el gráfico euclidiano
+                done_event["distances"] = euclidean_distances(reduced_embeddings[0], reduced_embeddings[1:]).tolist()
+            yield event(done_event)
+            print(f"Procesamiento en flujo exitoso para sesión {session_id}")
+        except (SchedulerQueueFull, ExecutorBusy) as e:
+            print(f"Solicitud en flujo rechazada: {str(e)}")
+            yield event({"event": "error", "status": 429, "error": "Servidor ocupado, intente nuevamente", "details": str(e)})
+        except Exception as e:
+            print(f"Error procesando embeddings en flujo: {str(e)}")
+            yield event({"event": "error", "status": 500, "error": "Error procesando embeddings", "details": str(e)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Opcional: Limpiar procesadores antiguos periódicamente
+@app.on_event("startup")
+async def startup_event():
+    # Abrir el almacén de embeddings compartido (solo lee el índice) y reservarlo
+    # frente a la carga masiva, que también escribe en él
+    get_embedding_cache().store.claim()
+    inference_scheduler.start()
+    removed = await db_manager.run(db_manager.delete_analysis_results_older_than, ANALYSIS_RESULTS_RETENTION_HOURS)
+    if removed:
+        print(f"Resultados antiguos eliminados: {removed}")
+    if WARMUP_ON_STARTUP:
+        threading.Thread(target=warm_up, name="model-warmup", daemon=True).start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Limpiar los procesadores al cerrar la aplicación
+    embeddings_processors.clear()
+    inference_scheduler.stop()
+    stage_executors.shutdown()
+    db_manager.close()
+    get_embedding_cache().store.release()
+
+@app.get("/health/live")
+async def health_live():
+    """El proceso responde; no depende de que el modelo esté cargado."""
+    return JSONResponse(content={"status": "alive", "uptime_s": time.time() - started_at})
+
+@app.get("/health/ready")
+async def health_ready():
+    """Listo para recibir tráfico: con precalentamiento, solo cuando el modelo ya está cargado."""
+    model_loaded = inference_scheduler.generator is not None
+    ready = model_loaded or not WARMUP_ON_STARTUP
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "starting",
+            "model_loaded": model_loaded,
+            "warmup": warmup_state,
+            "uptime_s": time.time() - started_at
+        }
+    )
+
+@app.get("/metrics/inference")
+async def inference_metrics():
+    return JSONResponse(content=inference_scheduler.metrics())
+
+@app.get("/metrics/stages")
+async def stage_metrics():
+    return JSONResponse(content=stage_executors.metrics())
+
+@app.post("/api/prior_art/search")
+async def search_prior_art(data: dict):
+    """Devuelve los documentos del corpus más similares a una reinvindicación."""
+    text = data.get('text')
+    if not text or not isinstance(text, str):
+        raise HTTPException(status_code=400, detail="Falta el campo requerido: text")
+    try:
+        top_k = int(data.get('top_k', 10))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="top_k debe ser un entero")
+    if top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k debe ser mayor que 0")
+    exact = bool(data.get('exact', False))
+    
+    try:
+        # La consulta no es parte del corpus: no se guarda en el almacén
+        [(embedding, _)] = await inference_scheduler.embed_bundles([(text, [])], persist=False)
+        
+        # La reinvindicación consultada no debe aparecer entre sus propios antecedentes
+        claim_key = EmbeddingsProcessor.cache_key(text)
+        index = get_prior_art_index()
+        started = time.perf_counter()
+        results = await stage_executors.run_in_thread(
+            "prior_art_search", index.search, embedding, top_k, exact, exclude_keys=[claim_key]
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+    except (SchedulerQueueFull, ExecutorBusy) as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    return JSONResponse(content={
+        "results": results,
+        "method": "exact" if exact or not index.uses_ivf else "ivf",
+        "indexed_documents": len(index),
+        "search_ms": elapsed_ms
+    })
+
+@app.post("/clear_session")
+async def clear_session(request: Request):
+    try:
+        session_id = str(id(request))
+        if session_id in embeddings_processors:
+            del embeddings_processors[session_id]
+        return JSONResponse(content={"status": "success"})
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)}
+        )
+
+@app.get("/reset_view", response_class=HTMLResponse)
+async def reset_view(request: Request):
+    return templates.TemplateResponse(
+        "index.html",
+        {"request": request, "reset": True}
+    )    
+
+# También nos aseguramos de que los archivos JSX estén siendo servidos con el tipo MIME correcto.
+@app.get("/static/js/{file_name}")
+async def serve_js(file_name: str):
+    file_path = Path("static/js") / file_name
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+        
+    with open(file_path, "r", encoding='utf-8') as f:
+        content = f.read()
+        
+    return Response(
+        content=content,
+        media_type="application/javascript",
+        headers={
+            "Cache-Control": "no-cache",
+            "Access-Control-Allow-Origin": "*"
+        }
+    )
+
+
+from .visualization import router as visualization_router
+from .visualization import PLOT_GENERATORS, plot_cache, plot_etag, etag_matches
+from .visualization import PLOT_DATA_ENCODINGS, build_plot_data, encode_plot_data
+app.include_router(visualization_router, prefix="/api/visualization")
+
+@app.post("/api/visualization/{plot_type}")
+async def get_visualization(plot_type: str, embeddings_data: dict, request: Request):
+    if plot_type not in PLOT_GENERATORS:
+        raise HTTPException(status_code=400, detail="Tipo de gráfico no soportado")
+    
+    try:
+        etag = await stage_executors.run_in_thread("plot_etag", plot_etag, plot_type, embeddings_data)
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Datos de embeddings inválidos: {str(e)}")
+    
+    # El cliente revalida con If-None-Match: el mismo conjunto de embeddings da un 304
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    
+    body = plot_cache.get(etag)
+    if body is None:
+        # Construcción y serialización de Plotly en el pool de procesos
+        try:
+            figure_json = await stage_executors.run_in_process(
+                f"plot_{plot_type}", PLOT_GENERATORS[plot_type], embeddings_data
+            )
+        except ExecutorBusy as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        body = figure_json.encode('utf-8')
+        plot_cache.put(etag, body)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
+    
+
+@app.get("/api/visualization/{plot_type}/data")
+async def get_visualization_data(plot_type: str, request: Request, result_id: str, encoding: str = "json"):
+    """Columnas del gráfico (ids, ángulos, similitudes, coordenadas 3D) de un resultado guardado.
+
+    Con encoding=base64 las columnas numéricas van como float32 little-endian en base64.
+    """
+    if plot_type not in PLOT_GENERATORS:
+        raise HTTPException(status_code=400, detail="Tipo de gráfico no soportado")
+    if encoding not in PLOT_DATA_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"encoding inválido: {encoding}. Opciones: {list(PLOT_DATA_ENCODINGS)}")
+    
+    record = await db_manager.run(db_manager.get_analysis_result, result_id)
+    if record is None or record['kind'] != "plot_data":
+        raise HTTPException(status_code=404, detail=f"Resultado no encontrado: {result_id}")
+    
+    # Un resultado guardado no cambia: el navegador lo revalida con If-None-Match
+    etag = f'"{plot_type}-{encoding}-{result_id}-{record["created_at"].replace(" ", "T")}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=encode_plot_data(record['payload'], plot_type, encoding), headers=headers)
+
+def load_result_vectors(keys):
+    """Matriz float32 little-endian con los vectores del almacén, en el orden de las claves."""
+    found = get_embedding_cache().get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        raise KeyError(f"{len(missing)} vector(es) ya no están en el almacén de embeddings")
+    return np.stack([np.asarray(found[key], dtype='<f4') for key in keys])
+
+@app.get("/api/results/{result_id}/vectors")
+async def get_result_vectors(result_id: str, ids: str = None):
+    """Vectores completos de un resultado en binario: filas float32 little-endian contiguas.
+
+    ``ids`` (separados por comas) elige las patentes y su orden; por defecto la
+    principal y después las citadas. Filas y dimensión van en las cabeceras.
+    """
+    record = await db_manager.run(db_manager.get_analysis_result, result_id)
+    if record is None or record['kind'] != "plot_data":
+        raise HTTPException(status_code=404, detail=f"Resultado no encontrado: {result_id}")
+    
+    payload = record['payload']
+    vector_keys = payload.get('vector_keys') or {}
+    requested = [patent_id for patent_id in ids.split(',') if patent_id] if ids else \
+        [payload['main_patent_id']] + payload['ids']
+    unknown = [patent_id for patent_id in requested if patent_id not in vector_keys]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Ids sin vector en el resultado {result_id}: {unknown}")
+    
+    try:
+        vectors = await stage_executors.run_in_thread(
+            "result_vectors", load_result_vectors, [vector_keys[patent_id] for patent_id in requested]
+        )
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    
+    return Response(
+        content=vectors.tobytes(),
+        media_type="application/octet-stream",
+        headers={
+            "X-Vector-Count": str(vectors.shape[0]),
+            "X-Vector-Dim": str(vectors.shape[1]),
+            "X-Vector-Dtype": "float32",
+            "Cache-Control": "private, max-age=3600"
+        }
+    )
\ No newline at end of file
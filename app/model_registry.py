@@ -0,0 +1,75 @@
+import threading
+import logging
+from typing import TYPE_CHECKING, Dict, NamedTuple
+
+if TYPE_CHECKING:
+    import torch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "anferico/bert-for-patents"
+
+
+class SharedModel(NamedTuple):
+    """Tokenizer y pesos de un modelo cargados una única vez por proceso."""
+    model_name: str
+    tokenizer: object
+    model: "torch.nn.Module"
+    device: "torch.device"
+    # Los tokenizers rápidos no admiten llamadas concurrentes con distinta configuración
+    tokenizer_lock: threading.Lock
+
+
+class ModelRegistry:
+    """Registro de modelos compartido por todas las sesiones del proceso.
+
+    Cada modelo se carga la primera vez que se solicita y se deja en modo
+    evaluación y sin gradientes, de modo que las sesiones solo lo leen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, SharedModel] = {}
+
+    def get(self, model_name: str = DEFAULT_MODEL_NAME) -> SharedModel:
+        shared = self._models.get(model_name)
+        if shared is not None:
+            return shared
+
+        with self._lock:
+            # Otro hilo pudo haberlo cargado mientras esperábamos el lock
+            shared = self._models.get(model_name)
+            if shared is None:
+                shared = self._load(model_name)
+                self._models[model_name] = shared
+            return shared
+
+    def is_loaded(self, model_name: str = DEFAULT_MODEL_NAME) -> bool:
+        return model_name in self._models
+
+    def _load(self, model_name: str) -> SharedModel:
+        # torch y transformers se importan en la primera carga, no al arrancar el servidor
+        import torch
+        from transformers import AutoTokenizer, AutoModel
+
+        try:
+            device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            logger.info(f"Cargando modelo compartido {model_name} en {device}")
+
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = AutoModel.from_pretrained(model_name).to(device)
+            model.eval()
+            model.requires_grad_(False)
+
+            return SharedModel(model_name, tokenizer, model, device, threading.Lock())
+        except Exception as e:
+            logger.error(f"Error cargando el modelo {model_name}: {str(e)}")
+            raise
+
+
+model_registry = ModelRegistry()
+
+
+def get_shared_model(model_name: str = DEFAULT_MODEL_NAME) -> SharedModel:
+    """Devuelve el modelo compartido del proceso, cargándolo si hace falta."""
+    return model_registry.get(model_name)
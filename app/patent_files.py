@@ -0,0 +1,54 @@
+"""Lectura de archivos de patentes con el formato de data/EP*.json / dataentry*.json.
+
+Sin dependencias de torch: lo usan tanto la carga masiva de embeddings como el
+ajuste del modelo TF-IDF.
+"""
+import glob
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+DEFAULT_PATTERNS = ("*.json", "*.jsonl")
+
+
+def find_patent_files(input_dir: str, patterns: Iterable[str] = DEFAULT_PATTERNS,
+                      exclude: Iterable[str] = ()) -> List[Path]:
+    """Archivos del directorio que cumplen algún patrón, sin los excluidos."""
+    excluded = {Path(path).resolve() for path in exclude}
+    return sorted({
+        Path(path) for pattern in patterns for path in glob.glob(str(Path(input_dir) / pattern))
+        if Path(path).resolve() not in excluded
+    })
+
+
+def iter_patent_bundles(path: Path) -> Iterator[Dict]:
+    """Devuelve cada objeto de patente del archivo (uno en .json, uno por línea en .jsonl)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.suffix == '.jsonl':
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"Línea {line_number} inválida en {path}: {str(e)}")
+        else:
+            yield json.load(f)
+
+
+def iter_documents(patent_data: Dict) -> Iterator[Tuple[str, str]]:
+    """(id de patente, texto) del documento principal y de los citados.
+
+    Los objetos que no tienen el formato esperado se omiten sin interrumpir la lectura.
+    """
+    if not isinstance(patent_data, dict) or 'cited_document_id' not in patent_data:
+        return
+    if not isinstance(patent_data['cited_document_id'], dict):
+        print("Lote omitido: 'cited_document_id' debe ser un objeto {id: texto}")
+        return
+    for key, value in patent_data.items():
+        if key == 'cited_document_id':
+            yield from value.items()
+        else:
+            yield key, value
\ No newline at end of file
@@ -0,0 +1,283 @@
+import json
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .embedding_cache import get_embedding_cache
+from .config import PRIOR_ART_INDEX_DIR, PRIOR_ART_IVF_MIN_SIZE, PRIOR_ART_N_PROBE
+from .similarity import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+# Filas procesadas por bloque al recorrer el almacén mapeado en memoria
+_CHUNK_ROWS = 8192
+
+
+def _row_norms(matrix: np.ndarray) -> np.ndarray:
+    norms = np.empty(matrix.shape[0], dtype=np.float32)
+    for start in range(0, matrix.shape[0], _CHUNK_ROWS):
+        block = np.asarray(matrix[start:start + _CHUNK_ROWS], dtype=np.float32)
+        norms[start:start + len(block)] = np.linalg.norm(block, axis=1)
+    return np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int = 10, seed: int = 42) -> np.ndarray:
+    """K-means sobre vectores normalizados (similitud coseno); devuelve los centroides normalizados."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = np.linalg.norm(sums, axis=1) == 0
+        # Reiniciar los centroides vacíos con puntos al azar
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    return centroids.astype(np.float32)
+
+
+class PriorArtIndex:
+    """Índice de vecinos más cercanos sobre todos los embeddings del almacén.
+
+    Por debajo de ``ivf_min_size`` documentos la búsqueda es exacta (un GEMV
+    sobre la matriz mapeada en memoria). A partir de ese tamaño se entrena un
+    índice IVF (k-means esférico) y solo se recorren las ``n_probe`` listas
+    más cercanas a la consulta. Los documentos nuevos del almacén se insertan
+    de forma incremental en la lista de su centroide más cercano.
+
+    El entrenamiento nunca bloquea una búsqueda: ``sync`` lo lanza en un hilo
+    de fondo y, mientras termina, las búsquedas siguen siendo exactas.
+    """
+
+    def __init__(self, store, index_dir: str = PRIOR_ART_INDEX_DIR,
+                 ivf_min_size: int = PRIOR_ART_IVF_MIN_SIZE, n_probe: int = PRIOR_ART_N_PROBE):
+        self.store = store
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.labels_path = self.index_dir / "labels.jsonl"
+        self.ivf_path = self.index_dir / "ivf.npz"
+        self.ivf_min_size = ivf_min_size
+        if n_probe < 1:
+            raise ValueError(f"n_probe debe ser mayor que 0, se recibió {n_probe}")
+        self.n_probe = n_probe
+
+        self._lock = threading.Lock()
+        self._train_lock = threading.Lock()
+        self._training: Optional[threading.Thread] = None
+        self._labels: Dict[str, List[str]] = {}
+        self._norms = np.empty(0, dtype=np.float32)
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._lists: List[np.ndarray] = []
+
+        self._load_labels()
+        self._load_ivf()
+
+    # --- Persistencia ---
+
+    def _load_labels(self):
+        if not self.labels_path.exists():
+            return
+        with open(self.labels_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                ids = self._labels.setdefault(entry['key'], [])
+                if entry['id'] not in ids:
+                    ids.append(entry['id'])
+
+    def _load_ivf(self):
+        if not self.ivf_path.exists():
+            return
+        try:
+            with np.load(self.ivf_path) as data:
+                centroids = data['centroids']
+                assignments = data['assignments']
+        except Exception as e:
+            logger.warning(f"No se pudo cargar el índice IVF {self.ivf_path}: {e}")
+            return
+        if len(assignments) > len(self.store):
+            logger.warning("Índice IVF más grande que el almacén, se descarta")
+            return
+        self._centroids = centroids
+        self._assignments = assignments
+        self._rebuild_lists()
+
+    def _save_ivf(self):
+        tmp_path = self.ivf_path.with_name(self.ivf_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, centroids=self._centroids, assignments=self._assignments)
+        tmp_path.replace(self.ivf_path)
+
+    def _rebuild_lists(self):
+        order = np.argsort(self._assignments, kind='stable').astype(np.int64)
+        counts = np.bincount(self._assignments, minlength=len(self._centroids))
+        self._lists = np.split(order, np.cumsum(counts)[:-1])
+
+    # --- Inserción ---
+
+    def register_documents(self, documents: Dict[str, str]) -> None:
+        """Asocia claves del almacén con ids de patente para mostrarlas en los resultados."""
+        new_entries = []
+        with self._lock:
+            for key, doc_id in documents.items():
+                ids = self._labels.setdefault(key, [])
+                if doc_id not in ids:
+                    ids.append(doc_id)
+                    new_entries.append({'key': key, 'id': doc_id})
+            if new_entries:
+                with open(self.labels_path, 'a') as f:
+                    for entry in new_entries:
+                        f.write(json.dumps(entry) + '\n')
+
+    def sync(self) -> int:
+        """Incorpora las filas nuevas del almacén; devuelve cuántas se agregaron."""
+        with self._lock:
+            matrix = self.store.matrix()
+            n_indexed = len(self._norms)
+            if len(matrix) == n_indexed:
+                return 0
+
+            new_rows = matrix[n_indexed:]
+            self._norms = np.concatenate([self._norms, _row_norms(new_rows)])
+
+            if self._centroids is None:
+                if len(matrix) >= self.ivf_min_size:
+                    self._start_training()
+            elif len(self._assignments) < len(matrix):
+                start = len(self._assignments)
+                self._assignments = np.concatenate([self._assignments, self._assign(matrix, self._centroids, start)])
+                self._rebuild_lists()
+                self._save_ivf()
+
+            return len(matrix) - n_indexed
+
+    @staticmethod
+    def _assign(matrix: np.ndarray, centroids: np.ndarray, start: int = 0) -> np.ndarray:
+        assignments = []
+        for block_start in range(start, len(matrix), _CHUNK_ROWS):
+            block = np.asarray(matrix[block_start:block_start + _CHUNK_ROWS], dtype=np.float32)
+            assignments.append(np.argmax(block @ centroids.T, axis=1).astype(np.int32))
+        return np.concatenate(assignments) if assignments else np.empty(0, dtype=np.int32)
+
+    def _start_training(self):
+        # Se llama con _lock tomado
+        if self._training is not None and self._training.is_alive():
+            return
+        self._training = threading.Thread(target=self._train_ivf, name="prior-art-ivf", daemon=True)
+        self._training.start()
+
+    def _train_ivf(self, n_lists: Optional[int] = None, max_train: int = 50000):
+        """Entrena el IVF sin tomar _lock; solo lo toma para instalar el resultado."""
+        with self._train_lock:
+            with self._lock:
+                norms = self._norms
+            matrix = self.store.matrix()[:len(norms)]
+            if not len(matrix):
+                return
+
+            started = time.perf_counter()
+            n_lists = n_lists or max(1, int(4 * np.sqrt(len(matrix))))
+            rng = np.random.default_rng(42)
+            sample_rows = np.sort(rng.choice(len(matrix), min(len(matrix), max_train), replace=False))
+            sample = np.asarray(matrix[sample_rows], dtype=np.float32) / norms[sample_rows, None]
+            centroids = spherical_kmeans(sample, min(n_lists, len(sample)))
+            assignments = self._assign(matrix, centroids)
+
+            with self._lock:
+                # Asignar las filas que llegaron durante el entrenamiento
+                matrix = self.store.matrix()[:len(self._norms)]
+                self._centroids = centroids
+                self._assignments = np.concatenate([assignments, self._assign(matrix, centroids, len(assignments))])
+                self._rebuild_lists()
+                self._save_ivf()
+            logger.info(
+                f"Índice IVF entrenado: {len(centroids)} listas, {len(matrix)} documentos, "
+                f"{time.perf_counter() - started:.1f} s"
+            )
+
+    def rebuild(self, n_lists: Optional[int] = None) -> None:
+        """Reentrena el índice IVF desde cero (p. ej. tras crecer mucho el corpus)."""
+        self.sync()
+        self._train_ivf(n_lists)
+
+    # --- Búsqueda ---
+
+    def __len__(self) -> int:
+        return len(self._norms)
+
+    @property
+    def uses_ivf(self) -> bool:
+        return self._centroids is not None
+
+    @staticmethod
+    def _scores(matrix: np.ndarray, norms: np.ndarray, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(matrix[rows], dtype=np.float32)
+        return (vectors @ query) / norms[rows]
+
+    def search(self, query_vector, top_k: int = 10, exact: bool = False,
+               exclude_keys: Iterable[str] = ()) -> List[Dict]:
+        """Devuelve los top_k documentos más similares (coseno) a la consulta."""
+        self.sync()
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), np.finfo(np.float32).tiny)
+
+        # sync() y el entrenamiento reemplazan estos arreglos; se puntúa sobre una copia consistente
+        with self._lock:
+            norms, centroids, lists = self._norms, self._centroids, self._lists
+
+        matrix = self.store.matrix()
+        n_indexed = len(norms)
+        if n_indexed == 0:
+            return []
+        matrix = matrix[:n_indexed]
+
+        exclude_rows = {self.store.rows([key])[0] for key in exclude_keys if key in self.store}
+
+        if exact or centroids is None:
+            candidates = np.arange(n_indexed)
+            scores = np.empty(n_indexed, dtype=np.float32)
+            for start in range(0, n_indexed, _CHUNK_ROWS):
+                block = np.asarray(matrix[start:start + _CHUNK_ROWS], dtype=np.float32)
+                scores[start:start + len(block)] = (block @ query) / norms[start:start + len(block)]
+        else:
+            probe = top_k_indices(centroids @ query, self.n_probe)
+            candidates = np.sort(np.concatenate([lists[i] for i in probe]))
+            scores = self._scores(matrix, norms, candidates, query)
+
+        if exclude_rows:
+            keep = ~np.isin(candidates, list(exclude_rows))
+            candidates, scores = candidates[keep], scores[keep]
+
+        results = []
+        for i in top_k_indices(scores, top_k):
+            key = self.store.id_at(int(candidates[i]))
+            results.append({
+                'key': key,
+                'ids': self._labels.get(key, []),
+                'similarity': float(np.clip(scores[i], -1.0, 1.0)),
+            })
+        return results
+
+
+_shared_index: Optional[PriorArtIndex] = None
+_shared_index_lock = threading.Lock()
+
+
+def get_prior_art_index() -> PriorArtIndex:
+    """Índice de antecedentes compartido, construido sobre el almacén de embeddings."""
+    global _shared_index
+    if _shared_index is None:
+        with _shared_index_lock:
+            if _shared_index is None:
+                _shared_index = PriorArtIndex(get_embedding_cache().store)
+    return _shared_index
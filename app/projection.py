@@ -0,0 +1,178 @@
+import threading
+import logging
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .embedding_cache import get_embedding_cache
+from .config import (
+    PROJECTION_METHOD,
+    PROJECTION_BASIS_PATH,
+    PROJECTION_MIN_FIT_SAMPLES,
+    PROJECTION_MAX_FIT_SAMPLES,
+)
+
+logger = logging.getLogger(__name__)
+
+PROJECTION_METHODS = ("fitted", "pca", "tsne")
+# Método informado cuando se pidió "fitted" pero aún no hay base global: las
+# coordenadas salen de una PCA de la solicitud y no son estables entre solicitudes
+LOCAL_PCA = "pca_local"
+N_COMPONENTS = 3
+
+
+def fit_pca_basis(matrix, n_components: int = N_COMPONENTS) -> Tuple[np.ndarray, np.ndarray]:
+    """Ajusta una base PCA con SVD aleatorizada y devuelve (media, componentes)."""
+    # sklearn se importa al primer ajuste para no retrasar el arranque del servidor
+    from sklearn.utils.extmath import randomized_svd, svd_flip
+
+    matrix = np.asarray(matrix, dtype=np.float32)
+    mean = matrix.mean(axis=0)
+    centered = matrix - mean
+
+    k = min(n_components, *centered.shape)
+    components = np.zeros((n_components, matrix.shape[1]), dtype=np.float32)
+    if k > 0:
+        U, _, Vt = randomized_svd(centered, n_components=k, random_state=42)
+        # Fijar el signo de cada componente para que la base sea determinista
+        _, Vt = svd_flip(U, Vt)
+        components[:k] = Vt
+    return mean, components
+
+
+def project_with_tsne(embeddings_list) -> List[List[float]]:
+    """Reduce los embeddings a 3D con t-SNE (función de módulo para el pool de procesos)."""
+    from sklearn.manifold import TSNE
+
+    all_embeddings = np.asarray(embeddings_list, dtype=np.float32)
+    n_samples = len(all_embeddings)
+
+    perplexity = min(max(n_samples // 3, 2), 30)
+    perplexity = min(perplexity, n_samples - 1)
+
+    logger.info(f"Usando perplejidad de {perplexity} para {n_samples} muestras")
+    tsne = TSNE(n_components=N_COMPONENTS, random_state=42, perplexity=perplexity)
+    return tsne.fit_transform(all_embeddings).tolist()
+
+
+class ProjectionEngine:
+    """Proyecta embeddings a 3D para las visualizaciones.
+
+    - ``fitted``: base PCA ajustada una sola vez sobre el almacén de embeddings
+      y persistida en disco; proyectar es un producto de matrices y las
+      coordenadas de un documento no cambian entre solicitudes.
+    - ``pca``: PCA (SVD aleatorizada) ajustada sobre los embeddings de la solicitud.
+    - ``tsne``: t-SNE sobre los embeddings de la solicitud (opcional, lento).
+
+    Mientras el almacén no tenga ``min_fit_samples`` documentos, ``fitted``
+    recurre a la PCA de la solicitud y lo informa como ``pca_local``.
+    """
+
+    def __init__(self, basis_path: str = PROJECTION_BASIS_PATH, store=None,
+                 min_fit_samples: int = PROJECTION_MIN_FIT_SAMPLES,
+                 max_fit_samples: int = PROJECTION_MAX_FIT_SAMPLES):
+        self.basis_path = Path(basis_path)
+        self.store = store
+        self.min_fit_samples = min_fit_samples
+        self.max_fit_samples = max_fit_samples
+        self._basis: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._lock = threading.Lock()
+        self._load_basis()
+
+    def _load_basis(self):
+        if not self.basis_path.exists():
+            return
+        try:
+            with np.load(self.basis_path) as data:
+                self._basis = (data['mean'], data['components'])
+            logger.info(f"Base de proyección cargada desde {self.basis_path}")
+        except Exception as e:
+            logger.warning(f"No se pudo cargar la base de proyección {self.basis_path}: {e}")
+
+    def _save_basis(self):
+        self.basis_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.basis_path.with_name(self.basis_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, mean=self._basis[0], components=self._basis[1])
+        tmp_path.replace(self.basis_path)
+
+    @property
+    def is_fitted(self) -> bool:
+        return self._basis is not None
+
+    def _fit_matrix(self, extra: Optional[np.ndarray] = None) -> np.ndarray:
+        """Muestra del almacén de embeddings (más los de la solicitud) para ajustar la base."""
+        parts = []
+        if self.store is not None and len(self.store) > 0:
+            stored = self.store.matrix()
+            if len(stored) > self.max_fit_samples:
+                rows = np.random.default_rng(42).choice(len(stored), self.max_fit_samples, replace=False)
+                stored = stored[np.sort(rows)]
+            parts.append(np.asarray(stored, dtype=np.float32))
+        if extra is not None and len(extra):
+            parts.append(np.asarray(extra, dtype=np.float32))
+        return np.concatenate(parts) if parts else np.empty((0, 0), dtype=np.float32)
+
+    def fit(self, extra: Optional[np.ndarray] = None) -> bool:
+        """Ajusta y persiste la base global. Devuelve False si aún no hay muestras suficientes."""
+        with self._lock:
+            matrix = self._fit_matrix(extra)
+            if len(matrix) < self.min_fit_samples:
+                return False
+            self._basis = fit_pca_basis(matrix)
+            self._save_basis()
+            logger.info(f"Base de proyección ajustada con {len(matrix)} embeddings")
+            return True
+
+    @staticmethod
+    def transform(embeddings, basis) -> np.ndarray:
+        mean, components = basis
+        return (np.asarray(embeddings, dtype=np.float32) - mean) @ components.T
+
+    def project_fitted(self, embeddings) -> Tuple[List[List[float]], str]:
+        """Coordenadas con la base global y el método realmente usado ("fitted" o "pca_local")."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self._basis is None and not self.fit(extra=embeddings):
+            # Mientras no haya corpus suficiente, se usa una base de la propia solicitud
+            logger.info("Corpus insuficiente para la base global, usando PCA de la solicitud")
+            return self.project_pca(embeddings), LOCAL_PCA
+        return self.transform(embeddings, self._basis).tolist(), "fitted"
+
+    def project_pca(self, embeddings) -> List[List[float]]:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return self.transform(embeddings, fit_pca_basis(embeddings)).tolist()
+
+    def project(self, embeddings, method: Optional[str] = None) -> List[List[float]]:
+        return self.project_with_method(embeddings, method)[0]
+
+    def project_with_method(self, embeddings, method: Optional[str] = None) -> Tuple[List[List[float]], str]:
+        """Proyecta a 3D y devuelve también el método usado, que puede diferir del pedido."""
+        method = method or PROJECTION_METHOD
+        if method not in PROJECTION_METHODS:
+            raise ValueError(f"Método de proyección no soportado: {method}. Opciones: {PROJECTION_METHODS}")
+        if len(embeddings) == 0:
+            raise ValueError("Lista de embeddings vacía")
+
+        if method == "tsne":
+            if len(embeddings) <= 2:
+                # t-SNE necesita al menos 3 muestras
+                return self.project_fitted(embeddings)
+            return project_with_tsne(embeddings), "tsne"
+        if method == "pca":
+            return self.project_pca(embeddings), "pca"
+        return self.project_fitted(embeddings)
+
+
+_shared_engine: Optional[ProjectionEngine] = None
+_shared_engine_lock = threading.Lock()
+
+
+def get_projection_engine() -> ProjectionEngine:
+    """Motor de proyección compartido, ajustado sobre el almacén de embeddings."""
+    global _shared_engine
+    if _shared_engine is None:
+        with _shared_engine_lock:
+            if _shared_engine is None:
+                _shared_engine = ProjectionEngine(store=get_embedding_cache().store)
+    return _shared_engine
@@ -0,0 +1,92 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def as_matrix(vectors) -> np.ndarray:
+    """Convierte una lista de vectores (o una matriz) en una matriz float64 contigua.
+
+    Se trabaja en float64 para que arccos sea preciso con similitudes cercanas a 1.
+    """
+    matrix = np.asarray(vectors, dtype=np.float64)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    return np.ascontiguousarray(matrix)
+
+
+def stack_embeddings(embeddings_data: Dict, field: str = 'embedding') -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """Devuelve (vector principal, matriz de citados, ids citados) a partir de la respuesta de embeddings."""
+    main_vector = np.asarray(embeddings_data['main_patent'][field], dtype=np.float64)
+    cited = embeddings_data['cited_patents']
+    ids = [patent['id'] for patent in cited]
+    if not cited:
+        return main_vector, np.empty((0, main_vector.shape[0]), dtype=np.float64), ids
+    return main_vector, as_matrix([patent[field] for patent in cited]), ids
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, np.finfo(np.float64).tiny)
+
+
+def cosine_similarities(query, matrix) -> np.ndarray:
+    """Similitud coseno entre el vector consulta y cada fila de la matriz (un solo GEMV)."""
+    query = np.asarray(query, dtype=np.float64)
+    matrix = as_matrix(matrix)
+    if matrix.shape[0] == 0:
+        return np.empty(0, dtype=np.float64)
+    return np.clip(normalize_rows(matrix) @ normalize_rows(query), -1.0, 1.0)
+
+
+def cosine_angles(similarities) -> np.ndarray:
+    """Ángulo en radianes correspondiente a cada similitud coseno."""
+    return np.arccos(np.clip(similarities, -1.0, 1.0))
+
+
+def euclidean_distances(query, matrix) -> np.ndarray:
+    """Distancia euclidiana entre el vector consulta y cada fila de la matriz."""
+    query = np.asarray(query, dtype=np.float64)
+    matrix = as_matrix(matrix)
+    if matrix.shape[0] == 0:
+        return np.empty(0, dtype=np.float64)
+    # ||a - b||² = ||a||² + ||b||² - 2ab, con una sola multiplicación matriz-vector
+    squared = (matrix * matrix).sum(axis=1) + query @ query - 2.0 * (matrix @ query)
+    return np.sqrt(np.maximum(squared, 0.0))
+
+
+def top_k_indices(scores, k: Optional[int] = None, largest: bool = True) -> np.ndarray:
+    """Índices de los k mejores puntajes, ordenados, usando argpartition."""
+    scores = np.asarray(scores)
+    n = scores.shape[0]
+    if k is not None and k < 1:
+        raise ValueError(f"k debe ser mayor que 0, se recibió {k}")
+    if k is None or k >= n:
+        order = np.argsort(-scores if largest else scores, kind='stable')
+        return order
+    keyed = -scores if largest else scores
+    candidates = np.argpartition(keyed, k - 1)[:k]
+    return candidates[np.argsort(keyed[candidates], kind='stable')]
+
+
+def novelty_score(similarities) -> float:
+    """Novedad de la reinvindicación: 1 - similitud con el antecedente más cercano (0 a 1)."""
+    similarities = np.asarray(similarities, dtype=np.float64)
+    if similarities.size == 0:
+        return 1.0
+    return float(np.clip(1.0 - similarities.max(), 0.0, 1.0))
+
+
+def rank_by_similarity(query, matrix, ids: Sequence[str], top_k: Optional[int] = None) -> List[Dict]:
+    """Ordena los documentos por similitud coseno con la consulta."""
+    similarities = cosine_similarities(query, matrix)
+    angles = cosine_angles(similarities)
+    distances = euclidean_distances(query, matrix)
+    return [
+        {
+            'id': ids[i],
+            'similarity': float(similarities[i]),
+            'angle': float(angles[i]),
+            'distance': float(distances[i]),
+        }
+        for i in top_k_indices(similarities, top_k)
+    ]
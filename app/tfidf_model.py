@@ -0,0 +1,343 @@
+"""Modelo TF-IDF del corpus de patentes para la visualización semántica.
+
+El modelo se ajusta fuera de línea sobre un directorio de patentes; el servidor
+solo lo carga y transforma, así que la IDF no depende de las solicitudes recibidas.
+Un ajuste nuevo se aplica al reiniciar el servidor. Si al primer uso no hay
+modelo guardado, el servidor lo ajusta una vez sobre ``TFIDF_CORPUS_DIR``.
+
+Uso (desde la raíz del repositorio), para ajustar el modelo sobre un directorio:
+    python -m app.tfidf_model data/ [--pattern "*.json"]
+"""
+import argparse
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+from .config import TFIDF_MODEL_PATH, TFIDF_N_FEATURES, TFIDF_CACHE_MB, TFIDF_CORPUS_DIR
+from .embedding_cache import text_hash
+from .lru_cache import ByteBudgetLRU
+
+logger = logging.getLogger(__name__)
+
+# Mismo análisis de texto que el TfidfVectorizer anterior de /semantic
+NGRAM_RANGE = (1, 2)
+STOP_WORDS = 'english'
+
+
+class TermCounts(NamedTuple):
+    """Términos de un texto con su frecuencia y su columna en el espacio con hashing."""
+    terms: tuple
+    counts: np.ndarray
+    columns: np.ndarray
+
+
+def _term_counts_sizeof(value: TermCounts) -> int:
+    # Estimación: arrays más las cadenas de los términos
+    return value.counts.nbytes + value.columns.nbytes + sum(len(term) + 56 for term in value.terms)
+
+
+def top_k_order(weights: np.ndarray, limit: int) -> np.ndarray:
+    """Índices de los ``limit`` pesos mayores, de mayor a menor, sin ordenar el resto."""
+    if limit <= 0 or len(weights) == 0:
+        return np.empty(0, dtype=np.int64)
+    if len(weights) > limit:
+        top = np.argpartition(-weights, limit - 1)[:limit]
+    else:
+        top = np.arange(len(weights))
+    return top[np.argsort(-weights[top], kind='stable')]
+
+
+class CorpusTfidf:
+    """TF-IDF con hashing ajustado sobre el corpus de patentes.
+
+    El vocabulario no se guarda: cada término se proyecta con hashing a una de
+    ``n_features`` columnas, así que ajustar solo acumula las frecuencias de
+    documento (``df``) y el número de documentos. El ajuste se hace únicamente
+    fuera de línea (la CLI de este módulo); las solicitudes nunca lo modifican.
+    Los conteos de términos de cada texto se guardan en una caché LRU por hash
+    del texto.
+    """
+
+    def __init__(self, model_path: str = TFIDF_MODEL_PATH, n_features: int = TFIDF_N_FEATURES,
+                 cache_mb: int = TFIDF_CACHE_MB):
+        # sklearn solo hace falta para tokenizar y aplicar el hashing
+        from sklearn.feature_extraction import FeatureHasher
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.model_path = Path(model_path)
+        self.n_features = n_features
+        self._analyzer = HashingVectorizer(
+            stop_words=STOP_WORDS, ngram_range=NGRAM_RANGE, n_features=n_features, alternate_sign=False
+        ).build_analyzer()
+        self._hasher = FeatureHasher(n_features=n_features, input_type='string', alternate_sign=False)
+
+        self._lock = threading.Lock()
+        self.df = np.zeros(n_features, dtype=np.int32)
+        self.n_documents = 0
+        self._seen: set = set()
+        self._idf: Optional[np.ndarray] = None
+        self.cache = ByteBudgetLRU(cache_mb * 2**20, _term_counts_sizeof)
+
+        self._load()
+
+    # --- Persistencia ---
+
+    def _load(self):
+        if not self.model_path.exists():
+            logger.warning(f"No existe el modelo TF-IDF {self.model_path}")
+            return
+        try:
+            with np.load(self.model_path) as data:
+                df = data['df']
+                seen = data['seen']
+        except Exception as e:
+            logger.warning(f"No se pudo cargar el modelo TF-IDF {self.model_path}: {e}")
+            return
+        if len(df) != self.n_features:
+            logger.warning(f"Modelo TF-IDF con {len(df)} columnas (se esperaban {self.n_features}), se descarta")
+            return
+        self.df = df.astype(np.int32)
+        self._seen = set(seen.tolist())
+        self.n_documents = len(self._seen)
+        logger.info(f"Modelo TF-IDF cargado desde {self.model_path} ({self.n_documents} documentos)")
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        self.model_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.model_path.with_name(self.model_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, df=self.df, seen=np.array(sorted(self._seen), dtype='S32'))
+        tmp_path.replace(self.model_path)
+
+    # --- Ajuste ---
+
+    def term_counts(self, text: str) -> TermCounts:
+        """Conteos de términos del texto, desde la caché si ya se analizó."""
+        key = text_hash(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        terms, counts = np.unique(np.array(self._analyzer(text), dtype=object), return_counts=True)
+        terms = tuple(terms.tolist())
+        columns = self._hasher.transform([[term] for term in terms]).indices if terms else np.empty(0)
+        value = TermCounts(terms, counts.astype(np.float32), columns.astype(np.int32))
+        self.cache.put(key, value)
+        return value
+
+    def partial_fit(self, texts: Iterable[str]) -> int:
+        """Añade al corpus los textos que aún no estaban; devuelve cuántos se añadieron.
+
+        Solo lo usa el ajuste fuera de línea (``fit_directory``); el servidor no
+        lo llama al atender solicitudes.
+        """
+        pending = {}
+        for text in texts:
+            if isinstance(text, str) and text.strip():
+                # 32 caracteres del hash bastan para identificar el documento
+                pending.setdefault(text_hash(text)[:32].encode(), text)
+        with self._lock:
+            pending = {digest: text for digest, text in pending.items() if digest not in self._seen}
+        if not pending:
+            return 0
+
+        updates = [(digest, np.unique(self.term_counts(text).columns)) for digest, text in pending.items()]
+        with self._lock:
+            added = 0
+            for digest, columns in updates:
+                # Otro hilo pudo añadir el mismo texto mientras se analizaba
+                if digest in self._seen:
+                    continue
+                self._seen.add(digest)
+                self.df[columns] += 1
+                added += 1
+            self.n_documents = len(self._seen)
+            self._idf = None
+        return added
+
+    @property
+    def fitted(self) -> bool:
+        """Falso mientras no hay documentos: la IDF sería 1 para todos los términos."""
+        return self.n_documents > 0
+
+    @property
+    def idf(self) -> np.ndarray:
+        """IDF suavizada, como TfidfVectorizer(smooth_idf=True)."""
+        idf = self._idf
+        if idf is None:
+            with self._lock:
+                idf = (np.log((1 + self.n_documents) / (1 + self.df.astype(np.float64))) + 1).astype(np.float32)
+                self._idf = idf
+        return idf
+
+    # --- Transformación ---
+
+    def transform(self, texts: List[str]):
+        """Matriz dispersa (CSR) de vectores TF-IDF normalizados, una fila por texto."""
+        from scipy.sparse import csr_matrix
+
+        idf = self.idf
+        data, indices, indptr = [], [], [0]
+        for text in texts:
+            entry = self.term_counts(text)
+            data.append(entry.counts * idf[entry.columns])
+            indices.append(entry.columns)
+            indptr.append(indptr[-1] + len(entry.columns))
+
+        matrix = csr_matrix(
+            (np.concatenate(data) if data else np.empty(0, dtype=np.float32),
+             np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+             np.asarray(indptr)),
+            shape=(len(texts), self.n_features)
+        )
+        # Suma los términos que colisionan en la misma columna
+        matrix.sum_duplicates()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        matrix.data /= np.repeat(norms, np.diff(matrix.indptr)).astype(matrix.data.dtype)
+        return matrix
+
+    def term_weights(self, entry: TermCounts) -> np.ndarray:
+        """Pesos TF-IDF normalizados de cada término del texto."""
+        weights = entry.counts * self.idf[entry.columns]
+        return weights / max(float(np.linalg.norm(weights)), np.finfo(np.float32).tiny)
+
+    def top_terms(self, text: str, limit: int = 50) -> List[Dict]:
+        """Términos del texto con mayor peso TF-IDF."""
+        entry = self.term_counts(text)
+        weights = self.term_weights(entry)
+        return [{"token": entry.terms[i], "score": float(weights[i])} for i in top_k_order(weights, limit)]
+
+    def similarities(self, main_text: str, cited_texts: List[str]) -> np.ndarray:
+        """Similitud coseno del texto principal con cada citado: un único producto disperso."""
+        matrix = self.transform([main_text] + list(cited_texts))
+        return np.asarray((matrix[1:] @ matrix[0].T).todense()).ravel()
+
+    def compare_batch(self, main_text: str, cited_texts: Dict[str, str],
+                      top_n: int = 50, shared_n: int = 20) -> Dict:
+        """Compara el texto principal con todos los citados en una sola pasada.
+
+        Devuelve el vector de similitudes, los términos con más peso de cada texto
+        y, por cada par, los términos compartidos que más aportan a la similitud
+        (producto de sus pesos en ambos textos).
+        """
+        ids = list(cited_texts)
+        similarities = self.similarities(main_text, [cited_texts[doc_id] for doc_id in ids])
+
+        main = self.term_counts(main_text)
+        main_weights = self.term_weights(main)
+        main_terms = np.asarray(main.terms, dtype=str)
+
+        results = []
+        for doc_id, similarity in zip(ids, similarities):
+            cited = self.term_counts(cited_texts[doc_id])
+            cited_weights = self.term_weights(cited)
+            # Los términos de cada texto ya están ordenados y sin repetir
+            _, main_idx, cited_idx = np.intersect1d(
+                main_terms, np.asarray(cited.terms, dtype=str), assume_unique=True, return_indices=True
+            )
+            contributions = main_weights[main_idx] * cited_weights[cited_idx]
+            results.append({
+                "id": doc_id,
+                "similarity": float(similarity),
+                "cited_terms": [
+                    {"token": cited.terms[i], "score": float(cited_weights[i])}
+                    for i in top_k_order(cited_weights, top_n)
+                ],
+                "shared_terms": [
+                    {
+                        "token": main.terms[main_idx[i]],
+                        "score": float(contributions[i]),
+                        "main_score": float(main_weights[main_idx[i]]),
+                        "cited_score": float(cited_weights[cited_idx[i]]),
+                    }
+                    for i in top_k_order(contributions, shared_n)
+                ],
+            })
+
+        return {
+            "ids": ids,
+            "similarities": similarities.tolist(),
+            "main_terms": [
+                {"token": main.terms[i], "score": float(main_weights[i])} for i in top_k_order(main_weights, top_n)
+            ],
+            "results": results,
+        }
+
+    def stats(self) -> Dict:
+        return {
+            'fitted': self.fitted,
+            'documents': self.n_documents,
+            'n_features': self.n_features,
+            'nonzero_df': int(np.count_nonzero(self.df)),
+            'cache': self.cache.stats(),
+        }
+
+
+_shared_model: Optional[CorpusTfidf] = None
+_shared_model_lock = threading.Lock()
+
+
+def fit_directory(model: CorpusTfidf, input_dir: str, patterns: Optional[Iterable[str]] = None) -> tuple:
+    """Ajusta el modelo con las patentes del directorio; devuelve (archivos, documentos nuevos)."""
+    from .patent_files import DEFAULT_PATTERNS, find_patent_files, iter_documents, iter_patent_bundles
+
+    files = find_patent_files(input_dir, patterns or DEFAULT_PATTERNS)
+    added = 0
+    for path in files:
+        try:
+            texts = [text for patent_data in iter_patent_bundles(path) for _, text in iter_documents(patent_data)]
+        except (OSError, ValueError) as e:
+            print(f"No se pudo leer {path}: {str(e)}")
+            continue
+        added += model.partial_fit(texts)
+        # Los conteos solo hacen falta para el ajuste; se libera la caché entre archivos
+        model.cache.clear()
+    return len(files), added
+
+
+def get_tfidf_model() -> CorpusTfidf:
+    """Modelo TF-IDF compartido por el proceso, cargado desde disco al primer uso.
+
+    Sin modelo guardado se ajusta una vez sobre ``TFIDF_CORPUS_DIR`` y se guarda.
+    """
+    global _shared_model
+    if _shared_model is None:
+        with _shared_model_lock:
+            if _shared_model is None:
+                model = CorpusTfidf()
+                if not model.fitted and Path(TFIDF_CORPUS_DIR).is_dir():
+                    n_files, _ = fit_directory(model, TFIDF_CORPUS_DIR)
+                    if model.fitted:
+                        model.save()
+                        logger.info(
+                            f"Modelo TF-IDF ajustado con {model.n_documents} documentos "
+                            f"de {n_files} archivos de {TFIDF_CORPUS_DIR}"
+                        )
+                if not model.fitted:
+                    logger.warning("Modelo TF-IDF sin documentos: la IDF es uniforme hasta ajustarlo con la CLI")
+                _shared_model = model
+    return _shared_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input_dir')
+    parser.add_argument('--pattern', dest='patterns', action='append',
+                        help="Patrón glob dentro del directorio (repetible; por defecto *.json y *.jsonl)")
+    args = parser.parse_args()
+
+    model = CorpusTfidf()
+    n_files, added = fit_directory(model, args.input_dir, args.patterns)
+    model.save()
+    print(f"Archivos: {n_files}, documentos nuevos: {added}, total en el modelo: {model.n_documents}")
+
+
+if __name__ == '__main__':
+    main()
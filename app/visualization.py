@@ -1,346 +1,600 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-import numpy as np
-from typing import List, Dict
-import plotly.graph_objects as go
-import json
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import logging
-from .bert_visualization import BertVisualizer
-
-# Inicializar el visualizador BERT (añadir con las otras inicializaciones)
-bert_visualizer = BertVisualizer()
-
-# Configurar logging
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
-
-router = APIRouter()
-
-def calculate_cosine_angles(embeddings_data: Dict):
-    """Calcula los ángulos del coseno entre el vector principal y los citados."""
-    main_embedding = np.array(embeddings_data['main_patent']['embedding'])
-    main_embedding = main_embedding / np.linalg.norm(main_embedding)
-    
-    reference_vector = np.array([1, 0])
-    angles = []
-    
-    for patent in embeddings_data['cited_patents']:
-        cited_embedding = np.array(patent['embedding'])
-        cited_embedding = cited_embedding / np.linalg.norm(cited_embedding)
-        cos_sim = np.dot(main_embedding, cited_embedding)
-        # Restringir el valor entre -1 y 1 para evitar errores numéricos
-        cos_sim = np.clip(cos_sim, -1.0, 1.0)
-        angle = np.arccos(cos_sim)
-        angles.append({
-            'id': patent['id'],
-            'angle': angle
-        })
-    
-    return angles
-
-def generate_cosine_plot(embeddings_data: Dict):
-    """Genera el gráfico de distancia coseno con información detallada en el hover."""
-    angles = calculate_cosine_angles(embeddings_data)
-    
-    # Crear el gráfico base
-    fig = go.Figure()
-    
-    # Vector principal (1,0)
-    fig.add_trace(go.Scatter(
-        x=[0, 1],
-        y=[0, 0],
-        mode='lines+markers',
-        name='Vector Principal',
-        line=dict(color='red', width=3),
-        hoverinfo='text',
-        text=[f'Patente Principal<br>ID: {embeddings_data["main_patent"]["id"]}', 
-              f'Patente Principal<br>ID: {embeddings_data["main_patent"]["id"]}'],
-    ))
-    
-    # Vectores citados
-    for angle_data in angles:
-        x = np.cos(angle_data['angle'])
-        y = np.sin(angle_data['angle'])
-        cosine_similarity = np.cos(angle_data['angle'])  # Calcular similitud coseno
-        
-        # Crear texto hover para inicio y fin del vector
-        hover_text = [
-            f'Patente Citada<br>' +
-            f'ID: {angle_data["id"]}<br>' +
-            f'Similitud Coseno: {cosine_similarity:.4f}<br>' +
-            f'Ángulo: {np.degrees(angle_data["angle"]):.2f}°',
-            
-            f'Patente Citada<br>' +
-            f'ID: {angle_data["id"]}<br>' +
-            f'Similitud Coseno: {cosine_similarity:.4f}<br>' +
-            f'Ángulo: {np.degrees(angle_data["angle"]):.2f}°'
-        ]
-        
-        fig.add_trace(go.Scatter(
-            x=[0, x],
-            y=[0, y],
-            mode='lines+markers',
-            name=f'Patent {angle_data["id"]}',
-            hoverinfo='text',
-            text=hover_text,
-            marker=dict(size=8),
-            line=dict(width=2)
-        ))
-    
-    # Configuración del layout
-    fig.update_layout(
-        showlegend=False,
-        xaxis=dict(
-            range=[-1.2, 1.2], 
-            title='X',
-            zeroline=True,
-            zerolinewidth=1,
-            zerolinecolor='lightgrey'
-        ),
-        yaxis=dict(
-            range=[-1.2, 1.2], 
-            title='Y', 
-            scaleanchor='x', 
-            scaleratio=1,
-            zeroline=True,
-            zerolinewidth=1,
-            zerolinecolor='lightgrey'
-        ),
-        title='Distancia Coseno entre Patentes',
-        hovermode='closest',
-        plot_bgcolor='white'
-    )
-    
-    return fig.to_json()
-
-def calculate_euclidean_distances(embeddings_data: Dict):
-    """Calcula las distancias euclidianas entre el vector principal y los citados."""
-    main_point = np.array(embeddings_data['main_patent']['reduced_embedding'])
-    distances = []
-    
-    for patent in embeddings_data['cited_patents']:
-        cited_point = np.array(patent['reduced_embedding'])
-        distance = np.linalg.norm(main_point - cited_point)
-        distances.append({
-            'id': patent['id'],
-            'distance': distance
-        })
-    
-    return distances
-
-def generate_euclidean_plot(embeddings_data: Dict):
-    """Genera el gráfico 3D de distancia euclidiana."""
-    main_point = embeddings_data['main_patent']['reduced_embedding']
-    distances = calculate_euclidean_distances(embeddings_data)
-    
-    fig = go.Figure()
-    
-    # Punto principal
-    fig.add_trace(go.Scatter3d(
-        x=[main_point[0]],
-        y=[main_point[1]],
-        z=[main_point[2]],
-        mode='markers',
-        marker=dict(size=10, color='red'),
-        name='Patente Principal',
-        text=[embeddings_data['main_patent']['id']],
-        hoverinfo='text'
-    ))
-    
-    # Puntos citados y líneas
-    for patent, distance in zip(embeddings_data['cited_patents'], distances):
-        cited_point = patent['reduced_embedding']
-        
-        # Línea de conexión
-        fig.add_trace(go.Scatter3d(
-            x=[main_point[0], cited_point[0]],
-            y=[main_point[1], cited_point[1]],
-            z=[main_point[2], cited_point[2]],
-            mode='lines',
-            line=dict(color='blue', width=2),
-            hoverinfo='text',
-            text=[f'Distancia: {distance["distance"]:.4f}'],
-        ))
-        
-        # Punto citado
-        fig.add_trace(go.Scatter3d(
-            x=[cited_point[0]],
-            y=[cited_point[1]],
-            z=[cited_point[2]],
-            mode='markers',
-            marker=dict(size=8, color='blue'),
-            name=f'Patent {patent["id"]}',
-            text=[patent['id']],
-            hoverinfo='text'
-        ))
-    
-    fig.update_layout(
-        showlegend=False,
-        scene=dict(
-            xaxis_title='X',
-            yaxis_title='Y',
-            zaxis_title='Z',
-            aspectmode='cube'
-        ),
-        title='Distancias Euclidianas entre Patentes'
-    )
-    
-    return fig.to_json()
-
-
-@router.post("/semantic")
-async def get_semantic_visualization(data: dict):
-    """Endpoint para visualización semántica."""
-    try:
-        # Log de los datos recibidos
-        logger.debug(f"Datos recibidos: {data}")
-
-        # Validar los datos de entrada
-        main_text = data.get('main_text')
-        cited_text = data.get('cited_text')
-
-        if not main_text or not cited_text:
-            raise HTTPException(
-                status_code=400,
-                detail="Faltan campos requeridos: main_text o cited_text"
-            )
-
-        # Log de validación
-        logger.debug(f"Longitud texto principal: {len(main_text)}")
-        logger.debug(f"Longitud texto citado: {len(cited_text)}")
-
-        # Procesar los textos
-        vectorizer = TfidfVectorizer(
-            stop_words='english',
-            max_features=100,
-            ngram_range=(1, 2)
-        )
-
-        # Ajustar y transformar los textos
-        try:
-            tfidf_matrix = vectorizer.fit_transform([main_text, cited_text])
-            logger.debug("Matriz TF-IDF generada exitosamente")
-        except Exception as e:
-            logger.error(f"Error en TF-IDF: {e}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Error al procesar los textos: {str(e)}"
-            )
-
-        # Calcular similitud coseno
-        similarity = float(cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0])
-        logger.debug(f"Similitud calculada: {similarity}")
-
-        # Obtener términos relevantes
-        feature_names = vectorizer.get_feature_names_out()
-        main_weights = tfidf_matrix[0].toarray()[0]
-        cited_weights = tfidf_matrix[1].toarray()[0]
-
-        # Preparar términos
-        main_terms = sorted(
-            [(term, float(score)) for term, score in zip(feature_names, main_weights) if score > 0],
-            key=lambda x: x[1],
-            reverse=True
-        )[:50]
-
-        cited_terms = sorted(
-            [(term, float(score)) for term, score in zip(feature_names, cited_weights) if score > 0],
-            key=lambda x: x[1],
-            reverse=True
-        )[:50]
-
-        # Preparar la respuesta
-        result = {
-            "similarity": similarity,
-            "main_terms": [
-                {"token": term, "score": score} for term, score in main_terms
-            ],
-            "cited_terms": [
-                {"token": term, "score": score} for term, score in cited_terms
-            ]
-        }
-
-        logger.debug("Respuesta preparada exitosamente")
-        return result
-
-    except HTTPException as he:
-        logger.error(f"HTTP Exception: {he.detail}")
-        raise he
-    except Exception as e:
-        logger.error(f"Error inesperado: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=500,
-            detail=str(e)
-        )
-'''
-@router.post("/bert")
-async def get_bert_visualization(data: dict):
-    """Endpoint para visualización basada en BERT."""
-    try:
-        main_text = data.get('main_text')
-        cited_text = data.get('cited_text')
-
-        if not main_text or not cited_text:
-            raise HTTPException(
-                status_code=400,
-                detail="Faltan textos requeridos"
-            )
-
-        result = bert_visualizer.process_texts(main_text, cited_text)
-        
-        if result['status'] == 'error':
-            raise HTTPException(
-                status_code=400,
-                detail=result['message']
-            )
-            
-        return result
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=str(e)
-        )    
-'''            
-
-@router.post("/bert")
-async def get_bert_visualization(data: dict):
-    """Endpoint para visualización basada en BERT."""
-    try:
-        logger.info("Recibiendo solicitud de visualización BERT")
-        
-        main_text = data.get('main_text')
-        cited_text = data.get('cited_text')
-
-        if not main_text or not cited_text:
-            raise HTTPException(
-                status_code=400,
-                detail="Faltan textos requeridos"
-            )
-            
-        logger.info(f"Procesando textos para visualización BERT - Longitudes: {len(main_text)}, {len(cited_text)}")
-        
-        result = bert_visualizer.process_texts(main_text, cited_text)
-        
-        if result['status'] == 'error':
-            logger.error(f"Error en procesamiento BERT: {result['message']}")
-            raise HTTPException(
-                status_code=400,
-                detail=result['message']
-            )
-            
-        logger.info("Visualización BERT completada exitosamente")
-        return result
-
-    except HTTPException as he:
-        logger.error(f"Error HTTP en visualización BERT: {he.detail}")
-        raise he
-    except Exception as e:
-        logger.error(f"Error inesperado en visualización BERT: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error interno del servidor: {str(e)}"
-        )
-   
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+import numpy as np
+from typing import TYPE_CHECKING, List, Dict, Optional
+import base64
+import hashlib
+import json
+import logging
+import threading
+from .config import PLOT_CACHE_MB
+from .executors import stage_executors, ExecutorBusy
+from .lru_cache import ByteBudgetLRU
+from .similarity import (
+    stack_embeddings,
+    cosine_similarities,
+    cosine_angles,
+    euclidean_distances,
+    rank_by_similarity,
+    novelty_score,
+)
+
+if TYPE_CHECKING:
+    from .bert_visualization import BertVisualizer
+
+# El visualizador BERT (y con él torch) se importa y se crea al primer uso: este
+# módulo también se importa al arrancar y en los procesos del pool, que no deben
+# cargar el modelo
+_bert_visualizer = None
+_bert_visualizer_lock = threading.Lock()
+
+
+def get_bert_visualizer() -> "BertVisualizer":
+    global _bert_visualizer
+    if _bert_visualizer is None:
+        with _bert_visualizer_lock:
+            if _bert_visualizer is None:
+                from .bert_visualization import BertVisualizer
+                _bert_visualizer = BertVisualizer()
+    return _bert_visualizer
+
+
+def process_bert_texts(main_text: str, cited_text: str, attention_mode: str = 'hidden',
+                       layer: int = -1, options: Dict = None) -> Dict:
+    # Se ejecuta en el pool de hilos, incluida la carga perezosa del modelo y la
+    # codificación de la respuesta
+    return get_bert_visualizer().process_texts(
+        main_text, cited_text, attention_mode, layer, **(options or {})
+    )
+
+# Configurar logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def calculate_cosine_angles(embeddings_data: Dict):
+    """Calcula los ángulos del coseno entre el vector principal y los citados."""
+    main_embedding, cited_matrix, cited_ids = stack_embeddings(embeddings_data)
+    angles = cosine_angles(cosine_similarities(main_embedding, cited_matrix))
+    
+    return [
+        {'id': patent_id, 'angle': float(angle)}
+        for patent_id, angle in zip(cited_ids, angles)
+    ]
+
+def generate_cosine_plot(embeddings_data: Dict):
+    """Genera el gráfico de distancia coseno con información detallada en el hover."""
+    # plotly se importa en el proceso del pool que construye el gráfico, no al arrancar
+    import plotly.graph_objects as go
+
+    angles = calculate_cosine_angles(embeddings_data)
+    
+    # Crear el gráfico base
+    fig = go.Figure()
+    
+    # Vector principal (1,0)
+    fig.add_trace(go.Scatter(
+        x=[0, 1],
+        y=[0, 0],
+        mode='lines+markers',
+        name='Vector Principal',
+        line=dict(color='red', width=3),
+        hoverinfo='text',
+        text=[f'Patente Principal<br>ID: {embeddings_data["main_patent"]["id"]}', 
+              f'Patente Principal<br>ID: {embeddings_data["main_patent"]["id"]}'],
+    ))
+    
+    # Vectores citados: una sola traza con un segmento por patente, separados por None
+    x, y, hover_text = [], [], []
+    for angle_data in angles:
+        cosine_similarity = np.cos(angle_data['angle'])  # Calcular similitud coseno
+        
+        # Mismo texto hover para inicio y fin del vector
+        text = (
+            f'Patente Citada<br>' +
+            f'ID: {angle_data["id"]}<br>' +
+            f'Similitud Coseno: {cosine_similarity:.4f}<br>' +
+            f'Ángulo: {np.degrees(angle_data["angle"]):.2f}°'
+        )
+        x.extend([0, float(np.cos(angle_data['angle'])), None])
+        y.extend([0, float(np.sin(angle_data['angle'])), None])
+        hover_text.extend([text, text, None])
+    
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=y,
+        mode='lines+markers',
+        name='Patentes Citadas',
+        hoverinfo='text',
+        text=hover_text,
+        marker=dict(size=8, color='steelblue'),
+        line=dict(width=2, color='steelblue')
+    ))
+    
+    # Configuración del layout
+    fig.update_layout(
+        showlegend=False,
+        xaxis=dict(
+            range=[-1.2, 1.2], 
+            title='X',
+            zeroline=True,
+            zerolinewidth=1,
+            zerolinecolor='lightgrey'
+        ),
+        yaxis=dict(
+            range=[-1.2, 1.2], 
+            title='Y', 
+            scaleanchor='x', 
+            scaleratio=1,
+            zeroline=True,
+            zerolinewidth=1,
+            zerolinecolor='lightgrey'
+        ),
+        title='Distancia Coseno entre Patentes',
+        hovermode='closest',
+        plot_bgcolor='white'
+    )
+    
+    return fig.to_json()
+
+def calculate_euclidean_distances(embeddings_data: Dict):
+    """Calcula las distancias euclidianas entre el vector principal y los citados."""
+    main_point, cited_points, cited_ids = stack_embeddings(embeddings_data, field='reduced_embedding')
+    distances = euclidean_distances(main_point, cited_points)
+    
+    return [
+        {'id': patent_id, 'distance': float(distance)}
+        for patent_id, distance in zip(cited_ids, distances)
+    ]
+
+def generate_euclidean_plot(embeddings_data: Dict):
+    """Genera el gráfico 3D de distancia euclidiana."""
+    import plotly.graph_objects as go
+
+    main_point = embeddings_data['main_patent']['reduced_embedding']
+    distances = calculate_euclidean_distances(embeddings_data)
+    
+    fig = go.Figure()
+    
+    # Punto principal
+    fig.add_trace(go.Scatter3d(
+        x=[main_point[0]],
+        y=[main_point[1]],
+        z=[main_point[2]],
+        mode='markers',
+        marker=dict(size=10, color='red'),
+        name='Patente Principal',
+        text=[embeddings_data['main_patent']['id']],
+        hoverinfo='text'
+    ))
+    
+    # Líneas de conexión en una sola traza (segmentos separados por None) y
+    # todos los puntos citados en otra
+    line_x, line_y, line_z, line_text = [], [], [], []
+    for patent, distance in zip(embeddings_data['cited_patents'], distances):
+        cited_point = patent['reduced_embedding']
+        text = f'ID: {patent["id"]}<br>Distancia: {distance["distance"]:.4f}'
+        line_x.extend([main_point[0], cited_point[0], None])
+        line_y.extend([main_point[1], cited_point[1], None])
+        line_z.extend([main_point[2], cited_point[2], None])
+        line_text.extend([text, text, None])
+    
+    fig.add_trace(go.Scatter3d(
+        x=line_x,
+        y=line_y,
+        z=line_z,
+        mode='lines',
+        line=dict(color='blue', width=2),
+        name='Distancias',
+        hoverinfo='text',
+        text=line_text,
+    ))
+    
+    fig.add_trace(go.Scatter3d(
+        x=[patent['reduced_embedding'][0] for patent in embeddings_data['cited_patents']],
+        y=[patent['reduced_embedding'][1] for patent in embeddings_data['cited_patents']],
+        z=[patent['reduced_embedding'][2] for patent in embeddings_data['cited_patents']],
+        mode='markers',
+        marker=dict(size=8, color='blue'),
+        name='Patentes Citadas',
+        text=[patent['id'] for patent in embeddings_data['cited_patents']],
+        hoverinfo='text'
+    ))
+    
+    fig.update_layout(
+        showlegend=False,
+        scene=dict(
+            xaxis_title='X',
+            yaxis_title='Y',
+            zaxis_title='Z',
+            aspectmode='cube'
+        ),
+        title='Distancias Euclidianas entre Patentes'
+    )
+    
+    return fig.to_json()
+
+
+PLOT_GENERATORS = {
+    "cosine": generate_cosine_plot,
+    "euclidean": generate_euclidean_plot
+}
+
+# Cambia cuando cambia la construcción de las figuras, para invalidar los ETag ya emitidos
+_PLOT_VERSION = b"2"
+
+# Figuras serializadas por ETag (tipo de gráfico + hash del conjunto de embeddings)
+plot_cache = ByteBudgetLRU(PLOT_CACHE_MB * 2**20, len)
+
+
+def plot_etag(plot_type: str, embeddings_data: Dict) -> str:
+    """ETag de la figura: hash de los ids y de los vectores que usa el gráfico."""
+    field = 'reduced_embedding' if plot_type == 'euclidean' else 'embedding'
+    main_vector, cited_matrix, cited_ids = stack_embeddings(embeddings_data, field=field)
+
+    digest = hashlib.sha256(_PLOT_VERSION)
+    digest.update(plot_type.encode())
+    digest.update(str(embeddings_data['main_patent']['id']).encode() + b'\0')
+    for patent_id in cited_ids:
+        digest.update(str(patent_id).encode() + b'\0')
+    digest.update(np.ascontiguousarray(main_vector, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(cited_matrix, dtype=np.float64).tobytes())
+    return f'"{plot_type}-{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """Compara el ETag con la cabecera If-None-Match (lista separada por comas o '*')."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or any(candidate.removeprefix('W/') == etag for candidate in candidates)
+
+
+# Datos de gráfico compactos: columnas por documento citado en lugar de la figura Plotly
+PLOT_DATA_ENCODINGS = ('json', 'base64')
+
+
+def build_plot_data(main_patent_id: str, main_embedding, cited_ids: List[str], cited_embeddings,
+                    reduced_embeddings, projection: str) -> Dict:
+    """Columnas de los gráficos coseno y euclidiano, calculadas una vez al generar los embeddings."""
+    similarities = cosine_similarities(main_embedding, cited_embeddings)
+    reduced = np.asarray(reduced_embeddings, dtype=np.float64).reshape(-1, 3)
+    return {
+        'main_patent_id': main_patent_id,
+        'projection': projection,
+        'ids': list(cited_ids),
+        'similarities': similarities.tolist(),
+        'angles': cosine_angles(similarities).tolist(),
+        'distances': euclidean_distances(reduced[0], reduced[1:]).tolist(),
+        'main_point': reduced[0].tolist(),
+        'points': reduced[1:].tolist(),
+    }
+
+
+def _pack_float32(values) -> str:
+    return base64.b64encode(np.ascontiguousarray(values, dtype='<f4').tobytes()).decode('ascii')
+
+
+def encode_plot_data(plot_data: Dict, plot_type: str, encoding: str = 'json') -> Dict:
+    """Selecciona las columnas del gráfico; con 'base64' los números van como float32 little-endian."""
+    if plot_type == 'cosine':
+        columns = {'similarities': plot_data['similarities'], 'angles': plot_data['angles']}
+    else:
+        columns = {
+            'distances': plot_data['distances'],
+            'main_point': plot_data['main_point'],
+            # Puntos en orden de fila: x0, y0, z0, x1, ...
+            'points': plot_data['points'],
+        }
+    payload = {
+        'plot_type': plot_type,
+        'main_patent_id': plot_data['main_patent_id'],
+        'projection': plot_data['projection'],
+        'ids': plot_data['ids'],
+        'encoding': encoding,
+    }
+    if encoding == 'base64':
+        payload.update({name: _pack_float32(values) for name, values in columns.items()})
+    else:
+        payload.update(columns)
+    return payload
+
+
+@router.get("/plots/cache")
+async def get_plot_cache_stats():
+    """Aciertos y fallos de la caché de figuras de /api/visualization/{plot_type}."""
+    return plot_cache.stats()
+
+
+@router.post("/ranking")
+async def get_similarity_ranking(embeddings_data: dict, top_k: int = None):
+    """Ordena los antecedentes por similitud coseno con la reinvindicación."""
+    try:
+        main_embedding, cited_matrix, cited_ids = stack_embeddings(embeddings_data)
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Datos de embeddings inválidos: {str(e)}")
+    if top_k is not None and top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k debe ser mayor que 0")
+    
+    ranking = rank_by_similarity(main_embedding, cited_matrix, cited_ids, top_k)
+    return {
+        "main_patent_id": embeddings_data['main_patent']['id'],
+        "novelty_score": novelty_score(cosine_similarities(main_embedding, cited_matrix)),
+        "ranking": ranking
+    }
+
+
+def compute_semantic_similarity(main_text: str, cited_text: str) -> Dict:
+    """Calcula la similitud TF-IDF y los términos relevantes de ambos textos.
+
+    Usa el modelo TF-IDF ajustado sobre el corpus: los textos solo se transforman,
+    así que la IDF y la similitud no cambian con las solicitudes anteriores.
+    """
+    from .tfidf_model import get_tfidf_model
+
+    model = get_tfidf_model()
+    try:
+        similarity = float(model.similarities(main_text, [cited_text])[0])
+        logger.debug(f"Similitud calculada: {similarity}")
+    except Exception as e:
+        logger.error(f"Error en TF-IDF: {e}")
+        raise ValueError(f"Error al procesar los textos: {str(e)}")
+
+    # Preparar la respuesta
+    return {
+        "similarity": similarity,
+        "main_terms": model.top_terms(main_text, 50),
+        "cited_terms": model.top_terms(cited_text, 50)
+    }
+
+
+@router.post("/semantic")
+async def get_semantic_visualization(data: dict):
+    """Endpoint para visualización semántica."""
+    try:
+        # Log de los datos recibidos
+        logger.debug(f"Datos recibidos: {data}")
+
+        # Validar los datos de entrada
+        main_text = data.get('main_text')
+        cited_text = data.get('cited_text')
+
+        if not main_text or not cited_text:
+            raise HTTPException(
+                status_code=400,
+                detail="Faltan campos requeridos: main_text o cited_text"
+            )
+
+        # Log de validación
+        logger.debug(f"Longitud texto principal: {len(main_text)}")
+        logger.debug(f"Longitud texto citado: {len(cited_text)}")
+
+        # TF-IDF fuera del bucle de eventos; en hilos para compartir el modelo y su caché
+        try:
+            result = await stage_executors.run_in_thread(
+                "semantic_tfidf", compute_semantic_similarity, main_text, cited_text
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        logger.debug("Respuesta preparada exitosamente")
+        return result
+
+    except ExecutorBusy as e:
+        logger.warning(f"Visualización semántica rechazada: {e}")
+        raise HTTPException(status_code=429, detail=str(e))
+    except HTTPException as he:
+        logger.error(f"HTTP Exception: {he.detail}")
+        raise he
+    except Exception as e:
+        logger.error(f"Error inesperado: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+
+def compute_semantic_batch(main_text: str, cited_texts: Dict[str, str], top_n: int, shared_n: int) -> Dict:
+    """Similitud TF-IDF del texto principal con todos los citados y términos por par.
+
+    Solo transforma con el modelo del corpus, como /semantic: la similitud de un
+    par es la misma en ambos endpoints sin importar las solicitudes anteriores.
+    """
+    from .tfidf_model import get_tfidf_model
+
+    model = get_tfidf_model()
+    try:
+        return model.compare_batch(main_text, cited_texts, top_n, shared_n)
+    except Exception as e:
+        logger.error(f"Error en TF-IDF por lotes: {e}")
+        raise ValueError(f"Error al procesar los textos: {str(e)}")
+
+
+@router.post("/semantic/batch")
+async def get_semantic_batch(data: dict):
+    """Compara la reivindicación principal con todos los documentos citados en una sola llamada."""
+    try:
+        main_text = data.get('main_text')
+        cited = data.get('cited_document_id')
+
+        if not main_text or not isinstance(cited, dict) or not cited:
+            raise HTTPException(
+                status_code=400,
+                detail="Faltan campos requeridos: main_text o cited_document_id"
+            )
+        cited_texts = {
+            str(patent_id): text for patent_id, text in cited.items() if isinstance(text, str) and text.strip()
+        }
+        if not cited_texts:
+            raise HTTPException(status_code=400, detail="Ningún documento citado tiene texto")
+
+        try:
+            top_n = int(data.get('top_terms', 50))
+            shared_n = int(data.get('shared_terms', 20))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="top_terms y shared_terms deben ser enteros")
+
+        logger.debug(f"Comparación semántica por lotes: {len(cited_texts)} documentos citados")
+
+        try:
+            return await stage_executors.run_in_thread(
+                "semantic_tfidf_batch", compute_semantic_batch, main_text, cited_texts, top_n, shared_n
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    except ExecutorBusy as e:
+        logger.warning(f"Comparación semántica por lotes rechazada: {e}")
+        raise HTTPException(status_code=429, detail=str(e))
+    except HTTPException as he:
+        logger.error(f"HTTP Exception: {he.detail}")
+        raise he
+    except Exception as e:
+        logger.error(f"Error inesperado: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )
+
+
+@router.get("/semantic/model")
+async def get_semantic_model_stats():
+    """Estado del modelo TF-IDF del corpus (``fitted``, documentos) y de su caché de textos."""
+    from .tfidf_model import get_tfidf_model
+
+    # El primer uso puede ajustar el modelo sobre el corpus: fuera del bucle de eventos
+    try:
+        model = await stage_executors.run_in_thread("semantic_tfidf", get_tfidf_model)
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return model.stats()
+
+
+@router.get("/bert/cache")
+async def get_bert_cache_stats():
+    """Aciertos y fallos de la caché de estados ocultos del visualizador BERT."""
+    if _bert_visualizer is None:
+        return {"loaded": False}
+    return {"loaded": True, **_bert_visualizer.cache_stats()}
+
+
+'''
+@router.post("/bert")
+async def get_bert_visualization(data: dict):
+    """Endpoint para visualización basada en BERT."""
+    try:
+        main_text = data.get('main_text')
+        cited_text = data.get('cited_text')
+
+        if not main_text or not cited_text:
+            raise HTTPException(
+                status_code=400,
+                detail="Faltan textos requeridos"
+            )
+
+        result = bert_visualizer.process_texts(main_text, cited_text)
+        
+        if result['status'] == 'error':
+            raise HTTPException(
+                status_code=400,
+                detail=result['message']
+            )
+            
+        return result
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=str(e)
+        )    
+'''            
+
+@router.post("/bert")
+async def get_bert_visualization(data: dict):
+    """Endpoint para visualización basada en BERT."""
+    try:
+        logger.info("Recibiendo solicitud de visualización BERT")
+        
+        main_text = data.get('main_text')
+        cited_text = data.get('cited_text')
+
+        if not main_text or not cited_text:
+            raise HTTPException(
+                status_code=400,
+                detail="Faltan textos requeridos"
+            )
+            
+        from .bert_visualization import ATTENTION_MODES, PAYLOAD_FORMATS, PAYLOAD_ENCODINGS
+
+        # Por defecto solo last_hidden_state; 'raw' devuelve la atención real por cabeza
+        attention_mode = data.get('attention_mode', 'hidden')
+        if attention_mode not in ATTENTION_MODES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"attention_mode inválido: {attention_mode}. Opciones: {list(ATTENTION_MODES)}"
+            )
+        try:
+            layer = int(data.get('layer', -1))
+            top_k = int(data.get('top_k', 32))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="layer y top_k deben ser enteros")
+
+        # Por defecto top-k por fila en binario; 'dense' conserva las matrices completas.
+        # 'windowed' analiza los textos completos por ventanas en lugar de truncarlos a 512 tokens
+        options = {
+            'payload_format': data.get('format', 'compact'),
+            'top_k': top_k,
+            'word_level': bool(data.get('word_level', False)),
+            'encoding': data.get('encoding', 'uint8'),
+            'windowed': bool(data.get('windowed', False))
+        }
+        if options['payload_format'] not in PAYLOAD_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"format inválido: {options['payload_format']}. Opciones: {list(PAYLOAD_FORMATS)}"
+            )
+        if options['encoding'] not in PAYLOAD_ENCODINGS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"encoding inválido: {options['encoding']}. Opciones: {list(PAYLOAD_ENCODINGS)}"
+            )
+        if top_k < 1:
+            raise HTTPException(status_code=400, detail="top_k debe ser mayor que 0")
+        if options['windowed'] and (attention_mode != 'hidden' or options['payload_format'] != 'compact'):
+            raise HTTPException(
+                status_code=400,
+                detail="windowed solo admite attention_mode='hidden' y format='compact'"
+            )
+            
+        logger.info(f"Procesando textos para visualización BERT - Longitudes: {len(main_text)}, {len(cited_text)}")
+        
+        # Inferencia con torch en el pool de hilos
+        result = await stage_executors.run_in_thread(
+            "bert_visualization", process_bert_texts, main_text, cited_text,
+            attention_mode, layer, options
+        )
+        
+        if result['status'] == 'error':
+            logger.error(f"Error en procesamiento BERT: {result['message']}")
+            raise HTTPException(
+                status_code=400,
+                detail=result['message']
+            )
+            
+        logger.info("Visualización BERT completada exitosamente")
+        return result
+
+    except ExecutorBusy as e:
+        logger.warning(f"Visualización BERT rechazada: {e}")
+        raise HTTPException(status_code=429, detail=str(e))
+    except HTTPException as he:
+        logger.error(f"Error HTTP en visualización BERT: {he.detail}")
+        raise he
+    except Exception as e:
+        logger.error(f"Error inesperado en visualización BERT: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+   
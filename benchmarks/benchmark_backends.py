@@ -0,0 +1,74 @@
+"""Compara los backends de inferencia de EmbeddingsGenerator sobre las patentes de data/.
+
+Para cada backend mide la latencia y el rendimiento de encode_texts y la
+concordancia (similitud coseno) de sus embeddings con los del backend torch fp32.
+Los backends que no se pueden preparar (p. ej. onnx sin onnxruntime) se omiten.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.benchmark_backends [--backends torch int8 onnx] [--repeats 3]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.embeddings import EmbeddingsGenerator, ensure_nltk_data
+from app.inference_backends import INFERENCE_BACKENDS
+from app.model_registry import DEFAULT_MODEL_NAME
+from app.similarity import normalize_rows
+from benchmarks.benchmark_batching import load_texts
+
+
+def run(backend, texts, args):
+    generator = EmbeddingsGenerator(
+        model_name=args.model,
+        use_cache=False,
+        max_batch_tokens=args.max_batch_tokens,
+        backend=backend
+    )
+    # Calentamiento: carga perezosa, exportación ONNX y cuantización no entran en la medida
+    generator.encode_texts(texts[:1])
+
+    timings = []
+    for _ in range(args.repeats):
+        generator.tokens_encoded = 0
+        start = time.perf_counter()
+        embeddings = generator.encode_texts(texts)
+        timings.append(time.perf_counter() - start)
+    return np.asarray(embeddings, dtype=np.float64), min(timings), generator.tokens_encoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME)
+    parser.add_argument('--backends', nargs='+', default=list(INFERENCE_BACKENDS), choices=INFERENCE_BACKENDS)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--max-batch-tokens', type=int, default=16384)
+    args = parser.parse_args()
+
+    ensure_nltk_data()
+
+    texts = load_texts(args.data_dir)
+    print(f"Textos: {len(texts)}")
+
+    backends = ['torch'] + [backend for backend in args.backends if backend != 'torch']
+    reference = None
+    for backend in backends:
+        try:
+            embeddings, elapsed, n_tokens = run(backend, texts, args)
+        except (RuntimeError, ImportError) as e:
+            print(f"{backend:>6}: omitido ({e})")
+            continue
+
+        if reference is None:
+            reference = normalize_rows(embeddings)
+        cosines = np.sum(normalize_rows(embeddings) * reference, axis=1)
+        print(
+            f"{backend:>6}: {elapsed:8.3f} s  {len(texts) / elapsed:8.1f} docs/s  {n_tokens / elapsed:10.1f} tokens/s  "
+            f"coseno vs fp32: media {cosines.mean():.6f}  mín {cosines.min():.6f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compara el batching fijo con el batching por longitud sobre las patentes de data/.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.benchmark_batching [--data-dir data] [--repeats 3]
+"""
+import argparse
+import time
+
+from app.embeddings import EmbeddingsGenerator, ensure_nltk_data
+from app.model_registry import DEFAULT_MODEL_NAME
+from app.patent_files import find_patent_files, iter_documents, iter_patent_bundles
+
+
+def load_texts(data_dir):
+    texts = [
+        text
+        for path in find_patent_files(data_dir)
+        for patent_data in iter_patent_bundles(path)
+        for _, text in iter_documents(patent_data)
+    ]
+    return [text for text in texts if isinstance(text, str) and text.strip()]
+
+
+def count_tokens(generator, texts):
+    segments = [segment for text in texts for segment in generator.split_text_by_sentences(text)]
+    return sum(len(feature['input_ids']) for feature in generator.build_features(segments))
+
+
+def run(mode, texts, args):
+    generator = EmbeddingsGenerator(
+        model_name=args.model,
+        use_cache=False,
+        batching=mode,
+        batch_size=args.batch_size,
+        max_batch_tokens=args.max_batch_tokens
+    )
+    # Calentamiento para no medir la inicialización perezosa del modelo
+    generator.encode_texts(texts[:1])
+
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        generator.encode_texts(texts)
+        timings.append(time.perf_counter() - start)
+    return generator, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--max-batch-tokens', type=int, default=16384)
+    args = parser.parse_args()
+
+    ensure_nltk_data()
+
+    texts = load_texts(args.data_dir)
+    print(f"Textos: {len(texts)}")
+
+    results = {}
+    for mode in ("fixed", "bucketed"):
+        generator, elapsed = run(mode, texts, args)
+        results[mode] = elapsed
+
+    n_tokens = count_tokens(generator, texts)
+    print(f"Tokens reales (sin relleno): {n_tokens}")
+    for mode, elapsed in results.items():
+        print(f"{mode:>9}: {elapsed:8.3f} s  {n_tokens / elapsed:10.1f} tokens/s")
+    print(f"Aceleración bucketed/fixed: {results['fixed'] / results['bucketed']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
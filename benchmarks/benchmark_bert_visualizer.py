@@ -0,0 +1,137 @@
+"""Compara memoria y latencia del visualizador BERT sobre los pares de patentes de data/.
+
+Modos medidos:
+    legacy  configuración anterior: attn eager, output_attentions y output_hidden_states
+    hidden  modo por defecto: solo last_hidden_state (SDPA)
+    raw     atención real por cabeza de la última capa, texto principal y citado como par
+
+La memoria se estima con el tamaño de los tensores devueltos por el modelo y, si
+hay GPU, con el pico de memoria reservada por torch.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.benchmark_bert_visualizer [--data-dir data] [--max-pairs 20]
+"""
+import argparse
+import statistics
+import time
+
+import torch
+from transformers import AutoModel
+
+from app.bert_visualization import BertVisualizer
+from app.model_registry import DEFAULT_MODEL_NAME
+from app.patent_files import find_patent_files, iter_documents, iter_patent_bundles
+
+
+def load_pairs(data_dir, max_pairs):
+    pairs = []
+    for path in find_patent_files(data_dir):
+        for patent_data in iter_patent_bundles(path):
+            documents = list(iter_documents(patent_data))
+            if not documents:
+                continue
+            cited_ids = set(patent_data['cited_document_id'])
+            main_text = next(
+                (text for doc_id, text in documents if doc_id not in cited_ids and isinstance(text, str)), None
+            )
+            for doc_id, cited_text in documents:
+                if doc_id in cited_ids and main_text and isinstance(cited_text, str) and cited_text.strip():
+                    pairs.append((main_text, cited_text))
+    return pairs[:max_pairs]
+
+
+def tensor_bytes(outputs):
+    total = 0
+    for value in outputs.values():
+        tensors = value if isinstance(value, tuple) else (value,)
+        total += sum(t.element_size() * t.nelement() for t in tensors if isinstance(t, torch.Tensor))
+    return total
+
+
+def tokenize(visualizer, text):
+    tokens = visualizer.tokenizer(
+        text, return_tensors='pt', truncation=True, max_length=visualizer.max_length
+    )
+    return {k: v.to(visualizer.device) for k, v in tokens.items()}
+
+
+def run_legacy(visualizer, legacy_model, main_text, cited_text):
+    tokens1 = tokenize(visualizer, main_text)
+    tokens2 = tokenize(visualizer, cited_text)
+    with torch.no_grad():
+        outputs1 = legacy_model(**tokens1, output_attentions=True)
+        outputs2 = legacy_model(**tokens2, output_attentions=True)
+        scores = torch.matmul(outputs1.last_hidden_state, outputs2.last_hidden_state.transpose(-2, -1))
+        torch.softmax(scores / scores.new_tensor(outputs1.last_hidden_state.size(-1)).sqrt(), dim=-1)
+    return tensor_bytes(outputs1) + tensor_bytes(outputs2)
+
+
+def run_hidden(visualizer, main_text, cited_text):
+    # Sin caché, para medir las dos pasadas del modelo
+    visualizer.hidden_cache.clear()
+    visualizer.get_cross_attention_scores(main_text, cited_text)
+    return visualizer.hidden_cache.stats()['bytes']
+
+
+def run_raw(visualizer, main_text, cited_text):
+    visualizer.get_raw_attention_scores(main_text, cited_text)
+    tokens = visualizer.tokenizer(
+        main_text, cited_text, return_tensors='pt', truncation='longest_first', max_length=visualizer.max_length
+    )
+    seq_len = tokens['input_ids'].shape[1]
+    hidden_size = visualizer.model.config.hidden_size
+    n_layers = visualizer.model.config.num_hidden_layers
+    n_heads = visualizer.model.config.num_attention_heads
+    element_size = next(visualizer.model.parameters()).element_size()
+    # Estados ocultos de todas las capas más las probabilidades de una sola capa
+    return element_size * ((n_layers + 1) * seq_len * hidden_size + n_heads * seq_len * seq_len)
+
+
+def measure(label, fn, pairs, repeats):
+    if torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+    fn(*pairs[0])
+
+    timings = []
+    output_bytes = []
+    for _ in range(repeats):
+        for main_text, cited_text in pairs:
+            start = time.perf_counter()
+            output_bytes.append(fn(main_text, cited_text))
+            timings.append(time.perf_counter() - start)
+
+    peak = f"  pico GPU {torch.cuda.max_memory_allocated() / 2**20:8.1f} MB" if torch.cuda.is_available() else ""
+    print(
+        f"{label:>7}: mediana {statistics.median(timings) * 1000:8.1f} ms  "
+        f"p95 {sorted(timings)[int(0.95 * (len(timings) - 1))] * 1000:8.1f} ms  "
+        f"salidas {max(output_bytes) / 2**20:8.2f} MB{peak}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME)
+    parser.add_argument('--max-pairs', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=2)
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.data_dir, args.max_pairs)
+    print(f"Pares texto principal/citado: {len(pairs)}")
+
+    visualizer = BertVisualizer(args.model)
+    legacy_model = AutoModel.from_pretrained(
+        visualizer.model_name,
+        output_attentions=True,
+        output_hidden_states=True,
+        attn_implementation="eager"
+    ).to(visualizer.device)
+    legacy_model.eval()
+
+    measure("legacy", lambda a, b: run_legacy(visualizer, legacy_model, a, b), pairs, args.repeats)
+    measure("hidden", lambda a, b: run_hidden(visualizer, a, b), pairs, args.repeats)
+    measure("raw", lambda a, b: run_raw(visualizer, a, b), pairs, args.repeats)
+
+
+if __name__ == '__main__':
+    main()
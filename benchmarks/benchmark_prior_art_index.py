@@ -0,0 +1,88 @@
+"""Recall y latencia del índice IVF de antecedentes frente a la búsqueda exacta.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.benchmark_prior_art_index [--n-docs 50000] [--queries 200]
+    python -m benchmarks.benchmark_prior_art_index --store-dir data/embedding_store
+
+Sin --store-dir se genera un corpus sintético con grupos de vectores, que
+imita documentos de una misma familia tecnológica.
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.embedding_store import EmbeddingStore
+from app.prior_art_index import PriorArtIndex
+
+
+def synthetic_store(store_dir, n_docs, dim, n_topics, seed=0):
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(n_topics, dim)).astype(np.float32)
+    store = EmbeddingStore(store_dir)
+    for start in range(0, n_docs, 10000):
+        size = min(10000, n_docs - start)
+        labels = rng.integers(0, n_topics, size)
+        block = topics[labels] + 0.6 * rng.normal(size=(size, dim)).astype(np.float32)
+        store.put_many({f"doc-{start + i}": block[i] for i in range(size)})
+    return store
+
+
+def timed_search(index, queries, top_k, exact):
+    results = []
+    started = time.perf_counter()
+    for query in queries:
+        results.append([item['key'] for item in index.search(query, top_k, exact=exact)])
+    elapsed = time.perf_counter() - started
+    return results, 1000.0 * elapsed / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store-dir', default=None)
+    parser.add_argument('--n-docs', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--topics', type=int, default=300)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--n-probe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.store_dir:
+            store = EmbeddingStore(args.store_dir)
+        else:
+            print(f"Generando corpus sintético: {args.n_docs} x {args.dim}")
+            store = synthetic_store(f"{tmp_dir}/store", args.n_docs, args.dim, args.topics)
+
+        # ivf_min_size alto para que la primera sincronización no entrene el IVF
+        index = PriorArtIndex(store, index_dir=f"{tmp_dir}/index", ivf_min_size=len(store) + 1)
+        index.sync()
+
+        rng = np.random.default_rng(1)
+        matrix = store.matrix()
+        rows = rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)
+        queries = np.asarray(matrix[rows], dtype=np.float32)
+        queries += 0.1 * rng.normal(size=queries.shape).astype(np.float32)
+
+        exact_results, exact_ms = timed_search(index, queries, args.top_k, exact=True)
+        print(f"Documentos: {len(index)}  consultas: {len(queries)}  top_k: {args.top_k}")
+        print(f"{'exacta':>12}: {exact_ms:8.2f} ms/consulta  recall@{args.top_k} 1.000")
+
+        started = time.perf_counter()
+        index.rebuild()
+        print(f"Entrenamiento IVF: {time.perf_counter() - started:.1f} s ({len(index._centroids)} listas)")
+
+        for n_probe in args.n_probe:
+            index.n_probe = n_probe
+            ivf_results, ivf_ms = timed_search(index, queries, args.top_k, exact=False)
+            recall = np.mean([
+                len(set(approx) & set(truth)) / max(len(truth), 1)
+                for approx, truth in zip(ivf_results, exact_results)
+            ])
+            print(f"{'ivf n_probe=' + str(n_probe):>12}: {ivf_ms:8.2f} ms/consulta  recall@{args.top_k} {recall:.3f}")
+
+
+if __name__ == '__main__':
+    main()
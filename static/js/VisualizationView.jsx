@@ -1,253 +1,384 @@
-//import SemanticComparisonView from './static/js/SemanticComparisonView';
-
-const Plot = React.memo(props => {
-  const plotRef = React.useRef();
-
-  React.useEffect(() => {
-    if (plotRef.current && props.data) {
-      window.Plotly.newPlot(
-        plotRef.current,
-        props.data,
-        props.layout,
-        props.config
-      );
-    }
-  }, [props.data, props.layout]);
-
-  return <div ref={plotRef} style={{ width: '100%', height: '100%' }} />;
-});
-
-const VisualizationView = ({ embeddings, updateVisualization }) => {
-  const [plotType, setPlotType] = React.useState('cosine');
-  const [searchTerm, setSearchTerm] = React.useState('');
-  const [plotData, setPlotData] = React.useState(null);
-  const [selectedPatentId, setSelectedPatentId] = React.useState(null);
-  const [selectedPatent, setSelectedPatent] = React.useState(null);
-  const [isLoading, setIsLoading] = React.useState(true);
-
-  React.useEffect(() => {
-    // Verificar y loggear los datos cuando embeddings cambia
-    if (embeddings) {
-      console.log("Datos de embeddings recibidos:", embeddings);
-      if (!embeddings.main_patent?.text) {
-        console.error("La patente principal no tiene texto");
-      }
-    }
-  }, [embeddings]);
-
-  React.useEffect(() => {
-    const loadPlotData = async () => {
-      if (!embeddings) return;
-      setIsLoading(true);
-      /* setError(null); Produce error!!! */
-
-      try {
-        if (plotType === 'semantic' || plotType === 'bert') {
-          if (!selectedPatent) {
-            setIsLoading(false);
-            return;
-          }
-          await loadSemanticData(selectedPatent);
-        } else {
-          const response = await fetch(`/api/visualization/${plotType}`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(embeddings)
-          });
-
-          if (!response.ok) throw new Error('Error al cargar visualización');
-          const result = await response.json();
-          setPlotData(JSON.parse(result));
-        }
-      } catch (error) {
-        console.error('Error:', error);
-      } finally {
-        setIsLoading(false);
-      }
-    };
-
-    loadPlotData();
-  }, [plotType, embeddings, selectedPatent]);
-
-  const loadSemanticData = async (citedPatent) => {
-    if (!embeddings?.main_patent?.text || !citedPatent?.text) {
-      console.error('Faltan textos necesarios:', {
-        mainText: !!embeddings?.main_patent?.text,
-        citedText: !!citedPatent?.text
-      });
-      return;
-    }
-
-    try {
-      const requestData = {
-        main_text: embeddings.main_patent.text,
-        cited_text: citedPatent.text
-      };
-
-      console.log('Enviando datos para análisis semántico:', requestData);
-
-      const response = await fetch('/api/visualization/semantic', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json'
-        },
-        body: JSON.stringify(requestData)
-      });
-
-      if (!response.ok) {
-        const errorText = await response.text();
-        console.error('Error en respuesta del servidor:', errorText);
-        throw new Error(errorText || 'Error en el análisis semántico');
-      }
-
-      const result = await response.json();
-      console.log('Resultado del análisis semántico:', result);
-      setPlotData(result);
-    } catch (error) {
-      console.error('Error en análisis semántico:', error);
-    }
-  };
-
-  const handlePatentSelect = (id) => {
-    const selected = embeddings.cited_patents.find(p => p.id === id);
-    console.log("Patente seleccionada:", selected);
-
-    if (!selected?.text) {
-      console.error('La patente seleccionada no tiene texto disponible');
-      return;
-    }
-
-    setSelectedPatentId(id);
-    setSelectedPatent(selected);
-
-    if (plotType === 'semantic') {
-      loadSemanticData(selected);
-    } else if (plotData?.data) {
-      const updatedData = plotData.data.map(trace => {
-        if (trace.text && trace.text[0].includes(id)) {
-          return {
-            ...trace,
-            line: { ...trace.line, color: 'green', width: 4 }
-          };
-        }
-        return trace;
-      });
-      setPlotData({ ...plotData, data: updatedData });
-    }
-  };
-
-  const handlePlotTypeChange = (event) => {
-    setPlotType(event.target.value);
-    if (event.target.value !== 'semantic' && event.target.value !== 'bert') {
-      updateVisualization(event.target.value);
-    }
-  };
-
-  const renderContent = () => {
-    if (isLoading) {
-      return (
-        <div className="flex items-center justify-center h-full">
-          <p className="text-gray-500">Cargando visualización...</p>
-        </div>
-      );
-    }
-
-    
-    if (plotType === 'semantic') {
-      return (
-        <SemanticComparisonView
-          mainPatent={embeddings?.main_patent}
-          citedPatent={selectedPatent}
-        />
-      );
-    } 
-
-    if (plotType === 'bert') {
-      return (
-        <BertCrossAttentionView
-          mainPatent={embeddings?.main_patent}
-          citedPatent={selectedPatent}
-        />
-      );
-    }
-
-    return plotData && (
-      <Plot
-        data={plotData.data}
-        layout={{
-          ...plotData.layout,
-          autosize: true,
-          width: '100%',
-          height: '100%'
-        }}
-        config={{ responsive: true }}
-      />
-    );
-  };
-
-  return (
-    <div className="flex h-full">
-      <div className="w-1/4 p-4 border-r bg-gray-50">
-        <label className="block text-sm font-medium text-gray-700 mb-2">
-          Tipo de gráfico
-        </label>
-        <select
-          value={plotType}
-          onChange={handlePlotTypeChange}
-          className="w-full p-2 border rounded focus:ring-blue-500 focus:border-blue-500"
-        >
-          <option value="cosine">Distancia Coseno</option>
-          <option value="euclidean">Distancia Euclidiana</option>
-          <option value="semantic">Relación semántica</option>
-          <option value="bert">Relación semántica - BERT</option>
-        </select>
-      </div>
-
-      <div className="w-1/2 p-4 border-r h-full">
-        {renderContent()}
-      </div>
-
-      <div className="w-1/4 p-4 bg-gray-50">
-        <div className="mb-4">
-          <label className="block text-sm font-medium text-gray-700 mb-2">
-            Buscar Id
-          </label>
-          <input
-            type="text"
-            value={searchTerm}
-            onChange={(e) => setSearchTerm(e.target.value)}
-            className="w-full p-2 border rounded focus:ring-blue-500 focus:border-blue-500"
-            placeholder="Buscar..."
-          />
-        </div>
-
-        <div className="mt-4">
-          <label className="block text-sm font-medium text-gray-700 mb-2">
-            Lista de antecedentes
-          </label>
-          <div className="border rounded max-h-[calc(100vh-300px)] overflow-y-auto bg-white">
-            {embeddings?.cited_patents
-              .filter(patent =>
-                patent.id.toLowerCase().includes(searchTerm.toLowerCase())
-              )
-              .map((patent) => (
-                <div
-                  key={patent.id}
-                  onClick={() => handlePatentSelect(patent.id)}
-                  className={`p-2 cursor-pointer hover:bg-gray-100 ${selectedPatentId === patent.id ? 'bg-blue-100' : ''
-                    }`}
-                >
-                  {patent.id}
-                </div>
-              ))
-            }
-          </div>
-        </div>
-      </div>
-    </div>
-  );
-};
-
-if (typeof window !== 'undefined') {
-  window.VisualizationView = VisualizationView;
+//import SemanticComparisonView from './static/js/SemanticComparisonView';
+
+const Plot = React.memo(props => {
+  const plotRef = React.useRef();
+
+  React.useEffect(() => {
+    if (plotRef.current && props.data) {
+      window.Plotly.newPlot(
+        plotRef.current,
+        props.data,
+        props.layout,
+        props.config
+      );
+    }
+  }, [props.data, props.layout]);
+
+  return <div ref={plotRef} style={{ width: '100%', height: '100%' }} />;
+});
+
+// Columnas numéricas de /api/visualization/{tipo}/data con encoding=base64 (float32 little-endian)
+const decodeFloat32Column = (b64) => {
+  const binary = atob(b64);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return Array.from(new Float32Array(bytes.buffer));
+};
+
+const decodePlotData = (payload) => {
+  const data = { ...payload };
+  if (payload.encoding === 'base64') {
+    ['similarities', 'angles', 'distances', 'main_point', 'points'].forEach(column => {
+      if (typeof payload[column] === 'string') data[column] = decodeFloat32Column(payload[column]);
+    });
+    if (data.points) {
+      const flat = data.points;
+      data.points = data.ids.map((_, i) => flat.slice(i * 3, i * 3 + 3));
+    }
+  }
+  return data;
+};
+
+// Figuras equivalentes a las de generate_cosine_plot / generate_euclidean_plot,
+// construidas en el navegador a partir de las columnas
+const buildCosineFigure = (data) => {
+  const mainText = `Patente Principal<br>ID: ${data.main_patent_id}`;
+  const x = [], y = [], text = [];
+  data.ids.forEach((id, i) => {
+    const angle = data.angles[i];
+    const hover = `Patente Citada<br>ID: ${id}<br>Similitud Coseno: ${data.similarities[i].toFixed(4)}<br>` +
+      `Ángulo: ${(angle * 180 / Math.PI).toFixed(2)}°`;
+    x.push(0, Math.cos(angle), null);
+    y.push(0, Math.sin(angle), null);
+    text.push(hover, hover, null);
+  });
+  const axis = { range: [-1.2, 1.2], zeroline: true, zerolinewidth: 1, zerolinecolor: 'lightgrey' };
+  return {
+    data: [
+      {
+        type: 'scatter', x: [0, 1], y: [0, 0], mode: 'lines+markers', name: 'Vector Principal',
+        line: { color: 'red', width: 3 }, hoverinfo: 'text', text: [mainText, mainText]
+      },
+      {
+        type: 'scatter', x, y, mode: 'lines+markers', name: 'Patentes Citadas', hoverinfo: 'text', text,
+        marker: { size: 8, color: 'steelblue' }, line: { width: 2, color: 'steelblue' }
+      }
+    ],
+    layout: {
+      showlegend: false,
+      xaxis: { ...axis, title: 'X' },
+      yaxis: { ...axis, title: 'Y', scaleanchor: 'x', scaleratio: 1 },
+      title: 'Distancia Coseno entre Patentes',
+      hovermode: 'closest',
+      plot_bgcolor: 'white'
+    }
+  };
+};
+
+const buildEuclideanFigure = (data) => {
+  const [mx, my, mz] = data.main_point;
+  const lineX = [], lineY = [], lineZ = [], lineText = [];
+  data.ids.forEach((id, i) => {
+    const [cx, cy, cz] = data.points[i];
+    const hover = `ID: ${id}<br>Distancia: ${data.distances[i].toFixed(4)}`;
+    lineX.push(mx, cx, null);
+    lineY.push(my, cy, null);
+    lineZ.push(mz, cz, null);
+    lineText.push(hover, hover, null);
+  });
+  return {
+    data: [
+      {
+        type: 'scatter3d', x: [mx], y: [my], z: [mz], mode: 'markers', name: 'Patente Principal',
+        marker: { size: 10, color: 'red' }, text: [data.main_patent_id], hoverinfo: 'text'
+      },
+      {
+        type: 'scatter3d', x: lineX, y: lineY, z: lineZ, mode: 'lines', name: 'Distancias',
+        line: { color: 'blue', width: 2 }, hoverinfo: 'text', text: lineText
+      },
+      {
+        type: 'scatter3d', mode: 'markers', name: 'Patentes Citadas',
+        x: data.points.map(p => p[0]), y: data.points.map(p => p[1]), z: data.points.map(p => p[2]),
+        marker: { size: 8, color: 'blue' }, text: data.ids, hoverinfo: 'text'
+      }
+    ],
+    layout: {
+      showlegend: false,
+      scene: { xaxis: { title: 'X' }, yaxis: { title: 'Y' }, zaxis: { title: 'Z' }, aspectmode: 'cube' },
+      title: 'Distancias Euclidianas entre Patentes'
+    }
+  };
+};
+
+const VisualizationView = ({ embeddings, updateVisualization }) => {
+  const [plotType, setPlotType] = React.useState('cosine');
+  const [searchTerm, setSearchTerm] = React.useState('');
+  const [plotData, setPlotData] = React.useState(null);
+  const [selectedPatentId, setSelectedPatentId] = React.useState(null);
+  const [selectedPatent, setSelectedPatent] = React.useState(null);
+  const [isLoading, setIsLoading] = React.useState(true);
+  // Comparación semántica de todos los citados, cargada una vez por conjunto de embeddings
+  const [semanticBatch, setSemanticBatch] = React.useState(null);
+  const [semanticLoading, setSemanticLoading] = React.useState(false);
+  const [semanticError, setSemanticError] = React.useState(null);
+
+  React.useEffect(() => {
+    // Verificar y loggear los datos cuando embeddings cambia
+    if (embeddings) {
+      console.log("Datos de embeddings recibidos:", embeddings);
+      if (!embeddings.main_patent?.text) {
+        console.error("La patente principal no tiene texto");
+      }
+    }
+  }, [embeddings]);
+
+  React.useEffect(() => {
+    const loadPlotData = async () => {
+      if (!embeddings) return;
+      setIsLoading(true);
+      /* setError(null); Produce error!!! */
+
+      try {
+        if (plotType === 'semantic' || plotType === 'bert') {
+          // Estas vistas cargan sus propios datos
+          setIsLoading(false);
+          return;
+        } else {
+          // Solo las columnas del resultado guardado en el servidor; el navegador
+          // revalida la respuesta con su ETag
+          const response = await fetch(
+            `/api/visualization/${plotType}/data?result_id=${embeddings.result_id}&encoding=base64`
+          );
+          if (!response.ok) throw new Error('Error al cargar visualización');
+          const data = decodePlotData(await response.json());
+          setPlotData(plotType === 'cosine' ? buildCosineFigure(data) : buildEuclideanFigure(data));
+        }
+      } catch (error) {
+        console.error('Error:', error);
+      } finally {
+        setIsLoading(false);
+      }
+    };
+
+    loadPlotData();
+  }, [plotType, embeddings, selectedPatent]);
+
+  React.useEffect(() => {
+    if (plotType !== 'semantic' || !embeddings) return;
+    if (semanticBatch?.source === embeddings) return;
+
+    const mainText = embeddings.main_patent?.text;
+    const citedTexts = (embeddings.cited_patents || []).reduce((acc, patent) => {
+      if (patent.text) acc[patent.id] = patent.text;
+      return acc;
+    }, {});
+    if (!mainText || Object.keys(citedTexts).length === 0) {
+      console.error('Faltan textos necesarios para el análisis semántico');
+      return;
+    }
+
+    const loadSemanticBatch = async () => {
+      setSemanticLoading(true);
+      setSemanticError(null);
+      try {
+        // Una sola solicitud para la reivindicación principal y todos los citados
+        const response = await fetch('/api/visualization/semantic/batch', {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json'
+          },
+          body: JSON.stringify({ main_text: mainText, cited_document_id: citedTexts })
+        });
+
+        if (!response.ok) {
+          const errorText = await response.text();
+          console.error('Error en respuesta del servidor:', errorText);
+          throw new Error(errorText || 'Error en el análisis semántico');
+        }
+
+        const result = await response.json();
+        setSemanticBatch({ source: embeddings, data: result });
+      } catch (error) {
+        console.error('Error en análisis semántico:', error);
+        setSemanticError(error.message);
+      } finally {
+        setSemanticLoading(false);
+      }
+    };
+
+    loadSemanticBatch();
+  }, [plotType, embeddings]);
+
+  const semanticSimilarities = React.useMemo(() => {
+    if (!semanticBatch?.data) return {};
+    return semanticBatch.data.ids.reduce((acc, id, idx) => {
+      acc[id] = semanticBatch.data.similarities[idx];
+      return acc;
+    }, {});
+  }, [semanticBatch]);
+
+  const handlePatentSelect = (id) => {
+    const selected = embeddings.cited_patents.find(p => p.id === id);
+    console.log("Patente seleccionada:", selected);
+
+    if (!selected?.text) {
+      console.error('La patente seleccionada no tiene texto disponible');
+      return;
+    }
+
+    setSelectedPatentId(id);
+    setSelectedPatent(selected);
+
+    if (plotType !== 'semantic' && plotData?.data) {
+      // Los citados van en una sola traza de segmentos: se resalta el segmento
+      // de la patente seleccionada con una traza adicional
+      const baseData = plotData.data.filter(trace => trace.name !== 'Selección');
+      const lineTrace = baseData.find(trace => trace.mode?.includes('lines') && trace.text?.some(text => text?.includes(id)));
+      if (!lineTrace) {
+        setPlotData({ ...plotData, data: baseData });
+        return;
+      }
+      const points = lineTrace.text
+        .map((text, idx) => (text?.includes(id) ? idx : -1))
+        .filter(idx => idx >= 0);
+      const highlight = {
+        type: lineTrace.type,
+        mode: 'lines+markers',
+        name: 'Selección',
+        hoverinfo: 'text',
+        x: points.map(idx => lineTrace.x[idx]),
+        y: points.map(idx => lineTrace.y[idx]),
+        text: points.map(idx => lineTrace.text[idx]),
+        line: { color: 'green', width: 4 },
+        marker: { color: 'green', size: 8 }
+      };
+      if (lineTrace.z) highlight.z = points.map(idx => lineTrace.z[idx]);
+      setPlotData({ ...plotData, data: [...baseData, highlight] });
+    }
+  };
+
+  const handlePlotTypeChange = (event) => {
+    setPlotType(event.target.value);
+    if (event.target.value !== 'semantic' && event.target.value !== 'bert') {
+      updateVisualization(event.target.value);
+    }
+  };
+
+  const renderContent = () => {
+    if (isLoading) {
+      return (
+        <div className="flex items-center justify-center h-full">
+          <p className="text-gray-500">Cargando visualización...</p>
+        </div>
+      );
+    }
+
+    
+    if (plotType === 'semantic') {
+      return (
+        <SemanticComparisonView
+          mainPatent={embeddings?.main_patent}
+          citedPatent={selectedPatent}
+          comparison={semanticBatch?.source === embeddings ? semanticBatch.data : null}
+          isLoading={semanticLoading}
+          error={semanticError}
+        />
+      );
+    } 
+
+    if (plotType === 'bert') {
+      return (
+        <BertCrossAttentionView
+          mainPatent={embeddings?.main_patent}
+          citedPatent={selectedPatent}
+        />
+      );
+    }
+
+    return plotData && (
+      <Plot
+        data={plotData.data}
+        layout={{
+          ...plotData.layout,
+          autosize: true,
+          width: '100%',
+          height: '100%'
+        }}
+        config={{ responsive: true }}
+      />
+    );
+  };
+
+  return (
+    <div className="flex h-full">
+      <div className="w-1/4 p-4 border-r bg-gray-50">
+        <label className="block text-sm font-medium text-gray-700 mb-2">
+          Tipo de gráfico
+        </label>
+        <select
+          value={plotType}
+          onChange={handlePlotTypeChange}
+          className="w-full p-2 border rounded focus:ring-blue-500 focus:border-blue-500"
+        >
+          <option value="cosine">Distancia Coseno</option>
+          <option value="euclidean">Distancia Euclidiana</option>
+          <option value="semantic">Relación semántica</option>
+          <option value="bert">Relación semántica - BERT</option>
+        </select>
+      </div>
+
+      <div className="w-1/2 p-4 border-r h-full">
+        {renderContent()}
+      </div>
+
+      <div className="w-1/4 p-4 bg-gray-50">
+        <div className="mb-4">
+          <label className="block text-sm font-medium text-gray-700 mb-2">
+            Buscar Id
+          </label>
+          <input
+            type="text"
+            value={searchTerm}
+            onChange={(e) => setSearchTerm(e.target.value)}
+            className="w-full p-2 border rounded focus:ring-blue-500 focus:border-blue-500"
+            placeholder="Buscar..."
+          />
+        </div>
+
+        <div className="mt-4">
+          <label className="block text-sm font-medium text-gray-700 mb-2">
+            Lista de antecedentes
+          </label>
+          <div className="border rounded max-h-[calc(100vh-300px)] overflow-y-auto bg-white">
+            {embeddings?.cited_patents
+              .filter(patent =>
+                patent.id.toLowerCase().includes(searchTerm.toLowerCase())
+              )
+              .map((patent) => (
+                <div
+                  key={patent.id}
+                  onClick={() => handlePatentSelect(patent.id)}
+                  className={`p-2 cursor-pointer hover:bg-gray-100 ${selectedPatentId === patent.id ? 'bg-blue-100' : ''
+                    }`}
+                >
+                  {patent.id}
+                  {plotType === 'semantic' && semanticSimilarities[patent.id] !== undefined && (
+                    <span className="float-right text-xs text-gray-500">
+                      {(semanticSimilarities[patent.id] * 100).toFixed(1)}%
+                    </span>
+                  )}
+                </div>
+              ))
+            }
+          </div>
+        </div>
+      </div>
+    </div>
+  );
+};
+
+if (typeof window !== 'undefined') {
+  window.VisualizationView = VisualizationView;
 }
\ No newline at end of file